@@ -0,0 +1,103 @@
+"""
+ArrayStorage.py - Compact storage for numeric arrays.
+A list holds a pointer to a separately allocated int or float object per
+element, about 36 bytes each; IntArray and FloatArray keep the values
+unboxed in an array.array, 8 bytes each, and are created, copied and
+compared in C. They print, index and compare like the lists they replace,
+so the engines treat both the same way. Arrays whose values do not all fit
+one typecode, such as strings, mixed ints and floats or integers beyond 64
+bits, stay lists.
+"""
+from array import array
+
+
+def list_comparison(name):
+    """Return a comparison method that compares with lists like a list would."""
+    compare_lists = getattr(list, name)
+    compare_arrays = getattr(array, name)
+
+    def compare(self, other):
+        if isinstance(other, list):
+            return compare_lists(self.tolist(), other)
+        return compare_arrays(self, other)
+    return compare
+
+
+class TypedArray(array):
+    """Base class of the numeric arrays; subclasses set TYPECODE."""
+    __slots__ = ()
+    TYPECODE = None
+
+    def __new__(cls, values=()):
+        return super().__new__(cls, cls.TYPECODE, values)
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    def __reduce__(self):
+        # array's own reduce passes the typecode, which __new__ does not take
+        return (self.__class__, (self.tolist(),))
+
+    def __reduce_ex__(self, protocol):
+        return self.__reduce__()
+
+    def __copy__(self):
+        return self.__class__(self)
+
+    def __deepcopy__(self, memo):
+        # The elements are numbers, a copy of the array is a deep copy
+        return self.__class__(self)
+
+    def __getitem__(self, index):
+        value = array.__getitem__(self, index)
+        if index.__class__ is slice:
+            return self.__class__(value)
+        return value
+
+    __str__ = __repr__
+
+    __eq__ = list_comparison('__eq__')
+    __ne__ = list_comparison('__ne__')
+    __lt__ = list_comparison('__lt__')
+    __le__ = list_comparison('__le__')
+    __gt__ = list_comparison('__gt__')
+    __ge__ = list_comparison('__ge__')
+
+
+class IntArray(TypedArray):
+    """Signed 64-bit integers."""
+    __slots__ = ()
+    TYPECODE = 'q'
+
+
+class FloatArray(TypedArray):
+    """Double precision floats."""
+    __slots__ = ()
+    TYPECODE = 'd'
+
+
+# What the engines accept as an array value
+ARRAY_TYPES = (list, TypedArray)
+
+def pack_array(values):
+    """
+    Store the values of an array compactly if they allow it.
+
+    Args:
+        values: List of element values
+
+    Returns:
+        An IntArray if all values are ints of at most 64 bits, a FloatArray
+        if all are floats, and otherwise the list itself
+    """
+    kinds = set(map(type, values))
+    if len(kinds) == 1:
+        kind = kinds.pop()
+        try:
+            if kind is int:
+                return IntArray(values)
+            if kind is float:
+                return FloatArray(values)
+        except OverflowError:
+            pass
+    return values
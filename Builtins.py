@@ -0,0 +1,198 @@
+"""
+Builtins.py - Functions predefined in every symbol table.
+Besides get_error(), which every engine handles itself, there are bulk I/O
+functions moving whole arrays between files and programs, so scripts can
+load their data instead of embedding it as huge array literals:
+
+    int[] read_ints(str path)               Integers separated by whitespace or commas
+    str[] read_lines(str path)              Lines without their line breaks
+    int write_ints(str path, int[] values)  One integer per line, returns the count
+    int write_lines(str path, str[] lines)  One string per line, returns the count
+
+Files are read through a read-only memory map in chunks of CHUNK_SIZE
+bytes, so a file is never copied into memory as a whole and its values are
+converted by the bytes methods rather than character by character.
+read_ints collects the integers in an IntArray, unless one needs more than
+64 bits.
+"""
+import mmap
+import os
+from ArrayStorage import IntArray
+
+CHUNK_SIZE = 1 << 20    # Bytes read from a memory map at a time
+
+# Symbol table entries; the analyzer checks calls against them like against
+# user functions, and the engines call BUILTIN_FUNCTIONS for them
+BUILTINS = {
+    'read_ints': {
+        'type': 'function', 'builtin': True, 'return_type': 'int[]',
+        'params': [{'type': 'str', 'name': 'path'}],
+    },
+    'read_lines': {
+        'type': 'function', 'builtin': True, 'return_type': 'str[]',
+        'params': [{'type': 'str', 'name': 'path'}],
+    },
+    'write_ints': {
+        'type': 'function', 'builtin': True, 'return_type': 'int',
+        'params': [{'type': 'str', 'name': 'path'}, {'type': 'int[]', 'name': 'values'}],
+    },
+    'write_lines': {
+        'type': 'function', 'builtin': True, 'return_type': 'int',
+        'params': [{'type': 'str', 'name': 'path'}, {'type': 'str[]', 'name': 'lines'}],
+    },
+}
+
+
+class BuiltinError(Exception):
+    """Failure of a builtin, reported by the engines as a runtime error."""
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def define_builtins(symbol_table):
+    """Define get_error and the functions of BUILTINS in a new symbol table."""
+    symbol_table.define("get_error", {"type": "str"})
+    for name, info in BUILTINS.items():
+        symbol_table.define(name, {**info, 'params': list(info['params'])})
+
+def is_builtin(symbol_table, name):
+    """Return whether a called name refers to a function of BUILTINS."""
+    info = symbol_table.global_scope.get(name)
+    return info is not None and info.get('builtin', False)
+
+def call_builtin(name, args):
+    """
+    Call a builtin with evaluated arguments.
+
+    Args:
+        name: Name of a function of BUILTINS
+        args: Argument values, already type-checked by the analyzer
+
+    Returns:
+        The result of the builtin
+
+    Raises:
+        BuiltinError: With the message to report if the call fails
+    """
+    try:
+        return BUILTIN_FUNCTIONS[name](*args)
+    except OSError as e:
+        raise BuiltinError(f"{name}: cannot access '{args[0]}': {e.strerror or e}.")
+
+#--------------------------------------------------
+# Reading
+#--------------------------------------------------
+
+def read_chunks(path, separator):
+    """
+    Yield the contents of a file in chunks ending at a separator byte, so
+    no value is split between two chunks.
+
+    Args:
+        path: File to read
+        separator: Byte string values are separated by
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            # Empty files cannot be memory-mapped
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            while start < size:
+                end = start + CHUNK_SIZE
+                if end < size:
+                    # Extend the chunk to the next separator
+                    cut = data.find(separator, end)
+                    end = size if cut < 0 else cut + 1
+                yield data[start:end]
+                start = end
+
+def read_ints(path):
+    values = IntArray()
+    for chunk in read_chunks(path, b'\n'):
+        tokens = chunk.replace(b',', b' ').split()
+        try:
+            ints = list(map(int, tokens))
+        except ValueError:
+            bad = next(token for token in tokens if not is_int(token))
+            raise BuiltinError(f"read_ints: '{bad.decode('utf-8', 'replace')}' in '{path}' is not an integer.")
+        if values.__class__ is IntArray:
+            try:
+                ints = IntArray(ints)
+            except OverflowError:
+                # Too large for 64 bits, keep the values in a list
+                values = values.tolist()
+        values += ints
+    return values
+
+def is_int(token):
+    try:
+        int(token)
+    except ValueError:
+        return False
+    return True
+
+def read_lines(path):
+    lines = []
+    for chunk in read_chunks(path, b'\n'):
+        try:
+            text = chunk.decode('utf-8')
+        except UnicodeDecodeError:
+            raise BuiltinError(f"read_lines: '{path}' is not UTF-8 text.")
+        # Every chunk but possibly the last ends with a line break
+        if text.endswith('\n'):
+            text = text[:-1]
+        lines.extend(text.replace('\r\n', '\n').split('\n'))
+    return lines
+
+#--------------------------------------------------
+# Writing
+#--------------------------------------------------
+
+def write_chunks(path, values, check=None):
+    """
+    Write one value per line, converting and joining them a chunk at a time.
+
+    Args:
+        path: File to write, replaced if it exists
+        values: List of values
+        check: Function returning an error message for an invalid value,
+            or None if the value can be written
+
+    Returns:
+        The number of values written
+    """
+    step = CHUNK_SIZE // 16
+    with open(path, 'w', encoding='utf-8') as f:
+        for start in range(0, len(values), step):
+            chunk = values[start:start + step]
+            if check:
+                for value in chunk:
+                    message = check(value)
+                    if message:
+                        raise BuiltinError(message)
+            f.write("\n".join(map(str, chunk)))
+            f.write("\n")
+    return len(values)
+
+def check_int(value):
+    if value.__class__ is not int:
+        return f"write_ints: '{value}' is not an integer."
+    return None
+
+def write_ints(path, values):
+    # The values of an IntArray are known to be integers
+    return write_chunks(path, values, None if values.__class__ is IntArray else check_int)
+
+def write_lines(path, lines):
+    return write_chunks(path, lines)
+
+
+BUILTIN_FUNCTIONS = {
+    'read_ints': read_ints,
+    'read_lines': read_lines,
+    'write_ints': write_ints,
+    'write_lines': write_lines,
+}
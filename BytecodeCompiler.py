@@ -0,0 +1,590 @@
+"""
+BytecodeCompiler.py - Lowers a type-checked parse tree into flat bytecode.
+The compiled CodeObjects are executed by BytecodeVM instead of walking the
+parse tree with RuntimeVisitor.
+"""
+from syntaxParser import syntaxParser
+from syntaxVisitor import syntaxVisitor
+from RuntimeVisitor import specialised_ops
+from Builtins import is_builtin
+from MemoCache import memoizable
+from ArrayStorage import pack_array
+
+#--------------------------------------------------
+# Opcodes
+#--------------------------------------------------
+
+LOAD_CONST = 0          # push arg
+LOAD_LOCAL = 1          # push frame[arg]
+STORE_LOCAL = 2         # frame[arg] = pop()
+LOAD_GLOBAL = 3         # push globals[arg]
+STORE_GLOBAL = 4        # globals[arg] = pop()
+BINARY_ADD = 5
+BINARY_SUB = 6
+BINARY_MUL = 7
+BINARY_DIV = 8
+COMPARE = 9             # arg indexes COMPARE_OPS
+POP_JUMP_IF_FALSE = 10  # pop(); jump to arg if falsy
+JUMP = 11               # jump to arg
+LOOP_GUARD = 12         # count a loop iteration against the execution budget
+AND_JUMP = 13           # if TOS is falsy replace it with False and jump, else pop
+OR_JUMP = 14            # if TOS is truthy replace it with True and jump, else pop
+NOT = 15
+NEGATE = 16
+INDEX = 17              # array, index -> element (arg is the array name)
+GET_FIELD = 18          # instance -> instance[arg]
+SET_FIELD = 19          # instance, value -> (instance[arg] = value)
+NEW_INSTANCE = 20       # push a fresh instance with the field names in arg
+ENSURE_LIST = 21        # wrap a non-list TOS in a one element list
+CALL = 22               # arg is (CodeObject, argc)
+GET_ERROR = 23          # push the message of the exception being handled
+RETURN_VALUE = 24
+RETURN_NONE = 25
+PRINT = 26
+POP_TOP = 27
+DUP_TOP = 28
+SETUP_TRY = 29          # arg is the address of the except block
+POP_TRY = 30            # leave a try block normally
+END_EXCEPT = 31         # leave an except block
+BINARY_FAST = 32        # arg is the operation for the static operand types; the
+                        # checked BINARY_* emitted after it runs if the values do not fit
+CALL_BUILTIN = 33       # arg is (builtin name, argc)
+CALL_PURE = 34          # CALL of a memoizable function, looked up in its MemoCache first
+
+OPNAMES = {
+    value: name for name, value in list(globals().items())
+    if name.isupper() and isinstance(value, int)
+}
+
+# Comparison operators in COMPARE argument order
+COMPARE_SYMBOLS = ('<', '<=', '>', '>=', '==', '!=')
+COMPARE_TOKENS = {
+    syntaxParser.LT: 0,
+    syntaxParser.LE: 1,
+    syntaxParser.GT: 2,
+    syntaxParser.GE: 3,
+    syntaxParser.EQ: 4,
+    syntaxParser.NE: 5,
+}
+
+# Values given to variables declared without an initializer
+DEFAULT_VALUES = {
+    'int': 0,
+    'float': 0.0,
+    'str': "",
+    'char': '',
+}
+
+
+class CodeObject:
+    """A compiled function body or top-level program."""
+    def __init__(self, name, params=()):
+        """
+        Create an empty code object.
+
+        Args:
+            name: Function name, or '<program>' for top-level code
+            params: Parameter names, bound to the first local slots
+        """
+        self.name = name
+        self.code = []                  # List of (opcode, arg) tuples
+        self.nparams = len(params)
+        self.nlocals = len(params)      # Parameters, block locals and loop counters
+        self.blank = ()                 # Tuple of None that clears a released frame
+        self.free_frames = []           # Released frames reused by BytecodeVM
+
+    def finish(self):
+        """Fix the frame layout once the last instruction is emitted."""
+        self.blank = (None,) * self.nlocals
+
+    def emit(self, op, arg=None):
+        """Append an instruction and return its address."""
+        self.code.append((op, arg))
+        return len(self.code) - 1
+
+    def patch(self, address, arg):
+        """Set the argument of an already emitted jump."""
+        self.code[address] = (self.code[address][0], arg)
+
+    def new_local(self):
+        """Reserve a new local slot."""
+        self.nlocals += 1
+        return self.nlocals - 1
+
+    def disassemble(self):
+        """Return a readable listing of the instructions."""
+        lines = [f"== {self.name} (params={self.nparams}, locals={self.nlocals}) =="]
+        for address, (op, arg) in enumerate(self.code):
+            if op == CALL or op == CALL_PURE:
+                arg = f"{arg[0].name}/{arg[1]}"
+            elif op == CALL_BUILTIN:
+                arg = f"{arg[0]}/{arg[1]}"
+            elif op == COMPARE:
+                arg = COMPARE_SYMBOLS[arg]
+            elif op == BINARY_FAST:
+                arg = arg.__name__
+            lines.append(f"{address:5d}  {OPNAMES[op]:<18} {'' if arg is None else repr(arg)}")
+        return "\n".join(lines)
+
+
+class BytecodeCompiler(syntaxVisitor):
+    """
+    Visitor that compiles an analyzed program into CodeObjects.
+    Names are resolved at compile time: variables declared at program level
+    live in the global symbol table, everything else gets a local slot.
+    """
+    def __init__(self, symbol_table):
+        """
+        Initialize the compiler.
+
+        Args:
+            symbol_table: The symbol table filled in by StatementAnalyzer
+        """
+        super().__init__()
+        self.symbol_table = symbol_table
+        self.functions = {}     # Function name -> CodeObject
+        self.code = None        # CodeObject currently being emitted
+        self.scopes = []        # Compile-time block scopes: name -> local slot
+        self.loops = []         # Enclosing loops: (start address, break jumps, handler depth)
+        self.handlers = []      # Enclosing 'try' / 'except' regions of the current code
+
+    def compile(self, tree):
+        """
+        Compile a program parse tree.
+
+        Args:
+            tree: The ProgramContext returned by the parser
+
+        Returns:
+            The CodeObject for the top-level statements
+        """
+        self.code = CodeObject('<program>')
+        self.scopes, self.loops, self.handlers = [], [], []
+        self.visit(tree)
+        self.code.emit(RETURN_NONE)
+        self.code.finish()
+        return self.code
+
+    def disassemble(self, main):
+        """Return the listing of the program and every compiled function."""
+        listings = [code.disassemble() for code in self.functions.values()]
+        listings.append(main.disassemble())
+        return "\n\n".join(listings)
+
+    #--------------------------------------------------
+    # Helpers
+    #--------------------------------------------------
+
+    def emit(self, op, arg=None):
+        return self.code.emit(op, arg)
+
+    def here(self):
+        """Address of the next instruction."""
+        return len(self.code.code)
+
+    def declare(self, name):
+        """Declare a variable in the innermost scope and return its location."""
+        if not self.scopes:
+            return (STORE_GLOBAL, name)
+        slot = self.code.new_local()
+        self.scopes[-1][name] = slot
+        return (STORE_LOCAL, slot)
+
+    def emit_load(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return self.emit(LOAD_LOCAL, scope[name])
+        return self.emit(LOAD_GLOBAL, name)
+
+    def emit_store(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return self.emit(STORE_LOCAL, scope[name])
+        return self.emit(STORE_GLOBAL, name)
+
+    def emit_unwind(self, depth):
+        """Leave every try/except region entered after the given handler depth."""
+        for kind in reversed(self.handlers[depth:]):
+            self.emit(POP_TRY if kind == 'try' else END_EXCEPT)
+
+    def compile_scoped_block(self, block):
+        """Compile a block in its own variable scope."""
+        self.scopes.append({})
+        self.visit(block)
+        self.scopes.pop()
+
+    def function_code(self, name):
+        """Return the CodeObject for a function, compiling it on first use."""
+        if name in self.functions:
+            return self.functions[name]
+
+        func_info = self.symbol_table.global_scope.get(name) or self.symbol_table.lookup(name)
+        params = [param['name'] for param in func_info.get('params', [])]
+        code = CodeObject(name, params)
+        self.functions[name] = code
+
+        # Compile the body with a fresh emission state
+        saved = (self.code, self.scopes, self.loops, self.handlers)
+        self.code = code
+        self.scopes = [{param: slot for slot, param in enumerate(params)}]
+        self.loops = []
+        self.handlers = []
+        self.visit(func_info['body'])
+        self.emit(RETURN_NONE)
+        code.finish()
+        self.code, self.scopes, self.loops, self.handlers = saved
+        return code
+
+    #--------------------------------------------------
+    # Program and Blocks
+    #--------------------------------------------------
+
+    def visitProgram(self, ctx:syntaxParser.ProgramContext):
+        for stmt in ctx.statement():
+            self.visit(stmt)
+        return None
+
+    def visitBlock(self, ctx:syntaxParser.BlockContext):
+        for stmt in ctx.statement():
+            self.visit(stmt)
+        return None
+
+    def visitBlockStmt(self, ctx:syntaxParser.BlockStmtContext):
+        self.compile_scoped_block(ctx.block())
+        return None
+
+    #--------------------------------------------------
+    # Declarations and Assignment
+    #--------------------------------------------------
+
+    def visitVarDeclStmt(self, ctx:syntaxParser.VarDeclStmtContext):
+        var_decl = ctx.variable_declaration()
+        data_type = var_decl.DATA_TYPE().getText()
+
+        if var_decl.expression():
+            self.visit(var_decl.expression())
+            if data_type.endswith('[]'):
+                self.emit(ENSURE_LIST)
+        elif data_type.endswith('[]'):
+            self.emit(LOAD_CONST, [])
+        else:
+            self.emit(LOAD_CONST, DEFAULT_VALUES.get(data_type))
+
+        op, arg = self.declare(var_decl.IDENTIFIER().getText())
+        self.emit(op, arg)
+        return None
+
+    def visitAssignStmt(self, ctx:syntaxParser.AssignStmtContext):
+        assign = ctx.assignment()
+        if assign.IDENTIFIER():
+            self.visit(assign.expression())
+            self.emit_store(assign.IDENTIFIER().getText())
+        else:
+            field = assign.type_defVar()
+            self.emit_load(field.IDENTIFIER(0).getText())
+            self.visit(assign.expression())
+            self.emit(SET_FIELD, field.IDENTIFIER(1).getText())
+        return None
+
+    def visitTypeDefDeclStmt(self, ctx:syntaxParser.TypeDefDeclStmtContext):
+        decl = ctx.type_defDeclaration()
+        typedef = self.symbol_table.lookup(decl.IDENTIFIER(0).getText())
+        self.emit(NEW_INSTANCE, tuple(typedef['fields']))
+        op, arg = self.declare(decl.IDENTIFIER(1).getText())
+        self.emit(op, arg)
+        return None
+
+    def visitNewTypeDef(self, ctx:syntaxParser.NewTypeDefContext):
+        # Type definitions only matter to the analyzer
+        return None
+
+    #--------------------------------------------------
+    # Control Flow Statements
+    #--------------------------------------------------
+
+    def visitIfStmt(self, ctx:syntaxParser.IfStmtContext):
+        if_stmt = ctx.if_stmt()
+        conditions = if_stmt.expression()
+        blocks = if_stmt.block()
+        end_jumps = []
+
+        for condition, block in zip(conditions, blocks):
+            self.visit(condition)
+            skip = self.emit(POP_JUMP_IF_FALSE)
+            self.compile_scoped_block(block)
+            end_jumps.append(self.emit(JUMP))
+            self.code.patch(skip, self.here())
+
+        # Else block
+        if len(blocks) > len(conditions):
+            self.compile_scoped_block(blocks[-1])
+
+        for jump in end_jumps:
+            self.code.patch(jump, self.here())
+        return None
+
+    def visitWhileStmt(self, ctx:syntaxParser.WhileStmtContext):
+        while_stmt = ctx.while_stmt()
+
+        start = self.emit(LOOP_GUARD)
+        self.visit(while_stmt.expression())
+        exit_jump = self.emit(POP_JUMP_IF_FALSE)
+
+        self.loops.append((start, [], len(self.handlers)))
+        self.compile_scoped_block(while_stmt.block())
+        _, break_jumps, _ = self.loops.pop()
+        self.emit(JUMP, start)
+
+        end = self.here()
+        self.code.patch(exit_jump, end)
+        for jump in break_jumps:
+            self.code.patch(jump, end)
+        return None
+
+    def visitContinue(self, ctx:syntaxParser.ContinueContext):
+        start, _, depth = self.loops[-1]
+        self.emit_unwind(depth)
+        self.emit(JUMP, start)
+        return None
+
+    def visitBreak(self, ctx:syntaxParser.BreakContext):
+        _, break_jumps, depth = self.loops[-1]
+        self.emit_unwind(depth)
+        break_jumps.append(self.emit(JUMP))
+        return None
+
+    def visitTryStmt(self, ctx:syntaxParser.TryStmtContext):
+        try_stmt = ctx.try_stmt()
+
+        # Like the analyzer, try/except blocks share the enclosing scope
+        setup = self.emit(SETUP_TRY)
+        self.handlers.append('try')
+        self.visit(try_stmt.block(0))
+        self.handlers.pop()
+        self.emit(POP_TRY)
+        skip = self.emit(JUMP)
+
+        self.code.patch(setup, self.here())
+        self.handlers.append('except')
+        self.visit(try_stmt.block(1))
+        self.handlers.pop()
+        self.emit(END_EXCEPT)
+
+        self.code.patch(skip, self.here())
+        return None
+
+    #--------------------------------------------------
+    # Functions
+    #--------------------------------------------------
+
+    def visitFuncStmt(self, ctx:syntaxParser.FuncStmtContext):
+        self.function_code(ctx.IDENTIFIER().getText())
+        return None
+
+    def visitReturnStmt(self, ctx:syntaxParser.ReturnStmtContext):
+        if ctx.tail_call is not None:
+            self.emit_tail_call(ctx.tail_call)
+            return None
+        expr = ctx.return_stmt().expression()
+        self.emit_unwind(0)
+        if expr:
+            self.visit(expr)
+            self.emit(RETURN_VALUE)
+        else:
+            self.emit(RETURN_NONE)
+        return None
+
+    def emit_tail_call(self, ctx):
+        """Compile a tail call into parameter stores and a jump to the start."""
+        args = ctx.arg_list().expression() if ctx.arg_list() else []
+        for expr in args:
+            self.visit(expr)
+        # The last argument is on top of the stack
+        for slot in reversed(range(len(args))):
+            self.emit(STORE_LOCAL, slot)
+        # Each tail call replaces a call by a loop iteration
+        self.emit(LOOP_GUARD)
+        self.emit(JUMP, 0)
+
+    def visitFuncCallStmt(self, ctx:syntaxParser.FuncCallStmtContext):
+        self.emit_call(ctx.function_call())
+        self.emit(POP_TOP)
+        return None
+
+    def visitFuncCallExpr(self, ctx:syntaxParser.FuncCallExprContext):
+        self.emit_call(ctx)
+        return None
+
+    def emit_call(self, ctx):
+        """Compile a call from a FuncCallExpr or function_call context."""
+        func_name = ctx.IDENTIFIER().getText()
+        if func_name == "get_error":
+            self.emit(GET_ERROR)
+            return
+
+        args = ctx.arg_list().expression() if ctx.arg_list() else []
+        for expr in args:
+            self.visit(expr)
+        if is_builtin(self.symbol_table, func_name):
+            self.emit(CALL_BUILTIN, (func_name, len(args)))
+        else:
+            func_info = self.symbol_table.global_scope.get(func_name) or self.symbol_table.lookup(func_name)
+            op = CALL_PURE if memoizable(func_info) else CALL
+            self.emit(op, (self.function_code(func_name), len(args)))
+
+    #--------------------------------------------------
+    # I/O Operations
+    #--------------------------------------------------
+
+    def visitPrintStmt(self, ctx:syntaxParser.PrintStmtContext):
+        self.visit(ctx.print_stmt().expression())
+        self.emit(PRINT)
+        return None
+
+    #--------------------------------------------------
+    # Expressions
+    #--------------------------------------------------
+
+    def visitExpression(self, ctx:syntaxParser.ExpressionContext):
+        return self.visit(ctx.logic_expr())
+
+    def visitLogicExpr(self, ctx:syntaxParser.LogicExprContext):
+        operands = ctx.comp_expr()
+        self.visit(operands[0])
+        jumps = []
+        for i in range(1, len(operands)):
+            op = ctx.getChild(2 * i - 1).symbol.type
+            jumps.append(self.emit(AND_JUMP if op == syntaxParser.AND else OR_JUMP))
+            self.visit(operands[i])
+        for jump in jumps:
+            self.code.patch(jump, self.here())
+        return None
+
+    def visitCompExpr(self, ctx:syntaxParser.CompExprContext):
+        operands = ctx.add_expr()
+        self.visit(operands[0])
+        if len(operands) == 1:
+            return None
+
+        # Chained comparisons keep the shared operand in a scratch local
+        scratch = self.code.new_local() if len(operands) > 2 else None
+        jumps = []
+        for i in range(1, len(operands)):
+            op = COMPARE_TOKENS[ctx.getChild(2 * i - 1).symbol.type]
+            if i > 1:
+                self.emit(LOAD_LOCAL, scratch)
+            self.visit(operands[i])
+            if i < len(operands) - 1:
+                self.emit(DUP_TOP)
+                self.emit(STORE_LOCAL, scratch)
+                self.emit(COMPARE, op)
+                jumps.append(self.emit(AND_JUMP))
+            else:
+                self.emit(COMPARE, op)
+        for jump in jumps:
+            self.code.patch(jump, self.here())
+        return None
+
+    def visitAddSubExpr(self, ctx:syntaxParser.AddSubExprContext):
+        operands = ctx.mul_expr()
+        ops = specialised_ops(ctx)
+        self.visit(operands[0])
+        for i in range(1, len(operands)):
+            self.visit(operands[i])
+            op = ctx.getChild(2 * i - 1).symbol.type
+            self.emit_binary(ops[i - 1], BINARY_ADD if op == syntaxParser.ADD else BINARY_SUB)
+        return None
+
+    def visitMulDivExpr(self, ctx:syntaxParser.MulDivExprContext):
+        operands = ctx.unary_expr()
+        ops = specialised_ops(ctx)
+        self.visit(operands[0])
+        for i in range(1, len(operands)):
+            self.visit(operands[i])
+            op = ctx.getChild(2 * i - 1).symbol.type
+            self.emit_binary(ops[i - 1], BINARY_MUL if op == syntaxParser.MUL else BINARY_DIV)
+        return None
+
+    def emit_binary(self, fast, checked):
+        """Emit an arithmetic operator, preceded by its specialised form when the types are known."""
+        if fast is not None:
+            self.emit(BINARY_FAST, fast)
+        self.emit(checked)
+
+    def visitUnaryMinusExpr(self, ctx:syntaxParser.UnaryMinusExprContext):
+        self.visit(ctx.unary_expr())
+        self.emit(NEGATE)
+        return None
+
+    def visitNotExpr(self, ctx:syntaxParser.NotExprContext):
+        self.visit(ctx.expression())
+        self.emit(NOT)
+        return None
+
+    def visitPrimaryExpr(self, ctx:syntaxParser.PrimaryExprContext):
+        return self.visit(ctx.primary_expr())
+
+    def visitParenExpr(self, ctx:syntaxParser.ParenExprContext):
+        return self.visit(ctx.expression())
+
+    def visitTrueExpr(self, ctx:syntaxParser.TrueExprContext):
+        self.emit(LOAD_CONST, True)
+        return None
+
+    def visitFalseExpr(self, ctx:syntaxParser.FalseExprContext):
+        self.emit(LOAD_CONST, False)
+        return None
+
+    def visitIdExpr(self, ctx:syntaxParser.IdExprContext):
+        self.emit_load(ctx.IDENTIFIER().getText())
+        return None
+
+    def visitConstant(self, ctx):
+        # Expression folded by ConstantFolder
+        self.emit(LOAD_CONST, ctx.const_value)
+        return None
+
+    def visitNumberExpr(self, ctx:syntaxParser.NumberExprContext):
+        text = ctx.NUMBER().getText()
+        self.emit(LOAD_CONST, float(text) if '.' in text else int(text))
+        return None
+
+    def visitStringExpr(self, ctx:syntaxParser.StringExprContext):
+        self.emit(LOAD_CONST, ctx.STRING().getText()[1:-1])
+        return None
+
+    def visitCharExpr(self, ctx:syntaxParser.CharExprContext):
+        self.emit(LOAD_CONST, ctx.CHARACTER().getText()[1:-1])
+        return None
+
+    def visitIntArray(self, ctx:syntaxParser.IntArrayContext):
+        values = []
+        for token in ctx.int_Array().NUMBER():
+            text = token.getText()
+            values.append(float(text) if '.' in text else int(text))
+        self.emit(LOAD_CONST, pack_array(values))
+        return None
+
+    def visitCharArray(self, ctx:syntaxParser.CharArrayContext):
+        self.emit(LOAD_CONST, [token.getText()[1:-1] for token in ctx.char_Array().CHARACTER()])
+        return None
+
+    def visitStringArray(self, ctx:syntaxParser.StringArrayContext):
+        self.emit(LOAD_CONST, [token.getText()[1:-1] for token in ctx.strArray().STRING()])
+        return None
+
+    def visitArrayAccessExpr(self, ctx:syntaxParser.ArrayAccessExprContext):
+        name = ctx.IDENTIFIER().getText()
+        self.emit_load(name)
+        self.visit(ctx.expression())
+        self.emit(INDEX, name)
+        return None
+
+    def visitTypedefField(self, ctx:syntaxParser.TypedefFieldContext):
+        field = ctx.type_defVar()
+        self.emit_load(field.IDENTIFIER(0).getText())
+        self.emit(GET_FIELD, field.IDENTIFIER(1).getText())
+        return None
+
+    def defaultResult(self):
+        return None
@@ -0,0 +1,345 @@
+"""
+BytecodeVM.py - Stack machine that executes code compiled by BytecodeCompiler.
+It implements the same language semantics and error messages as
+RuntimeVisitor, but runs a flat instruction array in a single dispatch loop.
+"""
+import operator
+
+from BytecodeCompiler import (
+    LOAD_CONST, LOAD_LOCAL, STORE_LOCAL, LOAD_GLOBAL, STORE_GLOBAL,
+    BINARY_ADD, BINARY_SUB, BINARY_MUL, BINARY_DIV, COMPARE,
+    POP_JUMP_IF_FALSE, JUMP, LOOP_GUARD, AND_JUMP, OR_JUMP, NOT, NEGATE,
+    INDEX, GET_FIELD, SET_FIELD, NEW_INSTANCE, ENSURE_LIST, CALL, GET_ERROR,
+    RETURN_VALUE, RETURN_NONE, PRINT, POP_TOP, DUP_TOP,
+    SETUP_TRY, POP_TRY, END_EXCEPT, BINARY_FAST, CALL_BUILTIN, CALL_PURE,
+)
+from RuntimeVisitor import (
+    InterpreterRuntimeError, ExecutionBudget, report_error, DEFAULT_MAX_STEPS, DEFAULT_TIMEOUT,
+    DEFAULT_MAX_DEPTH,
+)
+from OutputSink import MemorySink
+from Builtins import BuiltinError, call_builtin
+from ArrayStorage import ARRAY_TYPES
+from MemoCache import MemoTable, MISSING, memo_key
+
+# Operator functions in COMPARE argument order
+COMPARE_FUNCS = (operator.lt, operator.le, operator.gt, operator.ge, operator.eq, operator.ne)
+
+
+class BytecodeVM:
+    """
+    Executes compiled programs.
+    Global variables are loaded from the symbol table before a run and written
+    back afterwards, so sessions can switch freely between lines. A VM kept
+    for a whole session only loads the globals defined since its last run,
+    and can leave writing them back to store_globals().
+
+    Calls do not recurse in Python: the activations of the calling
+    functions are kept in a list, so the depth of PyOops recursion is only
+    limited by max_depth and memory.
+    """
+    def __init__(self, symbol_table, max_steps=DEFAULT_MAX_STEPS, timeout=DEFAULT_TIMEOUT, output=None,
+                 max_depth=DEFAULT_MAX_DEPTH, memo_size=None):
+        """
+        Initialize the VM with the symbol table and safety limits.
+
+        Args:
+            symbol_table: The symbol table holding global variables
+            max_steps: Loop iterations allowed in one run, None for no limit
+            timeout: Maximum execution time in seconds, None for no limit
+            output: OutputSink receiving printed lines, None to collect them
+                in memory
+            max_depth: Nested calls allowed before a "Stack overflow."
+                runtime error, None for no limit
+            memo_size: Results cached per pure function, None to disable
+                memoization
+        """
+        self.symbol_table = symbol_table
+        self.max_depth = max_depth
+        self.output = output if output is not None else MemorySink()  # Receives program output
+        self.globals = {}                   # Global variable name -> value
+        self.loaded_globals = 0             # Globals of the symbol table already in self.globals
+        self.is_in_try_block = False        # Flag for try-except blocks
+        self.last_error = None              # Last error message
+        self._current_exception = None      # Current exception in try-except
+        self.memo = MemoTable(memo_size)    # Results of pure functions
+
+        # Loop safety limits
+        self.budget = ExecutionBudget(max_steps, timeout)
+
+    #--------------------------------------------------
+    # Program Execution
+    #--------------------------------------------------
+
+    def run(self, main, write_back=True):
+        """
+        Execute a compiled program.
+
+        Args:
+            main: The CodeObject returned by BytecodeCompiler.compile
+            write_back: Whether to store global values in the symbol table
+                after the run, rather than on a later store_globals() call
+
+        Returns:
+            The program output joined by newlines, or None if the output
+            sink passed it on
+        """
+        self.load_globals()
+        self.output.reset()
+        self.is_in_try_block = False
+        self._current_exception = None
+        self.budget.start()
+        try:
+            self.execute(main, [])
+        finally:
+            self.output.flush()
+            if write_back:
+                self.store_globals()
+        return self.output.getvalue()
+
+    def load_globals(self):
+        """Copy the values of globals defined since the last run from the symbol table."""
+        self.globals.update(self.symbol_table.global_values(self.loaded_globals))
+        self.loaded_globals = len(self.symbol_table.global_scope)
+
+    def store_globals(self):
+        """Write the global values back into the symbol table."""
+        self.symbol_table.store_global_values(self.globals)
+
+    def execute(self, code_object, args):
+        """
+        Run one CodeObject to completion, including every function it calls.
+
+        Args:
+            code_object: The function or program to run
+            args: Argument values, bound to the first local slots
+
+        Returns:
+            The value of the executed return statement, or None
+        """
+        code = code_object.code
+        free_frames = code_object.free_frames
+        if free_frames:
+            frame = free_frames.pop()
+            frame[:len(args)] = args
+        else:
+            frame = args + [None] * (code_object.nlocals - len(args))
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        handlers = []           # Active try blocks: (except address, stack depth, previous try flag)
+        excepts = []            # Try flags to restore when the running except blocks end
+        globals_ = self.globals
+        compare_funcs = COMPARE_FUNCS
+        budget = self.budget
+        # Suspended callers: (code object, pc, frame, stack, handlers, excepts)
+        calls = []
+        # Results to cache when memoized calls return: (call depth, MemoCache, key)
+        memo_calls = []
+        memo = self.memo if self.memo.size is not None else None
+        max_depth = self.max_depth if self.max_depth is not None else float('inf')
+        pc = 0
+
+        while True:
+            try:
+                while True:
+                    op, arg = code[pc]
+                    pc += 1
+
+                    if op == LOAD_LOCAL:
+                        push(frame[arg])
+                    elif op == LOAD_CONST:
+                        push(arg)
+                    elif op == STORE_LOCAL:
+                        frame[arg] = pop()
+                    elif op == LOAD_GLOBAL:
+                        push(globals_[arg])
+                    elif op == STORE_GLOBAL:
+                        globals_[arg] = pop()
+                    elif op == COMPARE:
+                        right = pop()
+                        stack[-1] = compare_funcs[arg](stack[-1], right)
+                    elif op == BINARY_FAST:
+                        try:
+                            result = arg(stack[-2], stack[-1])
+                        except (TypeError, ZeroDivisionError):
+                            # Leave the operands to the checked instruction that follows
+                            continue
+                        pop()
+                        stack[-1] = result
+                        pc += 1
+                    elif op == POP_JUMP_IF_FALSE:
+                        if not pop():
+                            pc = arg
+                    elif op == JUMP:
+                        pc = arg
+                    elif op == BINARY_ADD:
+                        right = pop()
+                        left = stack[-1]
+                        if isinstance(left, str) or isinstance(right, str):
+                            stack[-1] = str(left) + str(right)
+                        elif isinstance(left, (int, float)) and isinstance(right, (int, float)):
+                            stack[-1] = left + right
+                        else:
+                            report_error(self, "Invalid operands for addition.")
+                    elif op == BINARY_SUB:
+                        right = pop()
+                        left = stack[-1]
+                        if isinstance(left, (int, float)) and isinstance(right, (int, float)):
+                            stack[-1] = left - right
+                        else:
+                            report_error(self, "Invalid operands for subtraction.")
+                    elif op == LOOP_GUARD:
+                        budget.steps += 1
+                        if budget.steps >= budget.next_check:
+                            message = budget.check()
+                            if message:
+                                report_error(self, message)
+                    elif op == BINARY_MUL or op == BINARY_DIV:
+                        right = pop()
+                        left = stack[-1]
+                        if not isinstance(left, (int, float)) or not isinstance(right, (int, float)):
+                            report_error(self, "Invalid operands for multiplication/division.")
+                        if op == BINARY_MUL:
+                            stack[-1] = left * right
+                        else:
+                            if right == 0:
+                                report_error(self, "Division by zero.")
+                            stack[-1] = left / right
+                    elif op == CALL or op == CALL_PURE:
+                        function, argc = arg
+                        if argc:
+                            call_args = stack[-argc:]
+                            del stack[-argc:]
+                        else:
+                            call_args = []
+                        if op == CALL_PURE and memo is not None:
+                            # A pure function only runs for arguments it has no result for
+                            cache = memo.cache(function.name)
+                            key = memo_key(call_args)
+                            value = cache.lookup(key)
+                            if value is not MISSING:
+                                push(value)
+                                continue
+                            memo_calls.append((len(calls) + 1, cache, key))
+                        if len(calls) >= max_depth:
+                            report_error(self, "Stack overflow.")
+                        # Suspend the caller and enter the function
+                        calls.append((code_object, pc, frame, stack, handlers, excepts))
+                        code_object = function
+                        code = function.code
+                        free_frames = function.free_frames
+                        if free_frames:
+                            frame = free_frames.pop()
+                            frame[:argc] = call_args
+                        else:
+                            frame = call_args + [None] * (function.nlocals - argc)
+                        stack = []
+                        push = stack.append
+                        pop = stack.pop
+                        handlers = []
+                        excepts = []
+                        pc = 0
+                    elif op == RETURN_VALUE or op == RETURN_NONE:
+                        value = pop() if op == RETURN_VALUE else None
+                        frame[:] = code_object.blank
+                        free_frames.append(frame)
+                        if not calls:
+                            return value
+                        if memo_calls and memo_calls[-1][0] == len(calls):
+                            _, cache, key = memo_calls.pop()
+                            cache.store(key, value)
+                        # Resume the caller with the value on its stack
+                        code_object, pc, frame, stack, handlers, excepts = calls.pop()
+                        code = code_object.code
+                        free_frames = code_object.free_frames
+                        push = stack.append
+                        pop = stack.pop
+                        push(value)
+                    elif op == INDEX:
+                        index = pop()
+                        array = stack[-1]
+                        if not isinstance(array, ARRAY_TYPES):
+                            report_error(self, f"Variable '{arg}' is not an array.")
+                        if not isinstance(index, int):
+                            report_error(self, f"Array index must be an integer, got '{type(index).__name__}'.")
+                        if index < 0 or index >= len(array):
+                            report_error(self, f"Index {index} out of bounds for array '{arg}'.")
+                        stack[-1] = array[index]
+                    elif op == AND_JUMP:
+                        if stack[-1]:
+                            pop()
+                        else:
+                            stack[-1] = False
+                            pc = arg
+                    elif op == OR_JUMP:
+                        if stack[-1]:
+                            stack[-1] = True
+                            pc = arg
+                        else:
+                            pop()
+                    elif op == PRINT:
+                        self.output.write(str(pop()))
+                    elif op == POP_TOP:
+                        pop()
+                    elif op == DUP_TOP:
+                        push(stack[-1])
+                    elif op == NOT:
+                        stack[-1] = not bool(stack[-1])
+                    elif op == NEGATE:
+                        if not isinstance(stack[-1], (int, float)):
+                            report_error(self, "Cannot apply unary minus to non-numeric value.")
+                        stack[-1] = -stack[-1]
+                    elif op == GET_FIELD:
+                        stack[-1] = stack[-1].get(arg)
+                    elif op == SET_FIELD:
+                        value = pop()
+                        pop()[arg] = value
+                    elif op == NEW_INSTANCE:
+                        push(dict.fromkeys(arg))
+                    elif op == ENSURE_LIST:
+                        if not isinstance(stack[-1], ARRAY_TYPES):
+                            stack[-1] = [stack[-1]]
+                    elif op == GET_ERROR:
+                        if not self._current_exception:
+                            raise RuntimeError("get_error() called outside of except block")
+                        push(str(self._current_exception))
+                    elif op == CALL_BUILTIN:
+                        name, argc = arg
+                        # stack[-0:] would take the whole stack
+                        call_args = stack[len(stack) - argc:]
+                        del stack[len(stack) - argc:]
+                        try:
+                            push(call_builtin(name, call_args))
+                        except BuiltinError as e:
+                            report_error(self, e.message)
+                    elif op == SETUP_TRY:
+                        handlers.append((arg, len(stack), self.is_in_try_block))
+                        self.is_in_try_block = True
+                    elif op == POP_TRY:
+                        self.is_in_try_block = handlers.pop()[2]
+                    elif op == END_EXCEPT:
+                        self._current_exception = None
+                        self.is_in_try_block = excepts.pop()
+                    else:
+                        raise RuntimeError(f"Unknown opcode {op}")
+
+            except InterpreterRuntimeError as e:
+                # Unwind to the innermost function with an active try block
+                while not handlers:
+                    if not calls:
+                        raise
+                    code_object, pc, frame, stack, handlers, excepts = calls.pop()
+                # Calls that were abandoned return no result
+                while memo_calls and memo_calls[-1][0] > len(calls):
+                    memo_calls.pop()
+                code = code_object.code
+                free_frames = code_object.free_frames
+                push = stack.append
+                pop = stack.pop
+                # Jump to the innermost except block of that function
+                pc, depth, previous_try_flag = handlers.pop()
+                del stack[depth:]
+                excepts.append(previous_try_flag)
+                self._current_exception = str(e)
+                self.is_in_try_block = False  # Errors in except block should crash
@@ -0,0 +1,639 @@
+"""
+ClosureCompiler.py - Execution engine that converts the program into closures.
+Every expression and statement of the lowered program (see CompactAST) is
+compiled once into a nested Python function taking the current frame, so
+operators, names and child nodes are resolved at compile time instead of on
+every evaluation.
+"""
+from syntaxParser import syntaxParser
+from syntaxVisitor import syntaxVisitor
+from RuntimeVisitor import (
+    InterpreterRuntimeError, UncaughtRuntimeError, ExecutionBudget, report_error, stack_overflow,
+    specialised_op, BREAK, CONTINUE, TAIL_CALL, COMPARE_FUNCS, DEFAULT_MAX_STEPS,
+    DEFAULT_TIMEOUT,
+)
+from BytecodeCompiler import DEFAULT_VALUES
+from OutputSink import MemorySink
+from Builtins import BuiltinError, is_builtin, call_builtin
+from ArrayStorage import ARRAY_TYPES
+from MemoCache import MemoTable, MISSING, memo_key
+
+# Compiled statements return the same completion codes as RuntimeVisitor:
+# None, BREAK, CONTINUE, TAIL_CALL or a 1-tuple holding a returned value.
+
+# Two-operand comparisons get a dedicated closure without the operator call
+COMPARISONS = {
+    syntaxParser.LT: lambda left, right: lambda frame: left(frame) < right(frame),
+    syntaxParser.LE: lambda left, right: lambda frame: left(frame) <= right(frame),
+    syntaxParser.GT: lambda left, right: lambda frame: left(frame) > right(frame),
+    syntaxParser.GE: lambda left, right: lambda frame: left(frame) >= right(frame),
+    syntaxParser.EQ: lambda left, right: lambda frame: left(frame) == right(frame),
+    syntaxParser.NE: lambda left, right: lambda frame: left(frame) != right(frame),
+}
+
+
+class CompiledFunction:
+    """A compiled function body and the size of its frame."""
+    def __init__(self, name, nparams):
+        self.name = name
+        self.nparams = nparams
+        self.nlocals = nparams
+        self.padding = []       # Local slots appended to the arguments on each call
+        self.body = None        # Compiled body, set once compilation finishes
+        self.memo = None        # MemoCache of a memoized function
+
+    def new_local(self):
+        """Reserve a new local slot."""
+        self.nlocals += 1
+        return self.nlocals - 1
+
+
+class ClosureCompiler(syntaxVisitor):
+    """
+    Visitor that compiles a lowered program into closures and runs them.
+    Each visit method takes a CompactAST node and returns a closure:
+    expressions return their value, statements return a completion code.
+    Compiled functions are kept, so a compiler reused for a whole session
+    compiles every function once.
+    """
+    def __init__(self, symbol_table, max_steps=DEFAULT_MAX_STEPS, timeout=DEFAULT_TIMEOUT, output=None,
+                 memo_size=None):
+        """
+        Initialize the compiler with the symbol table and safety limits.
+
+        Args:
+            symbol_table: The symbol table filled in by StatementAnalyzer
+            max_steps: Loop iterations allowed in one run, None for no limit
+            timeout: Maximum execution time in seconds, None for no limit
+            output: OutputSink receiving printed lines, None to collect them
+                in memory
+            memo_size: Results cached per pure function, None to disable
+                memoization
+        """
+        super().__init__()
+        self.symbol_table = symbol_table
+        self.output = output if output is not None else MemorySink()  # Receives program output
+        self.globals = {}                   # Global variable name -> value
+        self.loaded_globals = 0             # Globals of the symbol table already in self.globals
+        self.is_in_try_block = False        # Flag for try-except blocks
+        self.last_error = None              # Last error message
+        self._current_exception = None      # Current exception in try-except
+        self.functions = {}                 # Function name -> CompiledFunction
+        self.memo = MemoTable(memo_size)    # Results of pure functions
+        self.function = None                # CompiledFunction receiving new local slots
+        self.scopes = []                    # Compile-time block scopes: name -> local slot
+        self.program = None                 # CompactAST Program being compiled
+        self.checked_ops = {
+            syntaxParser.ADD: self.checked_add,
+            syntaxParser.SUB: self.checked_sub,
+            syntaxParser.MUL: self.checked_mul,
+            syntaxParser.DIV: self.checked_div,
+        }
+
+        # Loop safety limits
+        self.budget = ExecutionBudget(max_steps, timeout)
+
+    #--------------------------------------------------
+    # Program Execution
+    #--------------------------------------------------
+
+    def run(self, program, write_back=True):
+        """
+        Compile and execute a program.
+
+        Args:
+            program: The CompactAST Program lowered from an analyzed tree
+            write_back: Whether to store global values in the symbol table
+                after the run, rather than on a later store_globals() call
+
+        Returns:
+            The program output joined by newlines, or None if the output
+            sink passed it on
+        """
+        main = self.compile(program)
+        self.load_globals()
+        # Compiled print statements hold on to the sink's write method
+        self.output.reset()
+        self.is_in_try_block = False
+        self._current_exception = None
+        self.budget.start()
+        try:
+            main.body([None] * main.nlocals)
+        except UncaughtRuntimeError as e:
+            self.is_in_try_block = False
+            report_error(self, e.message)
+        finally:
+            self.output.flush()
+            if write_back:
+                self.store_globals()
+        return self.output.getvalue()
+
+    def load_globals(self):
+        """Copy the values of globals defined since the last run from the symbol table."""
+        self.globals.update(self.symbol_table.global_values(self.loaded_globals))
+        self.loaded_globals = len(self.symbol_table.global_scope)
+
+    def store_globals(self):
+        """Write the global values back into the symbol table."""
+        self.symbol_table.store_global_values(self.globals)
+
+    def compile(self, program):
+        """Compile the top-level statements into a CompiledFunction."""
+        self.program = program
+        self.scopes = []
+        self.function = CompiledFunction('<program>', 0)
+        self.function.body = self.visit(program)
+        return self.function
+
+    #--------------------------------------------------
+    # Helpers
+    #--------------------------------------------------
+
+    def declare(self, name):
+        """Declare a variable in the innermost scope and return a setter closure factory."""
+        if not self.scopes:
+            return self.global_setter(name)
+        slot = self.function.new_local()
+        self.scopes[-1][name] = slot
+        return self.local_setter(slot)
+
+    def global_setter(self, name):
+        globals_ = self.globals
+        def setter(value):
+            def store(frame):
+                globals_[name] = value(frame)
+            return store
+        return setter
+
+    def local_setter(self, slot):
+        def setter(value):
+            def store(frame):
+                frame[slot] = value(frame)
+            return store
+        return setter
+
+    def compile_load(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                slot = scope[name]
+                return lambda frame: frame[slot]
+        globals_ = self.globals
+        return lambda frame: globals_[name]
+
+    def compile_store(self, name, value):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return self.local_setter(scope[name])(value)
+        return self.global_setter(name)(value)
+
+    def compile_statements(self, statements):
+        """Compile a statement list into a single block closure."""
+        compiled = [self.visit(stmt) for stmt in statements]
+        compiled = tuple(stmt for stmt in compiled if stmt is not None)
+
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def block(frame):
+            for stmt in compiled:
+                signal = stmt(frame)
+                if signal is not None:
+                    return signal
+            return None
+        return block
+
+    def compile_scoped_block(self, block):
+        """Compile a block in its own variable scope."""
+        self.scopes.append({})
+        compiled = self.compile_statements(block.statements)
+        self.scopes.pop()
+        return compiled
+
+    def function_for(self, name):
+        """Return the CompiledFunction for a function, compiling it on first use."""
+        if name in self.functions:
+            return self.functions[name]
+
+        # Functions of earlier executions in the session were lowered then
+        definition = self.program.functions.get(name)
+        if definition is None:
+            func_info = self.symbol_table.global_scope.get(name) or self.symbol_table.lookup(name)
+            definition = func_info['lowered']
+        function = CompiledFunction(name, len(definition.params))
+        if definition.memoizable:
+            function.memo = self.memo.cache(name)
+        self.functions[name] = function
+
+        saved = (self.function, self.scopes)
+        self.function = function
+        self.scopes = [{param: slot for slot, param in enumerate(definition.params)}]
+        function.body = self.compile_statements(definition.body.statements)
+        function.padding = [None] * (function.nlocals - function.nparams)
+        self.function, self.scopes = saved
+        return function
+
+    #--------------------------------------------------
+    # Program and Blocks
+    #--------------------------------------------------
+
+    def visitProgram(self, node):
+        return self.compile_statements(node.statements)
+
+    def visitBlock(self, node):
+        # Nested blocks, loop and if bodies get their own variable scope
+        return self.compile_scoped_block(node)
+
+    #--------------------------------------------------
+    # Declarations and Assignment
+    #--------------------------------------------------
+
+    def visitVarDecl(self, node):
+        data_type = node.data_type
+
+        if node.value is not None:
+            value = self.visit(node.value)
+            if data_type.endswith('[]'):
+                element = value
+                def value(frame):
+                    result = element(frame)
+                    return result if isinstance(result, ARRAY_TYPES) else [result]
+        elif data_type.endswith('[]'):
+            value = lambda frame: []
+        else:
+            default = DEFAULT_VALUES.get(data_type)
+            value = lambda frame: default
+
+        return self.declare(node.name)(value)
+
+    def visitAssign(self, node):
+        return self.compile_store(node.name, self.visit(node.value))
+
+    def visitFieldAssign(self, node):
+        value = self.visit(node.value)
+        instance = self.compile_load(node.instance)
+        field = node.field
+        def assign_field(frame):
+            instance(frame)[field] = value(frame)
+        return assign_field
+
+    def visitInstanceDecl(self, node):
+        fields = node.fields
+        return self.declare(node.name)(lambda frame: dict.fromkeys(fields))
+
+    #--------------------------------------------------
+    # Control Flow Statements
+    #--------------------------------------------------
+
+    def visitIf(self, node):
+        conditions = [self.visit(condition) for condition in node.conditions]
+        blocks = [self.visit(block) for block in node.blocks]
+        else_block = self.visit(node.else_block) if node.else_block is not None else None
+
+        if len(conditions) == 1:
+            condition, then_block = conditions[0], blocks[0]
+            if else_block is None:
+                def if_then(frame):
+                    if condition(frame):
+                        return then_block(frame)
+                    return None
+                return if_then
+
+            def if_else(frame):
+                if condition(frame):
+                    return then_block(frame)
+                return else_block(frame)
+            return if_else
+
+        branches = tuple(zip(conditions, blocks))
+        def if_chain(frame):
+            for condition, block in branches:
+                if condition(frame):
+                    return block(frame)
+            if else_block is not None:
+                return else_block(frame)
+            return None
+        return if_chain
+
+    def visitWhile(self, node):
+        condition = self.visit(node.condition)
+        body = self.visit(node.body)
+        runtime = self
+        budget = self.budget
+
+        def loop(frame):
+            while True:
+                budget.steps += 1
+                if budget.steps >= budget.next_check:
+                    message = budget.check()
+                    if message:
+                        report_error(runtime, message)
+
+                if not condition(frame):
+                    return None
+                signal = body(frame)
+                if signal is not None:
+                    if signal is BREAK:
+                        return None
+                    if signal is not CONTINUE:
+                        return signal
+        return loop
+
+    def visitContinue(self, node):
+        return lambda frame: CONTINUE
+
+    def visitBreak(self, node):
+        return lambda frame: BREAK
+
+    def visitTry(self, node):
+        # Like the analyzer, try/except blocks share the enclosing scope
+        try_block = self.compile_statements(node.body.statements)
+        except_block = self.compile_statements(node.handler.statements)
+        runtime = self
+
+        def try_except(frame):
+            previous_try_flag = runtime.is_in_try_block
+            try:
+                runtime.is_in_try_block = True
+                return try_block(frame)
+            except UncaughtRuntimeError:
+                raise
+            except InterpreterRuntimeError as e:
+                runtime._current_exception = str(e)
+                runtime.is_in_try_block = False  # Errors in except block should crash
+                signal = except_block(frame)
+                runtime._current_exception = None
+                return signal
+            finally:
+                runtime.is_in_try_block = previous_try_flag
+        return try_except
+
+    #--------------------------------------------------
+    # Functions
+    #--------------------------------------------------
+
+    def visitFuncDef(self, node):
+        self.function_for(node.name)
+        return None
+
+    def visitReturn(self, node):
+        value = self.visit(node.value)
+        return lambda frame: (value(frame),)
+
+    def visitTailCall(self, node):
+        args = tuple(self.visit(arg) for arg in node.args)
+        function = self.function
+        runtime = self
+        budget = self.budget
+
+        def tail_call(frame):
+            budget.steps += 1
+            if budget.steps >= budget.next_check:
+                message = budget.check()
+                if message:
+                    report_error(runtime, message)
+            # Evaluate every argument before the first parameter changes
+            frame[:function.nparams] = [arg(frame) for arg in args]
+            return TAIL_CALL
+        return tail_call
+
+    def visitCallStmt(self, node):
+        call = self.visit(node.call)
+        def call_stmt(frame):
+            call(frame)
+        return call_stmt
+
+    def visitCall(self, node):
+        if node.name == "get_error":
+            runtime = self
+            def get_error(frame):
+                if not runtime._current_exception:
+                    raise RuntimeError("get_error() called outside of except block")
+                return str(runtime._current_exception)
+            return get_error
+
+        if is_builtin(self.symbol_table, node.name):
+            return self.builtin_call(node)
+
+        function = self.function_for(node.name)
+        args = tuple(self.visit(arg) for arg in node.args)
+        runtime = self
+
+        memo = function.memo
+        if memo is not None:
+            # A pure function only runs for arguments it has no result for
+            def memo_call(frame):
+                values = [arg(frame) for arg in args]
+                key = memo_key(values)
+                value = memo.lookup(key)
+                if value is MISSING:
+                    value = runtime.execute_function(function, values + function.padding)
+                    memo.store(key, value)
+                return value
+            return memo_call
+
+        def call(frame):
+            callee_frame = [arg(frame) for arg in args]
+            callee_frame += function.padding
+            try:
+                signal = function.body(callee_frame)
+                while signal is TAIL_CALL:
+                    signal = function.body(callee_frame)
+            except RecursionError:
+                # Calls nest Python frames, bounded by Python's recursion limit
+                stack_overflow(runtime)
+            if signal.__class__ is tuple:
+                return signal[0]
+            return None
+        return call
+
+    def execute_function(self, function, frame):
+        """
+        Run a compiled function, as the call closures of visitCall do inline.
+
+        Args:
+            function: The CompiledFunction to run
+            frame: The arguments followed by function.padding
+
+        Returns:
+            The function's return value
+        """
+        try:
+            signal = function.body(frame)
+            while signal is TAIL_CALL:
+                signal = function.body(frame)
+        except RecursionError:
+            stack_overflow(self)
+        if signal.__class__ is tuple:
+            return signal[0]
+        return None
+
+    def builtin_call(self, node):
+        name = node.name
+        args = tuple(self.visit(arg) for arg in node.args)
+        runtime = self
+        def builtin_call(frame):
+            try:
+                return call_builtin(name, [arg(frame) for arg in args])
+            except BuiltinError as e:
+                report_error(runtime, e.message)
+        return builtin_call
+
+    #--------------------------------------------------
+    # I/O Operations
+    #--------------------------------------------------
+
+    def visitPrint(self, node):
+        value = self.visit(node.value)
+        write = self.output.write
+        def print_stmt(frame):
+            write(str(value(frame)))
+        return print_stmt
+
+    #--------------------------------------------------
+    # Expressions
+    #--------------------------------------------------
+
+    def visitLogic(self, node):
+        first = self.visit(node.operands[0])
+        rest = tuple(
+            (op == syntaxParser.AND, self.visit(operand))
+            for op, operand in zip(node.ops, node.operands[1:])
+        )
+
+        # Short-circuit exactly like RuntimeVisitor.visitLogicExpr
+        def logic(frame):
+            result = first(frame)
+            for is_and, operand in rest:
+                if is_and:
+                    if not result:
+                        return False
+                    result = result and operand(frame)
+                else:
+                    if result:
+                        return True
+                    result = result or operand(frame)
+            return result
+        return logic
+
+    def visitCompare(self, node):
+        operands = [self.visit(operand) for operand in node.operands]
+        if len(operands) == 2:
+            return COMPARISONS[node.ops[0]](operands[0], operands[1])
+
+        first = operands[0]
+        rest = tuple(zip((COMPARE_FUNCS[op] for op in node.ops), operands[1:]))
+        def chain(frame):
+            left = first(frame)
+            for compare, operand in rest:
+                right = operand(frame)
+                if not compare(left, right):
+                    return False
+                left = right
+            return True
+        return chain
+
+    def visitArith(self, node):
+        op_types = node.op_types or [(None, None)] * len(node.ops)
+        result = self.visit(node.operands[0])
+        for op, (left_type, right_type), operand in zip(node.ops, op_types, node.operands[1:]):
+            right = self.visit(operand)
+            fast = specialised_op(op, left_type, right_type)
+            result = self.compile_binary(result, right, fast, self.checked_ops[op])
+        return result
+
+    def compile_binary(self, left_operand, right_operand, fast, checked):
+        """
+        Compile an arithmetic operator.
+
+        Args:
+            left_operand: Closure computing the left operand
+            right_operand: Closure computing the right operand
+            fast: Operation specialised for the static operand types, or None
+            checked: Operation with the dynamic checks and error messages
+
+        Returns:
+            The closure computing the result
+        """
+        if fast is None:
+            def binary(frame):
+                return checked(left_operand(frame), right_operand(frame))
+            return binary
+
+        # Values that do not match the static types get the checked operation
+        def specialised(frame):
+            left = left_operand(frame)
+            right = right_operand(frame)
+            try:
+                return fast(left, right)
+            except (TypeError, ZeroDivisionError):
+                return checked(left, right)
+        return specialised
+
+    def checked_add(self, left, right):
+        if isinstance(left, str) or isinstance(right, str):
+            return str(left) + str(right)
+        if isinstance(left, (int, float)) and isinstance(right, (int, float)):
+            return left + right
+        report_error(self, "Invalid operands for addition.")
+
+    def checked_sub(self, left, right):
+        if isinstance(left, (int, float)) and isinstance(right, (int, float)):
+            return left - right
+        report_error(self, "Invalid operands for subtraction.")
+
+    def checked_mul(self, left, right):
+        if not isinstance(left, (int, float)) or not isinstance(right, (int, float)):
+            report_error(self, "Invalid operands for multiplication/division.")
+        return left * right
+
+    def checked_div(self, left, right):
+        if not isinstance(left, (int, float)) or not isinstance(right, (int, float)):
+            report_error(self, "Invalid operands for multiplication/division.")
+        if right == 0:
+            report_error(self, "Division by zero.")
+        return left / right
+
+
+    def visitNegate(self, node):
+        operand = self.visit(node.operand)
+        runtime = self
+        def negate(frame):
+            value = operand(frame)
+            if not isinstance(value, (int, float)):
+                report_error(runtime, "Cannot apply unary minus to non-numeric value.")
+            return -value
+        return negate
+
+    def visitNot(self, node):
+        operand = self.visit(node.operand)
+        return lambda frame: not operand(frame)
+
+    def visitConst(self, node):
+        value = node.value
+        return lambda frame: value
+
+    def visitName(self, node):
+        return self.compile_load(node.name)
+
+    def visitIndex(self, node):
+        name = node.name
+        array_operand = self.compile_load(name)
+        index_operand = self.visit(node.index)
+        runtime = self
+
+        def index_array(frame):
+            array = array_operand(frame)
+            if not isinstance(array, ARRAY_TYPES):
+                report_error(runtime, f"Variable '{name}' is not an array.")
+            index = index_operand(frame)
+            if not isinstance(index, int):
+                report_error(runtime, f"Array index must be an integer, got '{type(index).__name__}'.")
+            if index < 0 or index >= len(array):
+                report_error(runtime, f"Index {index} out of bounds for array '{name}'.")
+            return array[index]
+        return index_array
+
+    def visitField(self, node):
+        instance = self.compile_load(node.instance)
+        name = node.field
+        return lambda frame: instance(frame).get(name)
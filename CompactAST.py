@@ -0,0 +1,320 @@
+"""
+CompactAST.py - Lightweight syntax tree lowered from an analyzed parse tree.
+ANTLR contexts keep their parent, children, tokens and parser alive; the
+nodes here only hold what execution needs, use __slots__ and can be pickled,
+so a lowered program can be cached or sent to another process.
+"""
+from syntaxParser import syntaxParser
+from syntaxVisitor import syntaxVisitor
+from ConstantFolder import decode_number
+from ArrayStorage import pack_array
+from MemoCache import memoizable
+
+#--------------------------------------------------
+# Nodes
+#--------------------------------------------------
+
+class Node:
+    """
+    Base class of the compact nodes. Fields are given positionally in
+    __slots__ order, and accept() dispatches to visit<ClassName>.
+    """
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        fields = ", ".join(repr(getattr(self, name)) for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def accept(self, visitor):
+        return getattr(visitor, 'visit' + type(self).__name__)(self)
+
+
+# Statements
+
+class Program(Node):
+    __slots__ = ('statements', 'functions')     # functions: name -> FuncDef
+
+class Block(Node):
+    __slots__ = ('statements',)                 # As a statement, a block opens a scope
+
+class FuncDef(Node):
+    __slots__ = ('name', 'params', 'body', 'memoizable')  # params: parameter names
+
+class VarDecl(Node):
+    __slots__ = ('name', 'data_type', 'value')  # value is None without an initializer
+
+class InstanceDecl(Node):
+    __slots__ = ('name', 'fields')              # Typedef instance and its field names
+
+class Assign(Node):
+    __slots__ = ('name', 'value')
+
+class FieldAssign(Node):
+    __slots__ = ('instance', 'field', 'value')
+
+class If(Node):
+    __slots__ = ('conditions', 'blocks', 'else_block')
+
+class While(Node):
+    __slots__ = ('condition', 'body')
+
+class Try(Node):
+    __slots__ = ('body', 'handler')             # Both share the enclosing scope
+
+class Return(Node):
+    __slots__ = ('value',)
+
+class TailCall(Node):
+    __slots__ = ('args',)                       # Return of a call of the running function
+
+class Break(Node):
+    __slots__ = ()
+
+class Continue(Node):
+    __slots__ = ()
+
+class Print(Node):
+    __slots__ = ('value',)
+
+class CallStmt(Node):
+    __slots__ = ('call',)
+
+# Expressions
+
+class Const(Node):
+    __slots__ = ('value',)
+
+class Name(Node):
+    __slots__ = ('name',)
+
+class Field(Node):
+    __slots__ = ('instance', 'field')
+
+class Index(Node):
+    __slots__ = ('name', 'index')
+
+class Call(Node):
+    __slots__ = ('name', 'args')
+
+class Logic(Node):
+    __slots__ = ('operands', 'ops')             # ops: AND/OR token types
+
+class Compare(Node):
+    __slots__ = ('operands', 'ops')             # ops: comparison token types
+
+class Arith(Node):
+    __slots__ = ('operands', 'ops', 'op_types') # op_types: analyzer types per operator, or None
+
+class Negate(Node):
+    __slots__ = ('operand',)
+
+class Not(Node):
+    __slots__ = ('operand',)
+
+
+#--------------------------------------------------
+# Lowering
+#--------------------------------------------------
+
+class ASTLowering(syntaxVisitor):
+    """
+    Visitor that converts a parse tree that passed StatementAnalyzer (and
+    optionally ConstantFolder) into compact nodes. Folded expressions become
+    Const nodes. Every lowered function is also recorded in its symbol
+    table entry as 'lowered', so later executions in a session can call it.
+    """
+    def __init__(self, symbol_table):
+        """
+        Args:
+            symbol_table: The symbol table filled in by StatementAnalyzer
+        """
+        super().__init__()
+        self.symbol_table = symbol_table
+        self.functions = {}
+
+    def lower(self, tree):
+        """Return the Program node for a ProgramContext."""
+        self.functions = {}
+        return self.visit(tree)
+
+    def lower_statements(self, statements):
+        lowered = (self.visit(stmt) for stmt in statements)
+        return tuple(stmt for stmt in lowered if stmt is not None)
+
+    def operator_tokens(self, ctx):
+        return tuple(ctx.getChild(i).symbol.type for i in range(1, ctx.getChildCount(), 2))
+
+    #--------------------------------------------------
+    # Statements
+    #--------------------------------------------------
+
+    def visitProgram(self, ctx:syntaxParser.ProgramContext):
+        statements = self.lower_statements(ctx.statement())
+        return Program(statements, self.functions)
+
+    def visitBlock(self, ctx:syntaxParser.BlockContext):
+        return Block(self.lower_statements(ctx.statement()))
+
+    def visitBlockStmt(self, ctx:syntaxParser.BlockStmtContext):
+        return self.visit(ctx.block())
+
+    def visitFuncStmt(self, ctx:syntaxParser.FuncStmtContext):
+        name = ctx.IDENTIFIER().getText()
+        func_info = self.symbol_table.global_scope.get(name) or self.symbol_table.lookup(name)
+        params = tuple(param['name'] for param in func_info.get('params', []))
+        function = FuncDef(name, params, self.visit(ctx.block()), memoizable(func_info))
+        self.functions[name] = function
+        func_info['lowered'] = function
+        return function
+
+    def visitVarDeclStmt(self, ctx:syntaxParser.VarDeclStmtContext):
+        var_decl = ctx.variable_declaration()
+        value = self.visit(var_decl.expression()) if var_decl.expression() else None
+        return VarDecl(var_decl.IDENTIFIER().getText(), var_decl.DATA_TYPE().getText(), value)
+
+    def visitTypeDefDeclStmt(self, ctx:syntaxParser.TypeDefDeclStmtContext):
+        decl = ctx.type_defDeclaration()
+        fields = tuple(self.symbol_table.lookup(decl.IDENTIFIER(0).getText())['fields'])
+        return InstanceDecl(decl.IDENTIFIER(1).getText(), fields)
+
+    def visitNewTypeDef(self, ctx:syntaxParser.NewTypeDefContext):
+        # Type definitions only matter to the analyzer
+        return None
+
+    def visitAssignStmt(self, ctx:syntaxParser.AssignStmtContext):
+        assign = ctx.assignment()
+        value = self.visit(assign.expression())
+        if assign.IDENTIFIER():
+            return Assign(assign.IDENTIFIER().getText(), value)
+        field = assign.type_defVar()
+        return FieldAssign(field.IDENTIFIER(0).getText(), field.IDENTIFIER(1).getText(), value)
+
+    def visitIfStmt(self, ctx:syntaxParser.IfStmtContext):
+        if_stmt = ctx.if_stmt()
+        conditions = tuple(self.visit(expr) for expr in if_stmt.expression())
+        blocks = [self.visit(block) for block in if_stmt.block()]
+        else_block = blocks.pop() if len(blocks) > len(conditions) else None
+        return If(conditions, tuple(blocks), else_block)
+
+    def visitWhileStmt(self, ctx:syntaxParser.WhileStmtContext):
+        while_stmt = ctx.while_stmt()
+        return While(self.visit(while_stmt.expression()), self.visit(while_stmt.block()))
+
+    def visitTryStmt(self, ctx:syntaxParser.TryStmtContext):
+        try_stmt = ctx.try_stmt()
+        return Try(self.visit(try_stmt.block(0)), self.visit(try_stmt.block(1)))
+
+    def visitReturnStmt(self, ctx:syntaxParser.ReturnStmtContext):
+        if ctx.tail_call is not None:
+            return TailCall(self.lower_call(ctx.tail_call).args)
+        return Return(self.visit(ctx.return_stmt().expression()))
+
+    def visitBreak(self, ctx:syntaxParser.BreakContext):
+        return Break()
+
+    def visitContinue(self, ctx:syntaxParser.ContinueContext):
+        return Continue()
+
+    def visitPrintStmt(self, ctx:syntaxParser.PrintStmtContext):
+        return Print(self.visit(ctx.print_stmt().expression()))
+
+    def visitFuncCallStmt(self, ctx:syntaxParser.FuncCallStmtContext):
+        return CallStmt(self.lower_call(ctx.function_call()))
+
+    #--------------------------------------------------
+    # Expressions
+    #--------------------------------------------------
+
+    def visitConstant(self, ctx):
+        # Expression folded by ConstantFolder
+        return Const(ctx.const_value)
+
+    def visitExpression(self, ctx:syntaxParser.ExpressionContext):
+        return self.visit(ctx.logic_expr())
+
+    def visitLogicExpr(self, ctx:syntaxParser.LogicExprContext):
+        operands = tuple(self.visit(operand) for operand in ctx.comp_expr())
+        if len(operands) == 1:
+            return operands[0]
+        return Logic(operands, self.operator_tokens(ctx))
+
+    def visitCompExpr(self, ctx:syntaxParser.CompExprContext):
+        operands = tuple(self.visit(operand) for operand in ctx.add_expr())
+        if len(operands) == 1:
+            return operands[0]
+        return Compare(operands, self.operator_tokens(ctx))
+
+    def visitAddSubExpr(self, ctx:syntaxParser.AddSubExprContext):
+        operands = tuple(self.visit(operand) for operand in ctx.mul_expr())
+        if len(operands) == 1:
+            return operands[0]
+        return Arith(operands, self.operator_tokens(ctx), getattr(ctx, 'op_types', None))
+
+    def visitMulDivExpr(self, ctx:syntaxParser.MulDivExprContext):
+        operands = tuple(self.visit(operand) for operand in ctx.unary_expr())
+        if len(operands) == 1:
+            return operands[0]
+        return Arith(operands, self.operator_tokens(ctx), getattr(ctx, 'op_types', None))
+
+    def visitUnaryMinusExpr(self, ctx:syntaxParser.UnaryMinusExprContext):
+        return Negate(self.visit(ctx.unary_expr()))
+
+    def visitNotExpr(self, ctx:syntaxParser.NotExprContext):
+        return Not(self.visit(ctx.expression()))
+
+    def visitPrimaryExpr(self, ctx:syntaxParser.PrimaryExprContext):
+        return self.visit(ctx.primary_expr())
+
+    def visitParenExpr(self, ctx:syntaxParser.ParenExprContext):
+        return self.visit(ctx.expression())
+
+    def visitIdExpr(self, ctx:syntaxParser.IdExprContext):
+        return Name(ctx.IDENTIFIER().getText())
+
+    def visitTypedefField(self, ctx:syntaxParser.TypedefFieldContext):
+        field = ctx.type_defVar()
+        return Field(field.IDENTIFIER(0).getText(), field.IDENTIFIER(1).getText())
+
+    def visitArrayAccessExpr(self, ctx:syntaxParser.ArrayAccessExprContext):
+        return Index(ctx.IDENTIFIER().getText(), self.visit(ctx.expression()))
+
+    def visitFuncCallExpr(self, ctx:syntaxParser.FuncCallExprContext):
+        return self.lower_call(ctx)
+
+    def lower_call(self, ctx):
+        """Lower a FuncCallExpr or function_call context."""
+        args = tuple(self.visit(expr) for expr in ctx.arg_list().expression()) if ctx.arg_list() else ()
+        return Call(ctx.IDENTIFIER().getText(), args)
+
+    # Literals, for trees that did not go through ConstantFolder
+
+    def visitTrueExpr(self, ctx:syntaxParser.TrueExprContext):
+        return Const(True)
+
+    def visitFalseExpr(self, ctx:syntaxParser.FalseExprContext):
+        return Const(False)
+
+    def visitNumberExpr(self, ctx:syntaxParser.NumberExprContext):
+        return Const(decode_number(ctx.NUMBER().getText()))
+
+    def visitStringExpr(self, ctx:syntaxParser.StringExprContext):
+        return Const(ctx.STRING().getText()[1:-1])
+
+    def visitCharExpr(self, ctx:syntaxParser.CharExprContext):
+        return Const(ctx.CHARACTER().getText()[1:-1])
+
+    def visitIntArray(self, ctx:syntaxParser.IntArrayContext):
+        return Const(pack_array([decode_number(token.getText()) for token in ctx.int_Array().NUMBER()]))
+
+    def visitCharArray(self, ctx:syntaxParser.CharArrayContext):
+        return Const([token.getText()[1:-1] for token in ctx.char_Array().CHARACTER()])
+
+    def visitStringArray(self, ctx:syntaxParser.StringArrayContext):
+        return Const([token.getText()[1:-1] for token in ctx.strArray().STRING()])
+
+    def defaultResult(self):
+        return None
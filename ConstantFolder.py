@@ -0,0 +1,300 @@
+"""
+ConstantFolder.py - Optimisation pass run after StatementAnalyzer.
+Decodes every literal once and folds constant subexpressions such as
+2 * 3 + 1, "a" + "b" or !(true), following RuntimeVisitor's evaluation rules.
+Given the symbol table, calls of functions StatementAnalyzer proved pure
+whose arguments are all constant, such as factorial(10), are run once by a
+RuntimeVisitor during folding and replaced by their result, as long as they
+finish within FOLD_MAX_STEPS loop iterations and calls.
+Anything that would raise a runtime error is left for the engines to report.
+"""
+import contextlib
+import io
+from syntaxParser import syntaxParser
+from syntaxVisitor import syntaxVisitor
+from RuntimeVisitor import COMPARE_FUNCS, RuntimeVisitor, report_error
+from ArrayStorage import pack_array
+from Builtins import is_builtin
+from MemoCache import DEFAULT_MEMO_SIZE
+
+FOLD_MAX_STEPS = 10000  # Loop iterations and calls one folded call may take
+
+
+def decode_number(text):
+    """Convert a NUMBER token the way RuntimeVisitor.visitNumberExpr does."""
+    return float(text) if '.' in text else int(text)
+
+
+def mark_constant(ctx, value):
+    """
+    Record the value of a constant expression node.
+
+    The node's accept() is replaced so that visitors with a visitConstant
+    method receive the precomputed value instead of walking the subtree.
+    Other visitors, such as the analyzers, still see the original rule.
+
+    Args:
+        ctx: The expression context that always evaluates to value
+        value: The constant value
+
+    Returns:
+        A 1-tuple holding the value, the folder's result for constants
+    """
+    rule_accept = type(ctx).accept
+
+    def accept(visitor):
+        visit_constant = getattr(visitor, 'visitConstant', None)
+        if visit_constant is None:
+            return rule_accept(ctx, visitor)
+        return visit_constant(ctx)
+
+    ctx.const_value = value
+    ctx.accept = accept
+    return (value,)
+
+
+class CallEvaluator(RuntimeVisitor):
+    """
+    RuntimeVisitor running calls of pure functions for ConstantFolder.
+    Every call counts as a step, like a loop iteration, so deep or
+    exponential recursion is cut off by the step budget as well. Results
+    are memoized, which is safe as the functions are pure.
+    """
+    def __init__(self, symbol_table):
+        super().__init__(symbol_table, max_steps=FOLD_MAX_STEPS, timeout=None,
+                         memo_size=DEFAULT_MEMO_SIZE)
+        self.frames = [self.frame]
+
+    def evaluate(self, func_name, args):
+        """
+        Run a call of a pure function.
+
+        Args:
+            func_name: Name of the function
+            args: Constant argument values
+
+        Returns:
+            A 1-tuple holding the result, or None if the call fails, exceeds
+            the budget or returns no value
+        """
+        self.budget.start()
+        # Errors raise instead of ending the program, as inside a try block;
+        # errors in except blocks still print and exit, so hide and catch them
+        self.is_in_try_block = True
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                layout = self.frame_layout(func_name)
+                frame = layout.acquire()
+                frame[:len(args)] = args
+                value = self.execute_function(layout, frame)
+        except (Exception, SystemExit):
+            return None
+        return None if value is None else (value,)
+
+    def execute_function(self, layout, frame):
+        budget = self.budget
+        budget.steps += 1
+        if budget.steps >= budget.next_check:
+            message = budget.check()
+            if message:
+                report_error(self, message)
+        return super().execute_function(layout, frame)
+
+
+class ConstantFolder(syntaxVisitor):
+    """
+    Visitor that folds constant expressions in an analyzed parse tree.
+    Expression visitors return a 1-tuple holding the value of a constant
+    expression and None for everything else.
+
+    Array literals are decoded into a single list, or a compact numeric
+    array from ArrayStorage, shared by every evaluation: the language has
+    no element assignment, so the template is never written and needs no
+    copy.
+    """
+    def __init__(self, symbol_table=None):
+        """
+        Args:
+            symbol_table: The analyzed symbol table, needed to fold calls of
+                pure functions; None folds operators and literals only
+        """
+        super().__init__()
+        self.symbol_table = symbol_table
+        self.evaluator = None   # CallEvaluator, created for the first foldable call
+
+    def visitProgram(self, ctx:syntaxParser.ProgramContext):
+        # A session may redefine functions between programs
+        self.evaluator = None
+        return self.visitChildren(ctx)
+
+    #--------------------------------------------------
+    # Expressions
+    #--------------------------------------------------
+
+    def visitExpression(self, ctx:syntaxParser.ExpressionContext):
+        result = self.visit(ctx.logic_expr())
+        return mark_constant(ctx, result[0]) if result else None
+
+    def visitLogicExpr(self, ctx:syntaxParser.LogicExprContext):
+        results = [self.visit(operand) for operand in ctx.comp_expr()]
+        if results[0] is None:
+            return None
+        if len(results) == 1:
+            return mark_constant(ctx, results[0][0])
+
+        # A constant operand that short-circuits decides the whole chain,
+        # even when later operands are not constant
+        result = results[0][0]
+        for i in range(1, len(results)):
+            if ctx.getChild(2 * i - 1).symbol.type == syntaxParser.AND:
+                if not result:
+                    return mark_constant(ctx, False)
+                if results[i] is None:
+                    return None
+                result = result and results[i][0]
+            else:
+                if result:
+                    return mark_constant(ctx, True)
+                if results[i] is None:
+                    return None
+                result = result or results[i][0]
+        return mark_constant(ctx, result)
+
+    def visitCompExpr(self, ctx:syntaxParser.CompExprContext):
+        results = [self.visit(operand) for operand in ctx.add_expr()]
+        if results[0] is None:
+            return None
+        if len(results) == 1:
+            return mark_constant(ctx, results[0][0])
+
+        left = results[0][0]
+        for i in range(1, len(results)):
+            if results[i] is None:
+                return None
+            right = results[i][0]
+            try:
+                result = COMPARE_FUNCS[ctx.getChild(2 * i - 1).symbol.type](left, right)
+            except TypeError:
+                return None
+            if not result:
+                return mark_constant(ctx, False)
+            left = right
+        return mark_constant(ctx, result)
+
+    def visitAddSubExpr(self, ctx:syntaxParser.AddSubExprContext):
+        results = [self.visit(operand) for operand in ctx.mul_expr()]
+        if None in results:
+            return None
+
+        left = results[0][0]
+        for i in range(1, len(results)):
+            right = results[i][0]
+            if ctx.getChild(2 * i - 1).symbol.type == syntaxParser.ADD:
+                if isinstance(left, str) or isinstance(right, str):
+                    left = str(left) + str(right)
+                elif isinstance(left, (int, float)) and isinstance(right, (int, float)):
+                    left = left + right
+                else:
+                    return None
+            elif isinstance(left, (int, float)) and isinstance(right, (int, float)):
+                left = left - right
+            else:
+                return None
+        return mark_constant(ctx, left)
+
+    def visitMulDivExpr(self, ctx:syntaxParser.MulDivExprContext):
+        results = [self.visit(operand) for operand in ctx.unary_expr()]
+        if None in results:
+            return None
+
+        left = results[0][0]
+        for i in range(1, len(results)):
+            right = results[i][0]
+            if not isinstance(left, (int, float)) or not isinstance(right, (int, float)):
+                return None
+            if ctx.getChild(2 * i - 1).symbol.type == syntaxParser.MUL:
+                left = left * right
+            elif right == 0:
+                # Division by zero stays a runtime error
+                return None
+            else:
+                left = left / right
+        return mark_constant(ctx, left)
+
+    def visitUnaryMinusExpr(self, ctx:syntaxParser.UnaryMinusExprContext):
+        result = self.visit(ctx.unary_expr())
+        if result is None or not isinstance(result[0], (int, float)):
+            return None
+        return mark_constant(ctx, -result[0])
+
+    def visitNotExpr(self, ctx:syntaxParser.NotExprContext):
+        result = self.visit(ctx.expression())
+        return mark_constant(ctx, not bool(result[0])) if result else None
+
+    def visitPrimaryExpr(self, ctx:syntaxParser.PrimaryExprContext):
+        result = self.visit(ctx.primary_expr())
+        return mark_constant(ctx, result[0]) if result else None
+
+    def visitParenExpr(self, ctx:syntaxParser.ParenExprContext):
+        result = self.visit(ctx.expression())
+        return mark_constant(ctx, result[0]) if result else None
+
+    #--------------------------------------------------
+    # Literals
+    #--------------------------------------------------
+
+    def visitTrueExpr(self, ctx:syntaxParser.TrueExprContext):
+        return mark_constant(ctx, True)
+
+    def visitFalseExpr(self, ctx:syntaxParser.FalseExprContext):
+        return mark_constant(ctx, False)
+
+    def visitNumberExpr(self, ctx:syntaxParser.NumberExprContext):
+        return mark_constant(ctx, decode_number(ctx.NUMBER().getText()))
+
+    def visitStringExpr(self, ctx:syntaxParser.StringExprContext):
+        return mark_constant(ctx, ctx.STRING().getText()[1:-1])
+
+    def visitCharExpr(self, ctx:syntaxParser.CharExprContext):
+        return mark_constant(ctx, ctx.CHARACTER().getText()[1:-1])
+
+    def visitIntArray(self, ctx:syntaxParser.IntArrayContext):
+        return mark_constant(ctx, pack_array([decode_number(token.getText()) for token in ctx.int_Array().NUMBER()]))
+
+    def visitCharArray(self, ctx:syntaxParser.CharArrayContext):
+        return mark_constant(ctx, [token.getText()[1:-1] for token in ctx.char_Array().CHARACTER()])
+
+    def visitStringArray(self, ctx:syntaxParser.StringArrayContext):
+        return mark_constant(ctx, [token.getText()[1:-1] for token in ctx.strArray().STRING()])
+
+    #--------------------------------------------------
+    # Non-constant Expressions
+    #--------------------------------------------------
+
+    def visitIdExpr(self, ctx:syntaxParser.IdExprContext):
+        return None
+
+    def visitTypedefField(self, ctx:syntaxParser.TypedefFieldContext):
+        return None
+
+    def visitArrayAccessExpr(self, ctx:syntaxParser.ArrayAccessExprContext):
+        self.visit(ctx.expression())
+        return None
+
+    def visitFuncCallExpr(self, ctx:syntaxParser.FuncCallExprContext):
+        results = [self.visit(expr) for expr in ctx.arg_list().expression()] if ctx.arg_list() else []
+        if self.symbol_table is None or None in results:
+            return None
+
+        name = ctx.IDENTIFIER().getText()
+        func_info = self.symbol_table.global_scope.get(name)
+        if not func_info or not func_info.get('pure') or is_builtin(self.symbol_table, name):
+            return None
+        if self.evaluator is None:
+            self.evaluator = CallEvaluator(self.symbol_table)
+        result = self.evaluator.evaluate(name, [result[0] for result in results])
+        return mark_constant(ctx, result[0]) if result else None
+
+    def defaultResult(self):
+        return None
+
@@ -80,7 +80,9 @@ class ExpressionAnalyzer(syntaxVisitor):
             message = f"Undefined variable '{name}'"
             report_error(line, column, message)
             return None
-            
+        
+        # Runtime reads the variable through its slot address
+        ctx.address = value.get('address')
         return value['type']
 
     def visitType_defVar(self, ctx: syntaxParser.Type_defVarContext):
@@ -103,6 +105,7 @@ class ExpressionAnalyzer(syntaxVisitor):
             message = f"Field '{field_name}' not found in new-type instance '{newtype_name}'."
             report_error(line, column, message)        
         
+        ctx.address = newtype['address']
         return newtype['fields'][field_name]['type']
         
     def visitArrayAccessExpr(self, ctx: syntaxParser.ArrayAccessExprContext):
@@ -127,6 +130,7 @@ class ExpressionAnalyzer(syntaxVisitor):
             message = f"Variable '{array_name}' is not an array"
             report_error(line, column, message)
             return None
+        ctx.address = array_info['address']
             
         # Check if the index is an integer
         if index_type != "int":
@@ -149,21 +153,27 @@ class ExpressionAnalyzer(syntaxVisitor):
         if not ctx.add_expr() or len(ctx.add_expr()) < 2:
             return self.visit(ctx.add_expr(0)) if ctx.add_expr() else None
         
+        # Each operand is compared with the one before it
         left_type = self.visit(ctx.add_expr(0))
-        right_type = self.visit(ctx.add_expr(1))
-        
-        # If either operand is invalid, bail out
-        if left_type is None or right_type is None:
-            return None
+        op_types = []
+        for i in range(1, len(ctx.add_expr())):
+            right_type = self.visit(ctx.add_expr(i))
             
-        op = ctx.getChild(1).getText()
+            # If either operand is invalid, bail out
+            if left_type is None or right_type is None:
+                return None
 
-        # Check operand types
-        if left_type != right_type:
-            message = f"Cannot compare '{left_type}' with '{right_type}'"
-            report_error(line, column, message, "Type Error")
-            return None
+            # Check operand types
+            if left_type != right_type:
+                message = f"Cannot compare '{left_type}' with '{right_type}'"
+                report_error(line, column, message, "Type Error")
+                return None
+            op_types.append((left_type, right_type))
+            left_type = right_type
 
+        # Operand types of every operator, used by the engines to pick specialised operations
+        ctx.op_types = op_types
+        
         # Return bool type for comparison expressions
         return 'bool'
 
@@ -179,16 +189,18 @@ class ExpressionAnalyzer(syntaxVisitor):
             return self.visit(ctx.comp_expr(0)) if ctx.comp_expr() else None
         
         left_type = self.visit(ctx.comp_expr(0))
-        right_type = self.visit(ctx.comp_expr(1))
-        
-        # If either operand is invalid, bail out
-        if left_type is None or right_type is None:
-            return None
+        for i in range(1, len(ctx.comp_expr())):
+            right_type = self.visit(ctx.comp_expr(i))
             
-        if left_type != 'bool' or right_type != 'bool':
-            message = f"Logical operations require boolean operands, got '{left_type}' and '{right_type}'"
-            report_error(line, column, message, "Type Error")
-            return None
+            # If either operand is invalid, bail out
+            if left_type is None or right_type is None:
+                return None
+                
+            if left_type != 'bool' or right_type != 'bool':
+                message = f"Logical operations require boolean operands, got '{left_type}' and '{right_type}'"
+                report_error(line, column, message, "Type Error")
+                return None
+            left_type = right_type
         
         return 'bool'
         
@@ -203,22 +215,27 @@ class ExpressionAnalyzer(syntaxVisitor):
         if not ctx.unary_expr() or len(ctx.unary_expr()) < 2:
             return self.visit(ctx.unary_expr(0)) if ctx.unary_expr() else None
         
+        # Operators apply from left to right to the result so far
         left_type = self.visit(ctx.unary_expr(0))
-        right_type = self.visit(ctx.unary_expr(1))
-        
-        # If either operand is invalid, bail out
-        if left_type is None or right_type is None:
-            return None
-        
-        if left_type not in ('int', 'float') or right_type not in ('int', 'float'):
-            message = f"Arithmetic operations require numeric operands, got '{left_type}' and '{right_type}'"
-            report_error(line, column, message, "Type Error")
-            return None
+        op_types = []
+        for i in range(1, len(ctx.unary_expr())):
+            right_type = self.visit(ctx.unary_expr(i))
+            
+            # If either operand is invalid, bail out
+            if left_type is None or right_type is None:
+                return None
+            
+            if left_type not in ('int', 'float') or right_type not in ('int', 'float'):
+                message = f"Arithmetic operations require numeric operands, got '{left_type}' and '{right_type}'"
+                report_error(line, column, message, "Type Error")
+                return None
+            op_types.append((left_type, right_type))
+            
+            # If one operand is float, result is float
+            left_type = 'float' if 'float' in (left_type, right_type) else 'int'
         
-        # If one operand is float, result is float
-        if left_type == 'float' or right_type == 'float':
-            return 'float'
-        return 'int'
+        ctx.op_types = op_types
+        return left_type
         
     
     def visitAddSubExpr(self, ctx: syntaxParser.AddSubExprContext):
@@ -232,32 +249,37 @@ class ExpressionAnalyzer(syntaxVisitor):
         if not ctx.mul_expr() or len(ctx.mul_expr()) < 2:
             return self.visit(ctx.mul_expr(0)) if ctx.mul_expr() else None
         
+        # Operators apply from left to right to the result so far
         left_type = self.visit(ctx.mul_expr(0))
-        right_type = self.visit(ctx.mul_expr(1))
-        
-        # If either operand is invalid, bail out
-        if left_type is None or right_type is None:
-            return None
+        op_types = []
+        for i in range(1, len(ctx.mul_expr())):
+            right_type = self.visit(ctx.mul_expr(i))
             
-        op = ctx.getChild(1).getText()
-        
-        # Handle string concatenation
-        if op == '+' and (left_type == 'str' or right_type == 'str'):
-            if left_type != 'str' or right_type != 'str':
-                message = f"Cannot concatenate '{left_type}' with '{right_type}'"
+            # If either operand is invalid, bail out
+            if left_type is None or right_type is None:
+                return None
+                
+            op = ctx.getChild(2 * i - 1).getText()
+            op_types.append((left_type, right_type))
+            
+            # Handle string concatenation
+            if op == '+' and (left_type == 'str' or right_type == 'str'):
+                if left_type != 'str' or right_type != 'str':
+                    message = f"Cannot concatenate '{left_type}' with '{right_type}'"
+                    report_error(line, column, message, "Type Error")
+                    return None
+                continue
+                
+            if left_type not in ('int', 'float') or right_type not in ('int', 'float'):
+                message = f"Arithmetic operations require numeric operands, got '{left_type}' and '{right_type}'"
                 report_error(line, column, message, "Type Error")
                 return None
-            return 'str'
             
-        if left_type not in ('int', 'float') or right_type not in ('int', 'float'):
-            message = f"Arithmetic operations require numeric operands, got '{left_type}' and '{right_type}'"
-            report_error(line, column, message, "Type Error")
-            return None
+            # If one operand is float, result is float
+            left_type = 'float' if 'float' in (left_type, right_type) else 'int'
         
-        # If one operand is float, result is float
-        if left_type == 'float' or right_type == 'float':
-            return 'float'
-        return 'int'
+        ctx.op_types = op_types
+        return left_type
     
     def visitParenExpr(self, ctx: syntaxParser.ParenExprContext):
         if ctx is None or ctx.expression() is None:
@@ -317,7 +339,7 @@ class ExpressionAnalyzer(syntaxVisitor):
         func_name = ctx.IDENTIFIER().getText()
         if func_name == "get_error":
             self.symbol_table.update("get_error", {"type": "str"})
-            return str
+            return 'str'
         func_info = self.symbol_table.lookup(func_name)
         
         if not func_info or func_info.get('type') != 'function':
@@ -0,0 +1,543 @@
+"""
+FastParser.py - Hand-written front end for the grammar in syntax.g4.
+A regular expression tokenizer and a recursive-descent parser build the
+same syntaxParser contexts as the generated ANTLR parser, with the same
+tokens, positions and start/stop tokens, so every analyzer and engine runs
+on its trees unchanged. The grammar needs at most two tokens of lookahead,
+which avoids the ATN interpretation the generated code does for every
+decision.
+
+The fast front end does not report errors itself: on invalid input it
+raises FastParseError, and SourceParser reparses the source with ANTLR so
+the error is reported exactly as before.
+"""
+import re
+from antlr4 import InputStream, CommonTokenStream, ParserRuleContext
+from antlr4.Token import Token, CommonToken
+from syntaxLexer import syntaxLexer
+from syntaxParser import syntaxParser
+
+P = syntaxParser
+
+# Alternatives are ordered so the first match is the longest one, which is
+# how the ANTLR lexer picks a rule: a closed '---' comment beats '-', a
+# negative NUMBER beats '-', and 'int[]' beats the word 'int'
+TOKEN_PATTERN = re.compile(r"""
+      (?P<skip>[ \t\r\n]+|//[^\r\n]*|---[\s\S]*?---)
+    | (?P<number>-?[0-9]+(?:\.[0-9]+)?)
+    | (?P<array_type>(?:int|float|str|char)\[\])
+    | (?P<word>[a-zA-Z_][a-zA-Z_0-9]*)
+    | (?P<character>'(?:[^'\\\r\n]|\\[\s\S])')
+    | (?P<string>"(?:[^"\\\r\n]|\\[\s\S])*")
+    | (?P<operator><=|>=|==|!=|[<>=+\-*/!;,{}()\[\].])
+""", re.VERBOSE)
+
+# Words lexed as keywords rather than IDENTIFIER
+KEYWORDS = {
+    'if': P.IF, 'else': P.ELSE, 'while': P.WHILE, 'func': P.FUNC,
+    'return': P.RETURN, 'print': P.PRINT, 'try': P.TRY, 'except': P.EXCEPT,
+    'true': P.TRUE, 'false': P.FALSE, 'continue': P.CONTINUE,
+    'break': P.BREAK, 'void': P.VOID, 'type': P.TYPE_DEF,
+    'and': P.AND, 'or': P.OR,
+    'int': P.DATA_TYPE, 'float': P.DATA_TYPE, 'str': P.DATA_TYPE, 'char': P.DATA_TYPE,
+}
+
+OPERATORS = {
+    '<=': P.LE, '>=': P.GE, '==': P.EQ, '!=': P.NE, '<': P.LT, '>': P.GT,
+    '=': P.ASSIGN, '+': P.ADD, '-': P.SUB, '*': P.MUL, '/': P.DIV, '!': P.NOT,
+    ';': P.SEMI, ',': P.COMMA, '{': P.LBRACE, '}': P.RBRACE, '(': P.LPAREN,
+    ')': P.RPAREN, '[': P.LBRACKET, ']': P.RBRACKET, '.': P.DOT,
+}
+
+GROUP_TYPES = {
+    'number': P.NUMBER, 'array_type': P.DATA_TYPE,
+    'character': P.CHARACTER, 'string': P.STRING,
+}
+
+# Labeled statement alternatives by their first token, and by the second
+# one for statements starting with an IDENTIFIER
+STATEMENTS = {
+    P.DATA_TYPE: P.VarDeclStmtContext, P.IF: P.IfStmtContext,
+    P.WHILE: P.WhileStmtContext, P.TRY: P.TryStmtContext,
+    P.RETURN: P.ReturnStmtContext, P.FUNC: P.FuncStmtContext,
+    P.LBRACE: P.BlockStmtContext, P.TYPE_DEF: P.NewTypeDefContext,
+    P.PRINT: P.PrintStmtContext, P.CONTINUE: P.ContinueContext,
+    P.BREAK: P.BreakContext,
+}
+IDENTIFIER_STATEMENTS = {
+    P.ASSIGN: P.AssignStmtContext, P.DOT: P.AssignStmtContext,
+    P.LPAREN: P.FuncCallStmtContext, P.IDENTIFIER: P.TypeDefDeclStmtContext,
+}
+
+# Token types for the operator loops of the expression rules
+LOGIC_OPS = (P.AND, P.OR)
+COMPARE_OPS = (P.LT, P.LE, P.GT, P.GE, P.EQ, P.NE)
+ADD_OPS = (P.ADD, P.SUB)
+MUL_OPS = (P.MUL, P.DIV)
+
+
+class FastParseError(Exception):
+    """Raised for input the fast front end does not accept."""
+    pass
+
+
+def tokenize(source):
+    """
+    Split source text into tokens, as syntaxLexer would.
+
+    Args:
+        source: Program source text
+
+    Returns:
+        List of CommonTokens ending with an EOF token
+
+    Raises:
+        FastParseError: If the source contains text no lexer rule matches
+    """
+    tokens = []
+    match = TOKEN_PATTERN.match
+    pos = 0
+    line = 1
+    line_start = 0
+    end = len(source)
+    while pos < end:
+        m = match(source, pos)
+        if m is None:
+            raise FastParseError(f"line {line}:{pos - line_start} token recognition error at: {source[pos]!r}")
+        text = m.group()
+        kind = m.lastgroup
+        if kind != 'skip':
+            if kind == 'word':
+                ttype = KEYWORDS.get(text, P.IDENTIFIER)
+            elif kind == 'operator':
+                ttype = OPERATORS[text]
+            else:
+                ttype = GROUP_TYPES[kind]
+            token = CommonToken(type=ttype, start=pos, stop=m.end() - 1)
+            token.text = text
+            token.line = line
+            token.column = pos - line_start
+            token.tokenIndex = len(tokens)
+            tokens.append(token)
+        newlines = text.count('\n')
+        if newlines:
+            line += newlines
+            line_start = pos + text.rindex('\n') + 1
+        pos = m.end()
+
+    eof = CommonToken(type=Token.EOF, start=end, stop=end - 1)
+    eof.text = '<EOF>'
+    eof.line = line
+    eof.column = end - line_start
+    eof.tokenIndex = len(tokens)
+    tokens.append(eof)
+    return tokens
+
+
+class FastParser:
+    """
+    Recursive-descent parser building syntaxParser contexts. Each rule
+    method mirrors the grammar rule of the same name: it picks the
+    alternative from the next one or two tokens, creates the context of
+    the rule (or of the alternative's label) under its parent and matches
+    the alternative's tokens and subrules. Unlike the generated parser it
+    never creates a rule context only to replace it by a labeled one.
+    """
+    def __init__(self):
+        # Contexts keep a reference to a parser for their rule names
+        self.recognizer = syntaxParser(CommonTokenStream(syntaxLexer(InputStream(""))))
+        self.tokens = []
+        self.types = []
+        self.pos = 0
+
+    def parse(self, source):
+        """
+        Parse a program.
+
+        Args:
+            source: Program source text
+
+        Returns:
+            ProgramContext equal to the one syntaxParser builds
+
+        Raises:
+            FastParseError: If the source is not a valid program
+        """
+        self.tokens = tokenize(source)
+        self.types = [token.type for token in self.tokens]
+        self.pos = 0
+        try:
+            return self.program()
+        finally:
+            self.tokens = []
+            self.types = []
+
+    #--------------------------------------------------
+    # Helpers
+    #--------------------------------------------------
+
+    def la(self, k=1):
+        """Return the type of the k-th token ahead, EOF past the end."""
+        index = self.pos + k - 1
+        return self.types[index] if index < len(self.types) else Token.EOF
+
+    def error(self):
+        token = self.tokens[self.pos]
+        raise FastParseError(f"line {token.line}:{token.column} unexpected input '{token.text}'")
+
+    def match(self, ctx, ttype):
+        """Add the current token to ctx if it has the expected type."""
+        if self.types[self.pos] != ttype:
+            self.error()
+        ctx.addTokenNode(self.tokens[self.pos])
+        # As in ANTLR, matching EOF does not move past it, so the program
+        # context stops at the last real token
+        if ttype != Token.EOF:
+            self.pos += 1
+
+    def enter(self, ctx_class, parent):
+        """Create a rule context under parent, starting at the current token."""
+        # Labeled contexts are built by copying a rule context, so both
+        # kinds are initialised the same way here instead
+        ctx = ctx_class.__new__(ctx_class)
+        ParserRuleContext.__init__(ctx, parent, -1)
+        ctx.parser = self.recognizer
+        if parent is not None:
+            parent.addChild(ctx)
+        ctx.start = self.tokens[self.pos]
+        return ctx
+
+    def exit(self, ctx):
+        ctx.stop = self.tokens[self.pos - 1] if self.pos else None
+        return ctx
+
+    #--------------------------------------------------
+    # Statements
+    #--------------------------------------------------
+
+    def program(self):
+        ctx = self.enter(P.ProgramContext, None)
+        while self.la() != Token.EOF:
+            self.statement(ctx)
+        self.match(ctx, Token.EOF)
+        return self.exit(ctx)
+
+    def statement(self, parent):
+        ttype = self.la()
+        if ttype == P.IDENTIFIER:
+            label_class = IDENTIFIER_STATEMENTS.get(self.la(2))
+        else:
+            label_class = STATEMENTS.get(ttype)
+        if label_class is None:
+            self.error()
+        ctx = self.enter(label_class, parent)
+        if label_class is P.AssignStmtContext:
+            self.assignment(ctx)
+            self.match(ctx, P.SEMI)
+        elif label_class is P.FuncCallStmtContext:
+            self.function_call(ctx)
+            self.match(ctx, P.SEMI)
+        elif label_class is P.TypeDefDeclStmtContext:
+            self.type_defDeclaration(ctx)
+            self.match(ctx, P.SEMI)
+        elif label_class is P.VarDeclStmtContext:
+            self.variable_declaration(ctx)
+            self.match(ctx, P.SEMI)
+        elif label_class is P.IfStmtContext:
+            self.if_stmt(ctx)
+        elif label_class is P.WhileStmtContext:
+            self.while_stmt(ctx)
+        elif label_class is P.TryStmtContext:
+            self.try_stmt(ctx)
+        elif label_class is P.ReturnStmtContext:
+            self.return_stmt(ctx)
+            self.match(ctx, P.SEMI)
+        elif label_class is P.FuncStmtContext:
+            self.match(ctx, P.FUNC)
+            if self.la() in (P.DATA_TYPE, P.VOID):
+                self.match(ctx, self.la())
+            self.match(ctx, P.IDENTIFIER)
+            self.match(ctx, P.LPAREN)
+            if self.la() == P.DATA_TYPE:
+                self.param_list(ctx)
+            self.match(ctx, P.RPAREN)
+            self.block(ctx)
+        elif label_class is P.BlockStmtContext:
+            self.block(ctx)
+        elif label_class is P.NewTypeDefContext:
+            self.type_defStatement(ctx)
+        elif label_class is P.PrintStmtContext:
+            self.print_stmt(ctx)
+            self.match(ctx, P.SEMI)
+        elif label_class is P.ContinueContext:
+            self.continue_stmt(ctx)
+        else:
+            self.break_stmt(ctx)
+        return self.exit(ctx)
+
+    def block(self, parent):
+        ctx = self.enter(P.BlockContext, parent)
+        self.match(ctx, P.LBRACE)
+        while self.la() not in (P.RBRACE, Token.EOF):
+            self.statement(ctx)
+        self.match(ctx, P.RBRACE)
+        return self.exit(ctx)
+
+    def variable_declaration(self, parent):
+        ctx = self.enter(P.Variable_declarationContext, parent)
+        self.match(ctx, P.DATA_TYPE)
+        self.match(ctx, P.IDENTIFIER)
+        if self.la() == P.ASSIGN:
+            self.match(ctx, P.ASSIGN)
+            self.expression(ctx)
+        return self.exit(ctx)
+
+    def assignment(self, parent):
+        ctx = self.enter(P.AssignmentContext, parent)
+        if self.la(2) == P.DOT:
+            self.type_defVar(ctx)
+        else:
+            self.match(ctx, P.IDENTIFIER)
+        self.match(ctx, P.ASSIGN)
+        self.expression(ctx)
+        return self.exit(ctx)
+
+    def if_stmt(self, parent):
+        ctx = self.enter(P.If_stmtContext, parent)
+        self.match(ctx, P.IF)
+        self.condition_block(ctx)
+        while self.la() == P.ELSE and self.la(2) == P.IF:
+            self.match(ctx, P.ELSE)
+            self.match(ctx, P.IF)
+            self.condition_block(ctx)
+        if self.la() == P.ELSE:
+            self.match(ctx, P.ELSE)
+            self.block(ctx)
+        return self.exit(ctx)
+
+    def condition_block(self, ctx):
+        """Match '(' expression ')' block into ctx, shared by if and while."""
+        self.match(ctx, P.LPAREN)
+        self.expression(ctx)
+        self.match(ctx, P.RPAREN)
+        self.block(ctx)
+
+    def while_stmt(self, parent):
+        ctx = self.enter(P.While_stmtContext, parent)
+        self.match(ctx, P.WHILE)
+        self.condition_block(ctx)
+        return self.exit(ctx)
+
+    def print_stmt(self, parent):
+        ctx = self.enter(P.Print_stmtContext, parent)
+        self.match(ctx, P.PRINT)
+        self.match(ctx, P.LPAREN)
+        self.expression(ctx)
+        self.match(ctx, P.RPAREN)
+        return self.exit(ctx)
+
+    def return_stmt(self, parent):
+        ctx = self.enter(P.Return_stmtContext, parent)
+        self.match(ctx, P.RETURN)
+        self.expression(ctx)
+        return self.exit(ctx)
+
+    def try_stmt(self, parent):
+        ctx = self.enter(P.Try_stmtContext, parent)
+        self.match(ctx, P.TRY)
+        self.block(ctx)
+        self.match(ctx, P.EXCEPT)
+        self.block(ctx)
+        return self.exit(ctx)
+
+    def continue_stmt(self, parent):
+        ctx = self.enter(P.Continue_stmtContext, parent)
+        self.match(ctx, P.CONTINUE)
+        self.match(ctx, P.SEMI)
+        return self.exit(ctx)
+
+    def break_stmt(self, parent):
+        ctx = self.enter(P.Break_stmtContext, parent)
+        self.match(ctx, P.BREAK)
+        self.match(ctx, P.SEMI)
+        return self.exit(ctx)
+
+    def function_call(self, parent):
+        ctx = self.enter(P.Function_callContext, parent)
+        self.call_suffix(ctx)
+        return self.exit(ctx)
+
+    def call_suffix(self, ctx):
+        """Match IDENTIFIER '(' arg_list? ')' into ctx."""
+        self.match(ctx, P.IDENTIFIER)
+        self.match(ctx, P.LPAREN)
+        if self.la() != P.RPAREN:
+            self.arg_list(ctx)
+        self.match(ctx, P.RPAREN)
+
+    def arg_list(self, parent):
+        ctx = self.enter(P.Arg_listContext, parent)
+        self.expression(ctx)
+        while self.la() == P.COMMA:
+            self.match(ctx, P.COMMA)
+            self.expression(ctx)
+        return self.exit(ctx)
+
+    def param_list(self, parent):
+        ctx = self.enter(P.Param_listContext, parent)
+        self.match(ctx, P.DATA_TYPE)
+        self.match(ctx, P.IDENTIFIER)
+        while self.la() == P.COMMA:
+            self.match(ctx, P.COMMA)
+            self.match(ctx, P.DATA_TYPE)
+            self.match(ctx, P.IDENTIFIER)
+        return self.exit(ctx)
+
+    #--------------------------------------------------
+    # Custom types
+    #--------------------------------------------------
+
+    def type_defDeclaration(self, parent):
+        ctx = self.enter(P.Type_defDeclarationContext, parent)
+        self.match(ctx, P.IDENTIFIER)
+        self.match(ctx, P.IDENTIFIER)
+        return self.exit(ctx)
+
+    def type_defVar(self, parent):
+        ctx = self.enter(P.Type_defVarContext, parent)
+        self.match(ctx, P.IDENTIFIER)
+        self.match(ctx, P.DOT)
+        self.match(ctx, P.IDENTIFIER)
+        return self.exit(ctx)
+
+    def type_defStatement(self, parent):
+        ctx = self.enter(P.Type_defStatementContext, parent)
+        self.match(ctx, P.TYPE_DEF)
+        self.match(ctx, P.IDENTIFIER)
+        self.match(ctx, P.LBRACE)
+        self.type_def_list(ctx)
+        while self.la() == P.DATA_TYPE:
+            self.type_def_list(ctx)
+        self.match(ctx, P.RBRACE)
+        return self.exit(ctx)
+
+    def type_def_list(self, parent):
+        ctx = self.enter(P.Type_def_listContext, parent)
+        self.match(ctx, P.DATA_TYPE)
+        self.match(ctx, P.IDENTIFIER)
+        self.match(ctx, P.SEMI)
+        return self.exit(ctx)
+
+    #--------------------------------------------------
+    # Expressions
+    #--------------------------------------------------
+
+    def expression(self, parent):
+        ctx = self.enter(P.ExpressionContext, parent)
+        self.logic_expr(ctx)
+        return self.exit(ctx)
+
+    def binary_chain(self, parent, label_class, operand, operators):
+        """Match operand (op operand)* for one precedence level."""
+        ctx = self.enter(label_class, parent)
+        operand(ctx)
+        while self.la() in operators:
+            self.match(ctx, self.la())
+            operand(ctx)
+        return self.exit(ctx)
+
+    def logic_expr(self, parent):
+        return self.binary_chain(parent, P.LogicExprContext, self.comp_expr, LOGIC_OPS)
+
+    def comp_expr(self, parent):
+        return self.binary_chain(parent, P.CompExprContext, self.add_expr, COMPARE_OPS)
+
+    def add_expr(self, parent):
+        return self.binary_chain(parent, P.AddSubExprContext, self.mul_expr, ADD_OPS)
+
+    def mul_expr(self, parent):
+        return self.binary_chain(parent, P.MulDivExprContext, self.unary_expr, MUL_OPS)
+
+    def unary_expr(self, parent):
+        ttype = self.la()
+        if ttype == P.SUB:
+            ctx = self.enter(P.UnaryMinusExprContext, parent)
+            self.match(ctx, P.SUB)
+            self.unary_expr(ctx)
+        elif ttype == P.NOT:
+            ctx = self.enter(P.NotExprContext, parent)
+            self.match(ctx, P.NOT)
+            self.match(ctx, P.LPAREN)
+            self.expression(ctx)
+            self.match(ctx, P.RPAREN)
+        else:
+            ctx = self.enter(P.PrimaryExprContext, parent)
+            self.primary_expr(ctx)
+        return self.exit(ctx)
+
+    def primary_expr(self, parent):
+        ttype = self.la()
+        if ttype == P.IDENTIFIER:
+            next_type = self.la(2)
+            if next_type == P.LBRACKET:
+                ctx = self.enter(P.ArrayAccessExprContext, parent)
+                self.match(ctx, P.IDENTIFIER)
+                self.match(ctx, P.LBRACKET)
+                self.expression(ctx)
+                self.match(ctx, P.RBRACKET)
+            elif next_type == P.LPAREN:
+                ctx = self.enter(P.FuncCallExprContext, parent)
+                self.call_suffix(ctx)
+            elif next_type == P.DOT:
+                ctx = self.enter(P.TypedefFieldContext, parent)
+                self.type_defVar(ctx)
+            else:
+                ctx = self.enter(P.IdExprContext, parent)
+                self.match(ctx, P.IDENTIFIER)
+        elif ttype == P.NUMBER:
+            ctx = self.enter(P.NumberExprContext, parent)
+            self.match(ctx, P.NUMBER)
+        elif ttype == P.STRING:
+            ctx = self.enter(P.StringExprContext, parent)
+            self.match(ctx, P.STRING)
+        elif ttype == P.CHARACTER:
+            ctx = self.enter(P.CharExprContext, parent)
+            self.match(ctx, P.CHARACTER)
+        elif ttype == P.TRUE:
+            ctx = self.enter(P.TrueExprContext, parent)
+            self.match(ctx, P.TRUE)
+        elif ttype == P.FALSE:
+            ctx = self.enter(P.FalseExprContext, parent)
+            self.match(ctx, P.FALSE)
+        elif ttype == P.LPAREN:
+            ctx = self.enter(P.ParenExprContext, parent)
+            self.match(ctx, P.LPAREN)
+            self.expression(ctx)
+            self.match(ctx, P.RPAREN)
+        elif ttype == P.LBRACKET:
+            element_type = self.la(2)
+            if element_type == P.NUMBER:
+                ctx = self.enter(P.IntArrayContext, parent)
+                self.array_literal(ctx, P.Int_ArrayContext, P.NUMBER)
+            elif element_type == P.CHARACTER:
+                ctx = self.enter(P.CharArrayContext, parent)
+                self.array_literal(ctx, P.Char_ArrayContext, P.CHARACTER)
+            elif element_type == P.STRING:
+                ctx = self.enter(P.StringArrayContext, parent)
+                self.array_literal(ctx, P.StrArrayContext, P.STRING)
+            else:
+                self.error()
+        else:
+            self.error()
+        return self.exit(ctx)
+
+    def array_literal(self, parent, rule_class, element_type):
+        """Match '[' element (',' element)* ']' for int_Array, char_Array and strArray."""
+        ctx = self.enter(rule_class, parent)
+        self.match(ctx, P.LBRACKET)
+        self.match(ctx, element_type)
+        while self.la() == P.COMMA:
+            self.match(ctx, P.COMMA)
+            self.match(ctx, element_type)
+        self.match(ctx, P.RBRACKET)
+        return self.exit(ctx)
@@ -0,0 +1,187 @@
+"""
+FunctionInliner.py - Optimisation pass run after ConstantFolder.
+Replaces calls of small helper functions, such as
+func int add(int a, int b) { return a + b; }, by a copy of the returned
+expression with the parameters replaced by the arguments, so the engines
+evaluate a + b in the caller instead of binding a frame and running a body.
+
+A function is inlined when its body is a single return statement whose
+expression has at most INLINE_MAX_TOKENS tokens and only reads its own
+parameters: no calls, so it cannot be recursive, no globals, which could be
+shadowed at the call site, and no array or typedef accesses, which need a
+variable name. A call is inlined when every argument is a constant or a
+variable read, as these cannot fail or have side effects, so evaluating them
+where and as often as the parameters are used gives the same result.
+"""
+import copy
+from antlr4 import ParserRuleContext
+from syntaxParser import syntaxParser
+from syntaxVisitor import syntaxVisitor
+from ConstantFolder import mark_constant
+
+INLINE_MAX_TOKENS = 16  # Tokens in the returned expression of an inlined function
+
+# Expressions that keep a function from being inlined
+NOT_INLINABLE = (
+    syntaxParser.FuncCallExprContext,       # Calls, including recursion
+    syntaxParser.ArrayAccessExprContext,    # Index a variable by name
+    syntaxParser.TypedefFieldContext,       # Read a field of a variable by name
+)
+
+
+def mark_inlined(ctx, expression):
+    """
+    Record the expression replacing a call.
+
+    Like mark_constant, the node's accept() is replaced so that visitors
+    with a visitConstant method, the engines, visit the expression instead
+    of the call. Other visitors, such as the analyzers, still see the call.
+
+    Args:
+        ctx: The FuncCallExprContext being replaced
+        expression: Expression computing the result of the call
+    """
+    rule_accept = type(ctx).accept
+
+    def accept(visitor):
+        if getattr(visitor, 'visitConstant', None) is None:
+            return rule_accept(ctx, visitor)
+        return expression.accept(visitor)
+
+    ctx.inlined = expression
+    ctx.accept = accept
+
+
+class FunctionInliner(syntaxVisitor):
+    """
+    Visitor that inlines calls of small functions in an analyzed and
+    constant-folded parse tree. Inlined expressions share the unchanged
+    parts of the function body, only the nodes above a parameter are copied.
+    """
+    def __init__(self, symbol_table):
+        """
+        Args:
+            symbol_table: The analyzed symbol table
+        """
+        super().__init__()
+        self.symbol_table = symbol_table
+        self.templates = {}     # Function name -> returned expression, or None
+
+    def visitFuncCallExpr(self, ctx:syntaxParser.FuncCallExprContext):
+        if hasattr(ctx, 'const_value'):
+            # Already replaced by its result
+            return None
+        # Arguments first, so calls inside them are inlined too
+        args = ctx.arg_list().expression() if ctx.arg_list() else []
+        for expr in args:
+            self.visit(expr)
+
+        template = self.template(ctx.IDENTIFIER().getText())
+        if template is None:
+            return None
+        values = [self.simple_argument(expr) for expr in args]
+        if None in values:
+            return None
+        mark_inlined(ctx, self.substitute(template, values))
+        return None
+
+    def template(self, func_name):
+        """
+        Return the returned expression of an inlinable function.
+
+        Args:
+            func_name: Name of the called function
+
+        Returns:
+            The expression of the function's only return statement, or None
+            if calls of the function cannot be inlined
+        """
+        if func_name in self.templates:
+            return self.templates[func_name]
+
+        template = None
+        func_info = self.symbol_table.global_scope.get(func_name)
+        body = func_info.get('body') if func_info and func_info.get('type') == 'function' else None
+        statements = body.statement() if body is not None else []
+        if len(statements) == 1 and isinstance(statements[0], syntaxParser.ReturnStmtContext):
+            expr = statements[0].return_stmt().expression()
+            if self.inlinable(expr, len(func_info.get('params', []))):
+                template = expr
+        self.templates[func_name] = template
+        return template
+
+    @staticmethod
+    def inlinable(expr, nparams):
+        """Return whether an expression is small and only reads parameters."""
+        tokens = 0
+        stack = [expr]
+        while stack:
+            node = stack.pop()
+            if hasattr(node, 'const_value') or not isinstance(node, ParserRuleContext):
+                # Folded subexpressions count as one token
+                tokens += 1
+            elif isinstance(node, syntaxParser.IdExprContext):
+                address = getattr(node, 'address', None)
+                if address is None or address[0] == 0 or address[1] >= nparams:
+                    return False
+                tokens += 1
+            elif isinstance(node, NOT_INLINABLE):
+                return False
+            else:
+                stack.extend(node.getChildren())
+            if tokens > INLINE_MAX_TOKENS:
+                return False
+        return True
+
+    @staticmethod
+    def simple_argument(expr):
+        """
+        Classify an argument expression.
+
+        Returns:
+            A 1-tuple holding the value of a constant argument, the
+            IdExprContext of a variable read, or None for anything else
+        """
+        if hasattr(expr, 'const_value'):
+            return (expr.const_value,)
+        node = expr
+        while not isinstance(node, syntaxParser.IdExprContext):
+            if isinstance(node, syntaxParser.ParenExprContext):
+                node = node.expression()
+            elif isinstance(node, ParserRuleContext) and node.getChildCount() == 1:
+                # Operator chains with a single operand
+                node = node.getChild(0)
+            else:
+                return None
+        return node
+
+    def substitute(self, node, values):
+        """
+        Copy an expression with its parameter reads replaced.
+
+        Args:
+            node: Node of the returned expression of the inlined function
+            values: Per parameter, the result of simple_argument()
+
+        Returns:
+            The node itself if it reads no parameter, otherwise a copy
+        """
+        if hasattr(node, 'const_value') or not isinstance(node, ParserRuleContext):
+            return node
+        if isinstance(node, syntaxParser.IdExprContext):
+            value = values[node.address[1]]
+            if value.__class__ is tuple:
+                # A constant argument becomes a folded parameter read
+                constant = copy.copy(node)
+                mark_constant(constant, value[0])
+                return constant
+            return value
+        children = [self.substitute(child, values) for child in node.getChildren()]
+        if all(new is old for new, old in zip(children, node.getChildren())):
+            return node
+        node = copy.copy(node)
+        node.children = children
+        return node
+
+    def defaultResult(self):
+        return None
@@ -0,0 +1,109 @@
+"""
+MemoCache.py - Bounded caches of the results of pure functions.
+StatementAnalyzer marks a function pure when its result only depends on its
+arguments: it prints nothing, uses no globals, typedef instances, builtins
+or get_error(), and only calls itself or other pure functions. When
+memoization is enabled, the engines look up every call of a pure function
+with scalar parameters in its MemoCache before running the body, so
+recursion that recomputes the same calls, like fibonacci, runs each
+distinct call once.
+"""
+from collections import OrderedDict
+
+DEFAULT_MEMO_SIZE = 10000   # Results kept per function
+
+# Returned by MemoCache.lookup for arguments without a cached result
+MISSING = object()
+
+
+def memoizable(func_info):
+    """
+    Return whether calls of a function can be memoized.
+
+    Args:
+        func_info: Symbol table entry of the function
+
+    Returns:
+        True if the analyzer found the function pure and all its parameters
+        are scalars, which can be part of a dictionary key
+    """
+    return func_info.get('pure', False) and not any(
+        param['type'].endswith('[]') for param in func_info.get('params', []))
+
+def memo_key(args):
+    """
+    Return the cache key of an argument list. The argument types are part
+    of it, as 1, 1.0 and True are equal keys but print differently.
+    """
+    return (*args, *[arg.__class__ for arg in args])
+
+
+class MemoCache:
+    """Least recently used results of one function, keyed by memo_key()."""
+    def __init__(self, size):
+        """
+        Args:
+            size: Results kept before the least recently used is dropped
+        """
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        """Return the cached result for a key, or MISSING."""
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def store(self, key, value):
+        """Cache the result computed after a missed lookup."""
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+
+    def wrap(self, function):
+        """Return a memoizing version of a Python function."""
+        lookup = self.lookup
+        store = self.store
+
+        def memoized(*args):
+            key = memo_key(args)
+            value = lookup(key)
+            if value is MISSING:
+                value = function(*args)
+                store(key, value)
+            return value
+        return memoized
+
+
+class MemoTable:
+    """The memo caches of an engine, one per function, kept for the session."""
+    def __init__(self, size=None):
+        """
+        Args:
+            size: Results kept per function, None to disable memoization
+        """
+        self.size = size
+        self.caches = {}    # Function name -> MemoCache
+
+    def cache(self, name):
+        """Return the MemoCache of a function, or None if memoization is disabled."""
+        if self.size is None:
+            return None
+        cache = self.caches.get(name)
+        if cache is None:
+            cache = self.caches[name] = MemoCache(self.size)
+        return cache
+
+    def report(self):
+        """Return one line of hit and miss counts per memoized function."""
+        return [
+            f"{name}: {cache.hits} hits, {cache.misses} misses, {len(cache.entries)} cached"
+            for name, cache in self.caches.items()
+        ]
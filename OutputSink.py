@@ -0,0 +1,134 @@
+"""
+OutputSink.py - Destinations for the lines written by print statements.
+Every engine hands each printed value to a sink as soon as the statement
+runs. MemorySink collects the lines of a run, as the engines always did;
+the streaming sinks write them out while the program is still running,
+holding at most one buffer of text, so long-running programs show their
+output early and can be piped into other tools.
+"""
+import sys
+import time
+
+# When a StreamSink writes its buffer to the stream:
+#   line      after every printed line
+#   buffer    when the buffer holds buffer_size characters
+#   interval  when the buffer is full, or when a line is printed interval
+#             seconds or more after the last write
+FLUSH_POLICIES = ('line', 'buffer', 'interval')
+DEFAULT_BUFFER_SIZE = 64 * 1024     # Characters
+DEFAULT_INTERVAL = 0.1              # Seconds
+
+
+class OutputSink:
+    """
+    Base class of the sinks. Engines call write() for every printed line,
+    reset() before and flush() after every run, and getvalue() for the
+    result of the run.
+    """
+    def write(self, line):
+        """Receive one printed line, without its line break."""
+        raise NotImplementedError
+
+    def reset(self):
+        """Prepare for a new run."""
+
+    def flush(self):
+        """Pass on everything written so far."""
+
+    def close(self):
+        """Flush and release the destination."""
+        self.flush()
+
+    def getvalue(self):
+        """Return the output of the last run, or None if it was passed on."""
+        return None
+
+
+class MemorySink(OutputSink):
+    """Keeps the lines of the current run in memory."""
+    def __init__(self):
+        self.lines = []
+        # Bound once, so compiled code can hold on to it across runs
+        self.write = self.lines.append
+
+    def reset(self):
+        self.lines.clear()
+
+    def getvalue(self):
+        return "\n".join(self.lines)
+
+
+class CallbackSink(OutputSink):
+    """Calls a function with every printed line."""
+    def __init__(self, callback):
+        """
+        Args:
+            callback: Function taking one line, without its line break
+        """
+        self.write = callback
+
+
+class StreamSink(OutputSink):
+    """Buffered writer to a text stream, flushed according to a policy."""
+    def __init__(self, stream=None, flush='line', buffer_size=DEFAULT_BUFFER_SIZE,
+                 interval=DEFAULT_INTERVAL):
+        """
+        Args:
+            stream: Text stream written to, None for the current sys.stdout
+            flush: One of FLUSH_POLICIES
+            buffer_size: Characters buffered before a write under the
+                'buffer' and 'interval' policies
+            interval: Seconds after the last write at which a printed line
+                flushes the buffer under the 'interval' policy
+        """
+        if flush not in FLUSH_POLICIES:
+            raise ValueError(f"Unknown flush policy: {flush}")
+        self.stream = stream
+        self.policy = flush
+        self.buffer_size = buffer_size
+        self.interval = interval
+        self.buffer = []
+        self.size = 0                       # Characters in the buffer
+        self.last_flush = time.monotonic()
+        if flush == 'line':
+            self.write = self.write_line
+
+    def write_line(self, line):
+        stream = self.stream or sys.stdout
+        stream.write(line + "\n")
+        stream.flush()
+
+    def write(self, line):
+        self.buffer.append(line)
+        self.size += len(line) + 1
+        if self.size >= self.buffer_size:
+            self.flush()
+        elif self.policy == 'interval' and time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        stream = self.stream or sys.stdout
+        if self.buffer:
+            self.buffer.append("")
+            stream.write("\n".join(self.buffer))
+            self.buffer.clear()
+            self.size = 0
+        stream.flush()
+        self.last_flush = time.monotonic()
+
+
+class FileSink(StreamSink):
+    """StreamSink writing to a file it opens itself."""
+    def __init__(self, path, mode='w', **options):
+        """
+        Args:
+            path: File written to
+            mode: 'w' to truncate the file, 'a' to append to it
+            **options: Flush policy options of StreamSink
+        """
+        options.setdefault('flush', 'buffer')
+        super().__init__(open(path, mode, encoding='utf-8'), **options)
+
+    def close(self):
+        self.flush()
+        self.stream.close()
@@ -0,0 +1,124 @@
+"""
+ProgramCache.py - On-disk cache of compiled programs, in the spirit of __pycache__.
+A script run with a compiled engine stores its compiled form (the lowered
+CompactAST program, the bytecode of BytecodeCompiler or the source of
+PythonCodegen) next to the script, so later runs of the same source skip
+lexing, parsing and analysis.
+"""
+import hashlib
+import os
+import pickle
+import sys
+
+CACHE_DIR = '__pyoopscache__'
+
+# Engines whose compiled form does not reference parse tree contexts
+CACHE_ENGINES = ('closure', 'vm', 'python')
+
+# Modules that decide what a source compiles to or define the classes its
+# entries pickle; editing any of them, the generated parser included,
+# invalidates every cache entry
+COMPILER_MODULES = (
+    'syntaxLexer', 'syntaxParser', 'FastParser', 'SymbolTableVisitor', 'StatementAnalyzer',
+    'ExpressionAnalyzer', 'ConstantFolder', 'FunctionInliner', 'Builtins', 'MemoCache', 'RuntimeVisitor', 'CompactAST',
+    'ClosureCompiler', 'BytecodeCompiler', 'BytecodeVM', 'PythonCodegen', 'ArrayStorage', 'OutputSink',
+)
+
+# Failures of an entry that is missing, truncated or refers to classes that
+# changed since it was written
+LOAD_ERRORS = (
+    OSError, EOFError, ValueError, IndexError, ImportError, AttributeError, TypeError,
+    pickle.UnpicklingError,
+)
+
+_compiler_fingerprint = None
+
+def compiler_fingerprint():
+    """Return a digest of the grammar and compiler sources, computed once per process."""
+    global _compiler_fingerprint
+    if _compiler_fingerprint is None:
+        digest = hashlib.sha256()
+        for name in COMPILER_MODULES:
+            __import__(name)
+            with open(sys.modules[name].__file__, 'rb') as f:
+                digest.update(f.read())
+        _compiler_fingerprint = digest.hexdigest()
+    return _compiler_fingerprint
+
+
+class ProgramCache:
+    """
+    Stores one compiled program per script and engine. An entry is keyed by
+    a hash of the source, the engine and the compiler fingerprint; a stale
+    entry is simply recompiled and overwritten.
+    """
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory: Where entries are written, None for a __pyoopscache__
+                directory next to each script
+        """
+        self.directory = directory
+
+    def path(self, script_path, engine):
+        """Return the cache file used for a script and engine."""
+        script_dir, script_name = os.path.split(os.path.abspath(script_path))
+        directory = self.directory or os.path.join(script_dir, CACHE_DIR)
+        return os.path.join(directory, f"{script_name}.{engine}.pickle")
+
+    @staticmethod
+    def key(source, engine):
+        """Return the key identifying the compiled form of a source."""
+        digest = hashlib.sha256(source.encode('utf-8'))
+        digest.update(engine.encode('utf-8'))
+        digest.update(compiler_fingerprint().encode('ascii'))
+        return digest.hexdigest()
+
+    def load(self, script_path, source, engine):
+        """
+        Look up the compiled form of a script.
+
+        Args:
+            script_path: Path of the script, locating the cache entry
+            source: Current source of the script
+            engine: Engine the program is compiled for
+
+        Returns:
+            The cached program, or None if there is no valid entry
+        """
+        if engine not in CACHE_ENGINES:
+            return None
+        try:
+            with open(self.path(script_path, engine), 'rb') as f:
+                key, program = pickle.load(f)
+        except LOAD_ERRORS:
+            # Missing, unreadable, truncated or stale entries are recompiled
+            return None
+        return program if key == self.key(source, engine) else None
+
+    def store(self, script_path, source, engine, program):
+        """
+        Save the compiled form of a script. Failures are ignored, so a
+        read-only location only costs the compilation on the next run.
+
+        Args:
+            script_path: Path of the script, locating the cache entry
+            source: Source the program was compiled from
+            engine: Engine the program is compiled for
+            program: The compiled program
+        """
+        if engine not in CACHE_ENGINES:
+            return
+        path = self.path(script_path, engine)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                pickle.dump((self.key(source, engine), program), f, pickle.HIGHEST_PROTOCOL)
+            # Readers never see a partially written entry
+            os.replace(temp_path, path)
+        except (OSError, pickle.PicklingError, RecursionError):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
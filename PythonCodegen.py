@@ -0,0 +1,746 @@
+"""
+PythonCodegen.py - Transpiles a type-checked program into Python source.
+The generated module is compiled with compile() and executed by CPython, with
+small runtime helpers keeping the error messages, try/except behaviour and
+loop limits of RuntimeVisitor.
+"""
+from syntaxParser import syntaxParser
+from syntaxVisitor import syntaxVisitor
+from RuntimeVisitor import ExecutionBudget, report_error, DEFAULT_MAX_STEPS, DEFAULT_TIMEOUT
+from BytecodeCompiler import DEFAULT_VALUES
+from OutputSink import MemorySink
+from Builtins import BuiltinError, is_builtin, call_builtin
+from ArrayStorage import ARRAY_TYPES, TypedArray, IntArray, FloatArray, pack_array
+from MemoCache import MemoTable, memoizable
+import itertools
+import math
+
+NUMERIC_TYPES = ('int', 'float')
+
+# Python spelling of the comparison tokens
+COMPARE_SYMBOLS = {
+    syntaxParser.LT: '<',
+    syntaxParser.LE: '<=',
+    syntaxParser.GT: '>',
+    syntaxParser.GE: '>=',
+    syntaxParser.EQ: '==',
+    syntaxParser.NE: '!=',
+}
+
+
+class PyoopsError(Exception):
+    """Runtime error that a PyOops try/except block can catch."""
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class PyoopsFatal(Exception):
+    """Runtime error raised inside an except block, which always terminates."""
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class PythonRuntime:
+    """
+    Helpers called by generated code for the operations that need
+    RuntimeVisitor's dynamic checks and error messages.
+    """
+    def __init__(self, symbol_table, loaded_globals=0, output=None):
+        self.symbol_table = symbol_table
+        self.loaded_globals = loaded_globals  # Globals the module namespace already holds
+        self.output = output if output is not None else MemorySink()  # Receives program output
+        self.current_exception = None       # Message available to get_error()
+        self.is_in_try_block = False        # Generated code never reports through report_error
+
+    @staticmethod
+    def message(error):
+        """Return the PyOops message for an exception raised by generated code."""
+        if isinstance(error, ZeroDivisionError):
+            return "Division by zero."
+        if isinstance(error, RecursionError):
+            # Generated functions call each other directly, so Python's
+            # recursion limit bounds the call depth
+            return "Stack overflow."
+        return error.message
+
+    def error(self, message):
+        raise PyoopsError(message)
+
+    def add(self, left, right):
+        if isinstance(left, str) or isinstance(right, str):
+            return str(left) + str(right)
+        if isinstance(left, (int, float)) and isinstance(right, (int, float)):
+            return left + right
+        self.error("Invalid operands for addition.")
+
+    def sub(self, left, right):
+        if isinstance(left, (int, float)) and isinstance(right, (int, float)):
+            return left - right
+        self.error("Invalid operands for subtraction.")
+
+    def mul(self, left, right):
+        if not isinstance(left, (int, float)) or not isinstance(right, (int, float)):
+            self.error("Invalid operands for multiplication/division.")
+        return left * right
+
+    def div(self, left, right):
+        if not isinstance(left, (int, float)) or not isinstance(right, (int, float)):
+            self.error("Invalid operands for multiplication/division.")
+        if right == 0:
+            self.error("Division by zero.")
+        return left / right
+
+    def negate(self, value):
+        if not isinstance(value, (int, float)):
+            self.error("Cannot apply unary minus to non-numeric value.")
+        return -value
+
+    def index(self, array, index, name):
+        if not isinstance(array, ARRAY_TYPES):
+            self.error(f"Variable '{name}' is not an array.")
+        if not isinstance(index, int):
+            self.error(f"Array index must be an integer, got '{type(index).__name__}'.")
+        if index < 0 or index >= len(array):
+            self.error(f"Index {index} out of bounds for array '{name}'.")
+        return array[index]
+
+    def ensure_list(self, value):
+        return value if isinstance(value, ARRAY_TYPES) else [value]
+
+    def check_budget(self, budget):
+        message = budget.check()
+        if message:
+            self.error(message)
+
+    def builtin(self, name, args):
+        try:
+            return call_builtin(name, args)
+        except BuiltinError as e:
+            self.error(e.message)
+
+    def get_error(self):
+        if not self.current_exception:
+            raise RuntimeError("get_error() called outside of except block")
+        return str(self.current_exception)
+
+    def load_globals(self, namespace):
+        """Seed the generated module with global values from the symbol table."""
+        for name, value in self.symbol_table.global_values(self.loaded_globals).items():
+            if isinstance(value, dict):
+                info = self.symbol_table.global_scope[name]
+                instance = namespace['T_' + info['type']]()
+                for field, field_value in value.items():
+                    setattr(instance, 'v_' + field, field_value)
+                value = instance
+            namespace['v_' + name] = value
+
+    def store_globals(self, namespace):
+        """Write global values of the generated module back into the symbol table."""
+        values = {}
+        for name in self.symbol_table.global_values():
+            if 'v_' + name not in namespace:
+                continue
+            value = namespace['v_' + name]
+            # Typedef instances are T_ classes with __slots__; so are the
+            # compact numeric arrays, which are stored as they are
+            if hasattr(value, '__slots__') and not isinstance(value, ARRAY_TYPES):
+                value = {slot[2:]: getattr(value, slot) for slot in value.__slots__}
+            values[name] = value
+        self.symbol_table.store_global_values(values)
+
+
+class PythonCodegen(syntaxVisitor):
+    """
+    Visitor that emits Python source for an analyzed program.
+    Statement visitors append lines; expression visitors return a
+    (source, static type) pair, the type being None when it is not known.
+    PyOops names are prefixed (v_ variables and fields, f_ functions,
+    T_ typedef classes) so they can never clash with Python keywords;
+    block locals are numbered v<n>_ so they cannot clash with each other
+    or with source names either.
+    A generator reused for a whole session runs every module in the same
+    namespace, so functions and classes are generated and defined once and
+    later modules only contain what is new.
+    """
+    def __init__(self, symbol_table, max_steps=DEFAULT_MAX_STEPS, timeout=DEFAULT_TIMEOUT, output=None,
+                 memo_size=None):
+        """
+        Initialize the code generator.
+
+        Args:
+            symbol_table: The symbol table filled in by StatementAnalyzer
+            max_steps: Loop iterations allowed in one run, None for no limit
+            timeout: Maximum execution time in seconds, None for no limit
+            output: OutputSink receiving printed lines, None to collect them
+                in memory
+            memo_size: Results cached per pure function, None to disable
+                memoization
+        """
+        super().__init__()
+        self.symbol_table = symbol_table
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.output = output if output is not None else MemorySink()  # Receives program output
+        self.memo = MemoTable(memo_size)  # Results of pure functions
+        self.lines = []             # Lines of the code unit being generated
+        self.indent = 0
+        self.scopes = []            # Block scopes: name -> (python name, type)
+        self.global_types = {}      # Globals declared by this program: name -> type
+        self.assigned_globals = None  # Globals a function assigns, needing 'global'
+        self.params = None          # Python names of the parameters of the function being generated
+        self.tail_calls = False     # Whether that function contains a tail call
+        self.functions = {}         # Function name -> generated lines
+        self.typedefs = {}          # Typedef name -> generated lines
+        self.counter = 0            # Source of unique suffixes
+        self.undefined = []         # Typedefs and functions generated but not run yet, by name
+        self.namespace = {
+            'PyoopsError': PyoopsError, 'PyoopsFatal': PyoopsFatal,
+            'IntArray': IntArray, 'FloatArray': FloatArray, '_memoize': self.memoize,
+        }
+        self.loaded_globals = 0     # Globals of the symbol table already in the namespace
+
+    #--------------------------------------------------
+    # Program Execution
+    #--------------------------------------------------
+
+    def generate(self, tree):
+        """
+        Generate the Python module for a program.
+
+        Args:
+            tree: The ProgramContext that passed semantic analysis
+
+        Returns:
+            The module source as a string
+        """
+        self.lines = []
+        self.scopes = []
+        self.indent = 0
+        # Instances from earlier executions are rebuilt by rt.load_globals
+        new_globals = itertools.islice(self.symbol_table.global_scope.values(), self.loaded_globals, None)
+        for info in new_globals:
+            if isinstance(info, dict) and info.get('kind') == 'newtype_instance':
+                self.typedef_class(info['type'])
+        self.emit("rt.load_globals(globals())")
+        self.visit(tree)
+        main = self.lines
+
+        module = ["# Generated by PythonCodegen"]
+        for name in self.undefined:
+            if name.startswith('T_'):
+                module.extend(self.typedefs[name[2:]])
+        for name in self.undefined:
+            if name.startswith('f_'):
+                module.extend(self.functions[name[2:]])
+        module.extend(main)
+        return "\n".join(module) + "\n"
+
+    def run(self, tree, source=None, write_back=True):
+        """
+        Generate, compile and execute a program.
+
+        Args:
+            tree: The ProgramContext that passed semantic analysis
+            source: Previously generated source to execute instead
+            write_back: Whether to store global values in the symbol table
+                after the run, rather than on a later store_globals() call
+
+        Returns:
+            The program output joined by newlines, or None if the output
+            sink passed it on
+        """
+        if source is None:
+            source = self.generate(tree)
+        code = compile(source, '<pyoops>', 'exec')
+        runtime = PythonRuntime(self.symbol_table, self.loaded_globals, self.output)
+        self.loaded_globals = len(self.symbol_table.global_scope)
+        self.output.reset()
+        namespace = self.namespace
+        namespace['rt'] = runtime
+        namespace['_out'] = self.output.write
+        namespace['_budget'] = ExecutionBudget(self.max_steps, self.timeout)
+        # Definitions come first in the module, so they exist even if the
+        # main code fails
+        self.undefined = []
+        try:
+            exec(code, namespace)
+        except (PyoopsError, PyoopsFatal, ZeroDivisionError, RecursionError) as e:
+            report_error(runtime, runtime.message(e))
+        finally:
+            self.output.flush()
+            if write_back:
+                runtime.store_globals(namespace)
+        return self.output.getvalue()
+
+    def memoize(self, name, function):
+        """Return the function generated for a pure function, memoized if enabled."""
+        cache = self.memo.cache(name)
+        return function if cache is None else cache.wrap(function)
+
+    def store_globals(self):
+        """Write the global values of the session namespace back into the symbol table."""
+        PythonRuntime(self.symbol_table).store_globals(self.namespace)
+
+    #--------------------------------------------------
+    # Helpers
+    #--------------------------------------------------
+
+    def emit(self, line):
+        self.lines.append("    " * self.indent + line)
+
+    def unique(self, prefix):
+        self.counter += 1
+        return f"{prefix}_{self.counter}"
+
+    def declare(self, name, data_type):
+        """Declare a variable in the innermost scope and return its Python name."""
+        if not self.scopes:
+            self.global_types[name] = data_type
+            return 'v_' + name
+        # v<n>_x cannot be the v_ name of a source identifier such as x_<n>
+        self.counter += 1
+        python_name = f"v{self.counter}_{name}"
+        self.scopes[-1][name] = (python_name, data_type)
+        return python_name
+
+    def resolve(self, name):
+        """Return (python name, type) for a variable reference."""
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        if name in self.global_types:
+            data_type = self.global_types[name]
+        else:
+            info = self.symbol_table.global_scope.get(name) or {}
+            data_type = info.get('type')
+        return ('v_' + name, data_type)
+
+    def store(self, name, value):
+        python_name, _ = self.resolve(name)
+        if self.assigned_globals is not None and python_name == 'v_' + name \
+                and not any(name in scope for scope in self.scopes):
+            self.assigned_globals.add(python_name)
+        self.emit(f"{python_name} = {value}")
+
+    def emit_block(self, block, scoped=True):
+        """Emit the statements of a block one level deeper."""
+        if scoped:
+            self.scopes.append({})
+        self.indent += 1
+        start = len(self.lines)
+        self.visit(block)
+        if len(self.lines) == start:
+            self.emit("pass")
+        self.indent -= 1
+        if scoped:
+            self.scopes.pop()
+
+    def typedef_class(self, type_name):
+        """Generate the __slots__ class for a typedef on first use."""
+        if type_name not in self.typedefs:
+            fields = ['v_' + field for field in self.symbol_table.lookup(type_name)['fields']]
+            lines = [f"class T_{type_name}:", f"    __slots__ = {tuple(fields)!r}", "    def __init__(self):"]
+            lines.extend(f"        self.{field} = None" for field in fields)
+            if not fields:
+                lines.append("        pass")
+            self.typedefs[type_name] = lines
+            self.undefined.append('T_' + type_name)
+        return 'T_' + type_name
+
+    def function_name(self, name):
+        """Return the Python name of a function, generating it on first use."""
+        if name in self.functions:
+            return 'f_' + name
+
+        func_info = self.symbol_table.global_scope.get(name) or self.symbol_table.lookup(name)
+        self.functions[name] = []
+
+        saved = (self.lines, self.indent, self.scopes, self.assigned_globals, self.params, self.tail_calls)
+        self.lines = []
+        self.indent = 1
+        self.scopes = [{param['name']: ('v_' + param['name'], param['type']) for param in func_info['params']}]
+        self.assigned_globals = set()
+        self.params = ['v_' + param['name'] for param in func_info['params']]
+        self.tail_calls = False
+        self.visit(func_info['body'])
+        self.emit("return None")
+        body = self.lines
+        if self.tail_calls:
+            # A tail call rebinds the parameters and continues this loop
+            body = ["    while True:"] + ["    " + line for line in body]
+        declared_globals = sorted(self.assigned_globals)
+        self.lines, self.indent, self.scopes, self.assigned_globals, self.params, self.tail_calls = saved
+
+        params = ", ".join('v_' + param['name'] for param in func_info['params'])
+        lines = [f"def f_{name}({params}):"]
+        if declared_globals:
+            lines.append("    global " + ", ".join(declared_globals))
+        lines.extend(body)
+        if memoizable(func_info):
+            # Recursive calls go through the module global, and so through the cache
+            lines.append(f"f_{name} = _memoize({name!r}, f_{name})")
+        self.functions[name] = lines
+        self.undefined.append('f_' + name)
+        return 'f_' + name
+
+    #--------------------------------------------------
+    # Program and Blocks
+    #--------------------------------------------------
+
+    def visitProgram(self, ctx:syntaxParser.ProgramContext):
+        for stmt in ctx.statement():
+            self.visit(stmt)
+        return None
+
+    def visitBlock(self, ctx:syntaxParser.BlockContext):
+        for stmt in ctx.statement():
+            self.visit(stmt)
+        return None
+
+    def visitBlockStmt(self, ctx:syntaxParser.BlockStmtContext):
+        self.emit("if True:")
+        self.emit_block(ctx.block())
+        return None
+
+    #--------------------------------------------------
+    # Declarations and Assignment
+    #--------------------------------------------------
+
+    def visitVarDeclStmt(self, ctx:syntaxParser.VarDeclStmtContext):
+        var_decl = ctx.variable_declaration()
+        data_type = var_decl.DATA_TYPE().getText()
+
+        if var_decl.expression():
+            value, value_type = self.visit(var_decl.expression())
+            if data_type.endswith('[]') and not (value_type and value_type.endswith('[]')):
+                value = f"rt.ensure_list({value})"
+        elif data_type.endswith('[]'):
+            value = "[]"
+        else:
+            value = repr(DEFAULT_VALUES.get(data_type))
+
+        python_name = self.declare(var_decl.IDENTIFIER().getText(), data_type)
+        self.store_declared(python_name, value)
+        return None
+
+    def store_declared(self, python_name, value):
+        if self.assigned_globals is not None and not self.scopes:
+            self.assigned_globals.add(python_name)
+        self.emit(f"{python_name} = {value}")
+
+    def visitAssignStmt(self, ctx:syntaxParser.AssignStmtContext):
+        assign = ctx.assignment()
+        value, _ = self.visit(assign.expression())
+        if assign.IDENTIFIER():
+            self.store(assign.IDENTIFIER().getText(), value)
+        else:
+            instance, _ = self.resolve(assign.type_defVar().IDENTIFIER(0).getText())
+            self.emit(f"{instance}.v_{assign.type_defVar().IDENTIFIER(1).getText()} = {value}")
+        return None
+
+    def visitTypeDefDeclStmt(self, ctx:syntaxParser.TypeDefDeclStmtContext):
+        decl = ctx.type_defDeclaration()
+        type_name = decl.IDENTIFIER(0).getText()
+        class_name = self.typedef_class(type_name)
+        python_name = self.declare(decl.IDENTIFIER(1).getText(), type_name)
+        self.store_declared(python_name, f"{class_name}()")
+        return None
+
+    def visitNewTypeDef(self, ctx:syntaxParser.NewTypeDefContext):
+        # Classes are generated when an instance is declared
+        return None
+
+    #--------------------------------------------------
+    # Control Flow Statements
+    #--------------------------------------------------
+
+    def visitIfStmt(self, ctx:syntaxParser.IfStmtContext):
+        if_stmt = ctx.if_stmt()
+        conditions = if_stmt.expression()
+        blocks = if_stmt.block()
+
+        for i, (condition, block) in enumerate(zip(conditions, blocks)):
+            source, _ = self.visit(condition)
+            self.emit(f"{'if' if i == 0 else 'elif'} {source}:")
+            self.emit_block(block)
+
+        if len(blocks) > len(conditions):
+            self.emit("else:")
+            self.emit_block(blocks[-1])
+        return None
+
+    def visitWhileStmt(self, ctx:syntaxParser.WhileStmtContext):
+        while_stmt = ctx.while_stmt()
+        condition, _ = self.visit(while_stmt.expression())
+
+        self.emit("while True:")
+        self.indent += 1
+        # Without limits the loop needs no guard at all
+        if self.max_steps is not None or self.timeout is not None:
+            self.emit("_budget.steps += 1")
+            self.emit("if _budget.steps >= _budget.next_check:")
+            self.emit("    rt.check_budget(_budget)")
+        self.emit(f"if not {condition}:")
+        self.emit("    break")
+        self.indent -= 1
+        self.emit_block(while_stmt.block())
+        return None
+
+    def visitContinue(self, ctx:syntaxParser.ContinueContext):
+        self.emit("continue")
+        return None
+
+    def visitBreak(self, ctx:syntaxParser.BreakContext):
+        self.emit("break")
+        return None
+
+    def visitTryStmt(self, ctx:syntaxParser.TryStmtContext):
+        # Like the analyzer, try/except blocks share the enclosing scope.
+        # Errors escaping the except block are fatal, even inside an outer try.
+        error = self.unique('_e')
+        self.emit("try:")
+        self.emit_block(ctx.try_stmt().block(0), scoped=False)
+        self.emit(f"except (PyoopsError, ZeroDivisionError, RecursionError) as {error}:")
+        self.indent += 1
+        self.emit(f"rt.current_exception = rt.message({error})")
+        self.emit("try:")
+        self.emit_block(ctx.try_stmt().block(1), scoped=False)
+        self.emit(f"except (PyoopsError, ZeroDivisionError, RecursionError) as {error}:")
+        self.emit(f"    raise PyoopsFatal(rt.message({error}))")
+        self.emit("finally:")
+        self.emit("    rt.current_exception = None")
+        self.indent -= 1
+        return None
+
+    #--------------------------------------------------
+    # Functions
+    #--------------------------------------------------
+
+    def visitFuncStmt(self, ctx:syntaxParser.FuncStmtContext):
+        self.function_name(ctx.IDENTIFIER().getText())
+        return None
+
+    def visitReturnStmt(self, ctx:syntaxParser.ReturnStmtContext):
+        if ctx.tail_call is not None:
+            self.emit_tail_call(ctx.tail_call)
+            return None
+        value, _ = self.visit(ctx.return_stmt().expression())
+        self.emit(f"return {value}")
+        return None
+
+    def emit_tail_call(self, ctx):
+        """Generate a tail call as a parameter assignment and a continue."""
+        args = [self.visit(expr)[0] for expr in ctx.arg_list().expression()] if ctx.arg_list() else []
+        self.tail_calls = True
+        # Each tail call replaces a call by a loop iteration
+        if self.max_steps is not None or self.timeout is not None:
+            self.emit("_budget.steps += 1")
+            self.emit("if _budget.steps >= _budget.next_check:")
+            self.emit("    rt.check_budget(_budget)")
+        if args:
+            # Every argument is evaluated before the first parameter changes
+            self.emit(f"{', '.join(self.params[:len(args)])} = {', '.join(args)}")
+        self.emit("continue")
+
+    def visitFuncCallStmt(self, ctx:syntaxParser.FuncCallStmtContext):
+        call, _ = self.call_expression(ctx.function_call())
+        self.emit(call)
+        return None
+
+    def visitFuncCallExpr(self, ctx:syntaxParser.FuncCallExprContext):
+        return self.call_expression(ctx)
+
+    def call_expression(self, ctx):
+        """Generate a call from a FuncCallExpr or function_call context."""
+        func_name = ctx.IDENTIFIER().getText()
+        if func_name == "get_error":
+            return ("rt.get_error()", 'str')
+
+        args = [self.visit(expr)[0] for expr in ctx.arg_list().expression()] if ctx.arg_list() else []
+        if is_builtin(self.symbol_table, func_name):
+            return_type = self.symbol_table.global_scope[func_name]['return_type']
+            return (f"rt.builtin({func_name!r}, [{', '.join(args)}])", return_type)
+
+        python_name = self.function_name(func_name)
+        func_info = self.symbol_table.global_scope[func_name]
+        # A body that can finish without a return statement yields None,
+        # so the declared type is only trusted when the last statement returns
+        statements = func_info['body'].statement()
+        if statements and isinstance(statements[-1], syntaxParser.ReturnStmtContext):
+            return_type = func_info.get('return_type')
+        else:
+            return_type = None
+        return (f"{python_name}({', '.join(args)})", return_type)
+
+    #--------------------------------------------------
+    # I/O Operations
+    #--------------------------------------------------
+
+    def visitPrintStmt(self, ctx:syntaxParser.PrintStmtContext):
+        value, _ = self.visit(ctx.print_stmt().expression())
+        self.emit(f"_out(str({value}))")
+        return None
+
+    #--------------------------------------------------
+    # Expressions
+    #--------------------------------------------------
+
+    def visitExpression(self, ctx:syntaxParser.ExpressionContext):
+        return self.visit(ctx.logic_expr())
+
+    def visitLogicExpr(self, ctx:syntaxParser.LogicExprContext):
+        operands = [self.visit(operand) for operand in ctx.comp_expr()]
+        if len(operands) == 1:
+            return operands[0]
+
+        # A short-circuit ends the whole chain, like RuntimeVisitor.visitLogicExpr
+        source = operands[-1][0]
+        for i in range(len(operands) - 1, 0, -1):
+            left = operands[i - 1][0]
+            if ctx.getChild(2 * i - 1).symbol.type == syntaxParser.AND:
+                source = f"(False if not {left} else {source})"
+            else:
+                source = f"(True if {left} else {source})"
+        return (source, 'bool')
+
+    def visitCompExpr(self, ctx:syntaxParser.CompExprContext):
+        operands = [self.visit(operand) for operand in ctx.add_expr()]
+        if len(operands) == 1:
+            return operands[0]
+
+        # Python chained comparisons evaluate and short-circuit the same way
+        parts = [operands[0][0]]
+        for i in range(1, len(operands)):
+            parts.append(COMPARE_SYMBOLS[ctx.getChild(2 * i - 1).symbol.type])
+            parts.append(operands[i][0])
+        return (f"({' '.join(parts)})", 'bool')
+
+    def visitAddSubExpr(self, ctx:syntaxParser.AddSubExprContext):
+        operands = ctx.mul_expr()
+        left, left_type = self.visit(operands[0])
+        for i in range(1, len(operands)):
+            right, right_type = self.visit(operands[i])
+            numeric = left_type in NUMERIC_TYPES and right_type in NUMERIC_TYPES
+            result_type = 'float' if 'float' in (left_type, right_type) else 'int'
+            if ctx.getChild(2 * i - 1).symbol.type == syntaxParser.ADD:
+                if numeric:
+                    left, left_type = f"({left} + {right})", result_type
+                elif left_type == 'str' and right_type == 'str':
+                    left, left_type = f"({left} + {right})", 'str'
+                else:
+                    is_str = 'str' in (left_type, right_type)
+                    left, left_type = f"rt.add({left}, {right})", 'str' if is_str else None
+            elif numeric:
+                left, left_type = f"({left} - {right})", result_type
+            else:
+                left, left_type = f"rt.sub({left}, {right})", None
+        return (left, left_type)
+
+    def visitMulDivExpr(self, ctx:syntaxParser.MulDivExprContext):
+        operands = ctx.unary_expr()
+        left, left_type = self.visit(operands[0])
+        for i in range(1, len(operands)):
+            right, right_type = self.visit(operands[i])
+            numeric = left_type in NUMERIC_TYPES and right_type in NUMERIC_TYPES
+            if ctx.getChild(2 * i - 1).symbol.type == syntaxParser.MUL:
+                result_type = 'float' if 'float' in (left_type, right_type) else 'int'
+                left = f"({left} * {right})" if numeric else f"rt.mul({left}, {right})"
+            else:
+                # ZeroDivisionError is reported as "Division by zero."
+                result_type = 'float'
+                left = f"({left} / {right})" if numeric else f"rt.div({left}, {right})"
+            left_type = result_type if numeric else None
+        return (left, left_type)
+
+    def visitUnaryMinusExpr(self, ctx:syntaxParser.UnaryMinusExprContext):
+        value, value_type = self.visit(ctx.unary_expr())
+        if value_type in NUMERIC_TYPES:
+            return (f"(-{value})", value_type)
+        return (f"rt.negate({value})", None)
+
+    def visitNotExpr(self, ctx:syntaxParser.NotExprContext):
+        value, _ = self.visit(ctx.expression())
+        return (f"(not {value})", 'bool')
+
+    def visitPrimaryExpr(self, ctx:syntaxParser.PrimaryExprContext):
+        return self.visit(ctx.primary_expr())
+
+    def visitParenExpr(self, ctx:syntaxParser.ParenExprContext):
+        return self.visit(ctx.expression())
+
+    def visitTrueExpr(self, ctx:syntaxParser.TrueExprContext):
+        return ("True", 'bool')
+
+    def visitFalseExpr(self, ctx:syntaxParser.FalseExprContext):
+        return ("False", 'bool')
+
+    def visitIdExpr(self, ctx:syntaxParser.IdExprContext):
+        return self.resolve(ctx.IDENTIFIER().getText())
+
+    def visitConstant(self, ctx):
+        # Expression folded by ConstantFolder
+        value = ctx.const_value
+        if isinstance(value, bool):
+            return (repr(value), 'bool')
+        if isinstance(value, str):
+            return (repr(value), 'str')
+        if isinstance(value, ARRAY_TYPES):
+            numeric = all(isinstance(item, (int, float)) for item in value)
+            return (self.array_literal(value), 'int[]' if numeric else 'str[]')
+        if isinstance(value, float) and not math.isfinite(value):
+            return (f"float({str(value)!r})", 'float')
+        return (f"({value!r})", 'float' if isinstance(value, float) else 'int')
+
+    def array_literal(self, value):
+        """Return the Python expression creating an array value."""
+        if isinstance(value, TypedArray):
+            return f"{type(value).__name__}({value.tolist()!r})"
+        return repr(value)
+
+    def visitNumberExpr(self, ctx:syntaxParser.NumberExprContext):
+        text = ctx.NUMBER().getText()
+        if '.' in text:
+            return (f"({float(text)!r})", 'float')
+        return (f"({int(text)!r})", 'int')
+
+    def visitStringExpr(self, ctx:syntaxParser.StringExprContext):
+        return (repr(ctx.STRING().getText()[1:-1]), 'str')
+
+    def visitCharExpr(self, ctx:syntaxParser.CharExprContext):
+        return (repr(ctx.CHARACTER().getText()[1:-1]), 'char')
+
+    def visitIntArray(self, ctx:syntaxParser.IntArrayContext):
+        values = []
+        for token in ctx.int_Array().NUMBER():
+            text = token.getText()
+            values.append(float(text) if '.' in text else int(text))
+        return (self.array_literal(pack_array(values)), 'int[]')
+
+    def visitCharArray(self, ctx:syntaxParser.CharArrayContext):
+        return (repr([token.getText()[1:-1] for token in ctx.char_Array().CHARACTER()]), 'char[]')
+
+    def visitStringArray(self, ctx:syntaxParser.StringArrayContext):
+        return (repr([token.getText()[1:-1] for token in ctx.strArray().STRING()]), 'str[]')
+
+    def visitArrayAccessExpr(self, ctx:syntaxParser.ArrayAccessExprContext):
+        name = ctx.IDENTIFIER().getText()
+        array, array_type = self.resolve(name)
+        index, _ = self.visit(ctx.expression())
+        element_type = array_type[:-2] if array_type and array_type.endswith('[]') else None
+
+        # Plain in-bounds int indexes stay inline, everything else gets the checked helper
+        temp = self.unique('_i')
+        source = (f"({array}[{temp}] if ({temp} := {index}).__class__ is int and 0 <= {temp} < len({array}) "
+                  f"else rt.index({array}, {temp}, {name!r}))")
+        return (source, element_type)
+
+    def visitTypedefField(self, ctx:syntaxParser.TypedefFieldContext):
+        field = ctx.type_defVar()
+        instance, _ = self.resolve(field.IDENTIFIER(0).getText())
+        # Fields start out as None, so their type is not trusted
+        return (f"{instance}.v_{field.IDENTIFIER(1).getText()}", None)
+
+    def defaultResult(self):
+        return None
@@ -4,6 +4,11 @@ This visitor handles the execution of program statements and evaluates expressio
 """
 from syntaxParser import syntaxParser
 from syntaxVisitor import syntaxVisitor
+from OutputSink import MemorySink
+from Builtins import BuiltinError, is_builtin, call_builtin
+from ArrayStorage import ARRAY_TYPES, pack_array
+from MemoCache import MemoTable, MISSING, memoizable, memo_key
+import operator
 import sys
 import time
 
@@ -13,12 +18,148 @@ BLUE = "\033[34m"
 BOLD = "\033[1m"
 RESET = "\033[0m"
 
+# Completion codes returned by statement visitors. Normal completion is
+# None and a return statement completes with a 1-tuple holding the value.
+# A tail call (see StatementAnalyzer.tail_call) stores its arguments in the
+# parameter slots and completes with TAIL_CALL, and the function runs its
+# body again in the same frame.
+BREAK = 'break'
+CONTINUE = 'continue'
+TAIL_CALL = 'tail call'
+
+COMPARE_FUNCS = {
+    syntaxParser.LT: operator.lt,
+    syntaxParser.LE: operator.le,
+    syntaxParser.GT: operator.gt,
+    syntaxParser.GE: operator.ge,
+    syntaxParser.EQ: operator.eq,
+    syntaxParser.NE: operator.ne,
+}
+
+NUMERIC_TYPES = ('int', 'float')
+
+# Operations that need no operand checks once both static types are numeric
+NUMERIC_OPS = {
+    syntaxParser.ADD: operator.add,
+    syntaxParser.SUB: operator.sub,
+    syntaxParser.MUL: operator.mul,
+    syntaxParser.DIV: operator.truediv,
+}
+
+def specialised_op(op, left_type, right_type):
+    """
+    Pick the operation for an operator from the operand types found by
+    ExpressionAnalyzer.
+
+    Args:
+        op: Operator token type
+        left_type: Static type of the left operand, or None if unknown
+        right_type: Static type of the right operand, or None if unknown
+
+    Returns:
+        A two-argument function, or None when the dynamic checks are needed
+    """
+    if op in COMPARE_FUNCS:
+        return COMPARE_FUNCS[op] if left_type is not None and left_type == right_type else None
+    if left_type in NUMERIC_TYPES and right_type in NUMERIC_TYPES:
+        return NUMERIC_OPS[op]
+    if op == syntaxParser.ADD and left_type == 'str' and right_type == 'str':
+        return operator.add
+    return None
+
+def specialised_ops(ctx):
+    """
+    Return the specialised operations of a binary expression chain, one per
+    operator, computed on first use from the op_types ExpressionAnalyzer
+    recorded on the node. Entries are None where the types are unknown.
+    """
+    ops = getattr(ctx, 'specialised_ops', None)
+    if ops is None:
+        count = (ctx.getChildCount() - 1) // 2
+        op_types = getattr(ctx, 'op_types', None) or [(None, None)] * count
+        ops = ctx.specialised_ops = [
+            specialised_op(ctx.getChild(2 * i + 1).symbol.type, left_type, right_type)
+            for i, (left_type, right_type) in enumerate(op_types)
+        ]
+    return ops
+
+# Execution limits; None disables a limit
+DEFAULT_MAX_STEPS = 10000000
+DEFAULT_TIMEOUT = 5
+DEFAULT_MAX_DEPTH = 100000      # Nested calls in BytecodeVM, whose call stack is a list
+BUDGET_CHECK_INTERVAL = 1024    # Steps between two readings of the clock
+
+class ExecutionBudget:
+    """
+    Step budget and wall-clock deadline shared by every loop of a run.
+    Each loop iteration is one step. Engines count steps with a plain
+    increment and only call check() once steps reaches next_check, so the
+    clock is read every BUDGET_CHECK_INTERVAL steps instead of every iteration.
+    """
+    def __init__(self, max_steps=DEFAULT_MAX_STEPS, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            max_steps: Loop iterations allowed in one run, None for no limit
+            timeout: Seconds a run may take, None for no limit
+        """
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.start()
+
+    def start(self):
+        """Reset the step count and start the deadline clock for a new run."""
+        self.steps = 0
+        self.deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        self.schedule()
+
+    def schedule(self):
+        """Set the step count at which check() has to run next."""
+        if self.deadline is None:
+            next_check = float('inf')
+        else:
+            next_check = self.steps + BUDGET_CHECK_INTERVAL
+        if self.max_steps is not None:
+            next_check = min(next_check, self.max_steps + 1)
+        self.next_check = next_check
+
+    def check(self):
+        """
+        Enforce the limits once steps has reached next_check.
+
+        Returns:
+            The error message of an exceeded limit, or None
+        """
+        if self.max_steps is not None and self.steps > self.max_steps:
+            return f"Program exceeded {self.max_steps} loop iterations. Possible infinite loop."
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            return f"Program execution exceeded {self.timeout} seconds timeout. Possible infinite loop."
+        self.schedule()
+        return None
+
 class InterpreterRuntimeError(Exception):
     """Custom exception to signal a runtime error in the language."""
     def __init__(self, message):
         super().__init__(message)
         self.message = message
 
+class UncaughtRuntimeError(InterpreterRuntimeError):
+    """
+    Runtime error outside any try block whose report has to wait until the
+    stack has unwound; try handlers pass it on to the top-level run.
+    """
+
+def stack_overflow(self):
+    """
+    Raise the error of a call beyond Python's recursion limit. Printing
+    with the stack nearly exhausted can fail half-way, so nothing is printed
+    here: a try block handles the error as usual, and an uncaught one is
+    reported by the top-level run once the stack has unwound.
+    """
+    message = "Stack overflow."
+    if getattr(self, "is_in_try_block", False):
+        report_error(self, message)
+    raise UncaughtRuntimeError(message)
+
 def report_error(self, message, error_type="Runtime Error"):
     """Format and report runtime errors with optional error type."""
     formatted_error = f"{RED}{BOLD}[{error_type}]{RESET}{RED} {message}{RESET}"
@@ -28,55 +169,114 @@ def report_error(self, message, error_type="Runtime Error"):
         self._current_exception = message
         raise InterpreterRuntimeError(message)
     else:
+        # Lines printed before the error come out before its message
+        self.output.flush()
         print(formatted_error)
         sys.exit(1)
 
+class FrameLayout:
+    """
+    Fixed frame shape of a function, known after analysis, with a free list
+    of released frames that later calls reuse instead of allocating.
+    """
+    def __init__(self, name, func_info):
+        self.name = name
+        self.func_info = func_info
+        self.body = func_info.get('body')
+        self.nparams = len(func_info.get('params', []))
+        self.nlocals = func_info.get('nlocals', self.nparams)
+        self.blank = (None,) * self.nlocals   # Clears a released frame without allocating
+        self.free = []                        # Released frames ready for reuse
+        self.memo = None                      # MemoCache of a memoized function
+
+    def acquire(self):
+        """Return an empty frame, reusing a released one when possible."""
+        if self.free:
+            return self.free.pop()
+        return [None] * self.nlocals
+
+    def release(self, frame):
+        """Clear a frame so it keeps nothing alive and put it on the free list."""
+        frame[:] = self.blank
+        self.free.append(frame)
+
 class RuntimeVisitor(syntaxVisitor):
     """
     Visitor that executes the parsed program statements.
     Handles variable operations, control flow, functions, and expressions.
     """
-    def __init__(self, symbol_table, max_iterations=1000, timeout=5):
+    def __init__(self, symbol_table, max_steps=DEFAULT_MAX_STEPS, timeout=DEFAULT_TIMEOUT, output=None,
+                 memo_size=None):
         """
         Initialize the runtime visitor with the symbol table and safety limits.
         
         Args:
             symbol_table: The symbol table for variable lookups
-            max_iterations: Maximum iterations allowed in loops
-            timeout: Maximum execution time in seconds
+            max_steps: Loop iterations allowed in one run, None for no limit
+            timeout: Maximum execution time in seconds, None for no limit
+            output: OutputSink receiving printed lines, None to collect them
+                in memory
+            memo_size: Results cached per pure function, None to disable
+                memoization
         """
         super().__init__()
         self.symbol_table = symbol_table
-        self.output = []                    # Stores program output
+        self.output = output if output is not None else MemorySink()  # Receives program output
         self.in_function = None             # Current function being executed
-        self.return_value = None            # Return value from functions
-        self.function_definitions = {}      # Map of function names to definitions
-        self.break_flag = False             # Flag for loop break
-        self.continue_flag = False          # Flag for loop continue
         self.is_in_try_block = False        # Flag for try-except blocks
         self.last_error = None              # Last error message
         self._current_exception = None      # Current exception in try-except
-        
-        # Loop safety parameters
-        self.max_iterations = max_iterations  # Maximum number of iterations
-        self.timeout = timeout                # Maximum execution time in seconds
-        self.start_time = time.time()
-        self.iterations = 0
-        
-        # Collect function definitions from the symbol table
-        self.collect_function_definitions()
+        self.globals = symbol_table.global_slots  # Global variable entries by slot
+        self.frame = []                     # Local variables of the running function or program
+        self.frames = []                    # Call stack of frames, separate from the scope history
+        self.frame_layouts = {}             # Function name -> FrameLayout
+        self.memo = MemoTable(memo_size)    # Results of pure functions
+        
+        # Loop safety limits
+        self.budget = ExecutionBudget(max_steps, timeout)
 
     #--------------------------------------------------
     # Initialization and Helper Methods
     #--------------------------------------------------
     
-    def collect_function_definitions(self):
-        """Find and store all function definitions from the symbol table."""
-        for scope in self.symbol_table.all_scopes:
-            for name, info in scope['symbols'].items():
-                if isinstance(info, dict) and info.get('type') == 'function':
-                    # Store function definition from global scope
-                    self.function_definitions[name] = info
+    def frame_layout(self, func_name):
+        """Return the FrameLayout of a function, creating it on first call."""
+        layout = self.frame_layouts.get(func_name)
+        if layout is None:
+            # Functions are always defined in the global scope
+            func_info = self.symbol_table.global_scope.get(func_name)
+            if not func_info:
+                func_info = self.symbol_table.lookup(func_name)
+            if not func_info or func_info.get("type") != "function":
+                report_error(self, f"Function '{func_name}' not defined.")
+                return None
+            layout = FrameLayout(func_name, func_info)
+            if memoizable(func_info):
+                layout.memo = self.memo.cache(func_name)
+            self.frame_layouts[func_name] = layout
+        return layout
+    
+    def load(self, address):
+        """Read the variable at a (depth, slot) address assigned by the analyzer."""
+        depth, slot = address
+        if depth:
+            return self.frame[slot]
+        return self.globals[slot].get('value')
+    
+    def store(self, address, value):
+        """Write the variable at a (depth, slot) address."""
+        depth, slot = address
+        if depth:
+            self.frame[slot] = value
+        else:
+            self.globals[slot]['value'] = value
+    
+    def instance_fields(self, address):
+        """Return the field entries of the typedef instance at an address."""
+        depth, slot = address
+        if depth:
+            return self.frame[slot]
+        return self.globals[slot]['fields']
     
     #--------------------------------------------------
     # Program Execution
@@ -84,44 +284,61 @@ class RuntimeVisitor(syntaxVisitor):
     
     def visitProgram(self, ctx:syntaxParser.ProgramContext):
         """Execute the program by visiting all top-level statements."""
-        # Ensure we're in global scope
+        # Ensure we're in global scope, with nothing left over from an
+        # earlier run of this visitor in the session
         self.symbol_table.reset_to_global()
+        self.output.reset()
+        self.in_function = None
+        self.is_in_try_block = False
+        self._current_exception = None
+        self.frame = [None] * getattr(ctx, 'nlocals', 0)
+        self.frames = [self.frame]
+        self.budget.start()
         
         # Execute each statement at program level
-        for stmt in ctx.statement():
-            # Skip function definitions during execution
-            if isinstance(stmt, syntaxParser.FuncStmtContext):
-                continue
-                
-            if stmt is not None:
-                self.visit(stmt)
-            
-            # Check for flags that might affect execution
-            if self.return_value is not None or self.break_flag or self.continue_flag:
-                break
-            
-        return "\n".join(self.output)
+        try:
+            for stmt in ctx.statement():
+                # Skip function definitions during execution
+                if isinstance(stmt, syntaxParser.FuncStmtContext):
+                    continue
+                    
+                # The analyzer rejects return, break and continue at program
+                # level, so completion codes can be ignored here
+                if stmt is not None:
+                    self.visit(stmt)
+        except UncaughtRuntimeError as e:
+            self.is_in_try_block = False
+            report_error(self, e.message)
+        finally:
+            self.output.flush()
+            
+        return self.output.getvalue()
     
     def visitBlock(self, ctx:syntaxParser.BlockContext):
-        """Execute a block of statements."""
+        """
+        Execute a block of statements.
+        
+        Returns:
+            None, or the completion code of a return, break or continue
+            that ends the block early
+        """
         if ctx is None:
             return None
             
         # Execute each statement in the block
         for stmt in ctx.statement():
-            # Skip if the statement is null
-            if stmt is None:
-                continue
-                
-            # Visit the statement
-            self.visit(stmt)
+            signal = self.visit(stmt)
             
             # Stop execution if we hit a return, break, or continue
-            if self.return_value is not None or self.break_flag or self.continue_flag:
-                break
+            if signal is not None:
+                return signal
                 
         return None
     
+    def visitBlockStmt(self, ctx:syntaxParser.BlockStmtContext):
+        """Execute a nested block, passing on its completion code."""
+        return self.visit(ctx.block())
+    
     #--------------------------------------------------
     # Variable Declaration and Assignment
     #--------------------------------------------------
@@ -132,7 +349,6 @@ class RuntimeVisitor(syntaxVisitor):
             return None
             
         var_decl = ctx.variable_declaration()
-        identifier = var_decl.IDENTIFIER().getText()
         data_type = var_decl.DATA_TYPE().getText()
         
         if var_decl.expression():
@@ -141,11 +357,11 @@ class RuntimeVisitor(syntaxVisitor):
             
             # Handle array types
             if data_type.endswith('[]'):
-                if not isinstance(value, list):
+                if not isinstance(value, ARRAY_TYPES):
                     # Convert single values to a list if assigning to array
                     value = [value]
             
-            self.symbol_table.update(identifier, {'type': data_type, 'value': value})
+            self.store(ctx.address, value)
         else:
             # Initialize with default values based on type
             default_value = None
@@ -160,7 +376,7 @@ class RuntimeVisitor(syntaxVisitor):
             elif data_type.endswith('[]'):
                 default_value = []
             
-            self.symbol_table.update(identifier, {'type': data_type, 'value': default_value})
+            self.store(ctx.address, default_value)
         
         return None
 
@@ -175,24 +391,37 @@ class RuntimeVisitor(syntaxVisitor):
             # Regular variable assignment
             name = assign.IDENTIFIER().getText()
             
-            # Find the variable in the symbol table
-            symbol = self.symbol_table.lookup(name)
-            if not symbol:
-                report_error(f"Variable '{name}' not defined.")
+            # The analyzer resolved the variable to a slot
+            if getattr(ctx, 'address', None) is None:
+                report_error(self, f"Variable '{name}' not defined.")
                 return None
             
             # Evaluate expression and update variable
             if assign.expression():
                 value = self.visit(assign.expression())
-                self.symbol_table.update(name, {'value': value})
+                self.store(ctx.address, value)
         
         elif assign.type_defVar():
             # Custom type field assignment
-            newtype_name = assign.type_defVar().IDENTIFIER(0).getText()
             field_name = assign.type_defVar().IDENTIFIER(1).getText()
             
             value = self.visit(assign.expression())
-            self.symbol_table.updateField_typedef(newtype_name, field_name, value)
+            self.instance_fields(ctx.address)[field_name]['value'] = value
+        return None
+    
+    def visitType_defDeclaration(self, ctx:syntaxParser.Type_defDeclarationContext):
+        """Create a custom type instance with all fields unset."""
+        if ctx is None:
+            return None
+        
+        depth, slot = ctx.address
+        if depth:
+            newtype = self.symbol_table.lookup(ctx.IDENTIFIER(0).getText())
+            self.frame[slot] = {field: {'type': field_type, 'value': None}
+                                for field, field_type in newtype['fields'].items()}
+        else:
+            for field in self.globals[slot]['fields'].values():
+                field['value'] = None
         return None
     
     def visitType_defVar(self, ctx: syntaxParser.Type_defVarContext):
@@ -200,13 +429,11 @@ class RuntimeVisitor(syntaxVisitor):
         if ctx is None:
             return None
         
-        newtype_name = ctx.IDENTIFIER(0).getText()
         field_name = ctx.IDENTIFIER(1).getText()
         
-        newtype = self.symbol_table.lookup(newtype_name)
-        
-        if newtype and 'fields' in newtype and field_name in newtype['fields']:
-            return newtype['fields'][field_name]['value']
+        fields = self.instance_fields(ctx.address)
+        if field_name in fields:
+            return fields[field_name]['value']
         return None
     
     #--------------------------------------------------
@@ -238,12 +465,11 @@ class RuntimeVisitor(syntaxVisitor):
         for i in range(len(expressions)):
             condition = self.visit(expressions[i])
             if condition:
-                self.visit(blocks[i])
-                return None
+                return self.visit(blocks[i])
         
         # If no conditions matched and there's an else block
         if len(blocks) > len(expressions):
-            self.visit(blocks[-1])
+            return self.visit(blocks[-1])
         
         return None
     
@@ -252,51 +478,35 @@ class RuntimeVisitor(syntaxVisitor):
         if ctx is None or ctx.while_stmt() is None:
             return None
             
-        # Access the while_stmt rule
+        # Access the while_stmt rule, looking up its children once per loop
         while_stmt = ctx.while_stmt()
-        
-        # Save flags state
-        prev_break = self.break_flag
-        prev_continue = self.continue_flag
-        self.break_flag = False
-        self.continue_flag = False
-
-        # Reset iteration counter for this loop
-        self.iterations = 0     
+        condition_expr = while_stmt.expression()
+        body = while_stmt.block()
+        budget = self.budget
 
         # Execute the while loop
         while True:
-            # Check for timeout or max iterations
-            current_time = time.time()
-            if current_time - self.start_time > self.timeout:
-                report_error(self, f"Program execution exceeded {self.timeout} seconds timeout. Possible infinite loop.")
-                return None
-                
-            self.iterations += 1
-            if self.iterations > self.max_iterations:
-                report_error(self, f"Loop exceeded {self.max_iterations} iterations. Possible infinite loop.")
-                return None
+            # Count the iteration against the budget of the whole run
+            budget.steps += 1
+            if budget.steps >= budget.next_check:
+                message = budget.check()
+                if message:
+                    report_error(self, message)
+                    return None
 
             # Evaluate condition
-            condition = self.visit(while_stmt.expression())
-            if not condition or self.break_flag:
+            condition = self.visit(condition_expr)
+            if not condition:
                 break
             
             # Execute the body
-            self.visit(while_stmt.block())
-            
-            # Handle continue
-            if self.continue_flag:
-                self.continue_flag = False
-                continue
-                
-            # Handle return in loop body
-            if self.in_function and self.return_value is not None:
-                break
-        
-        # Restore flags
-        self.break_flag = prev_break
-        self.continue_flag = prev_continue
+            signal = self.visit(body)
+            if signal is not None:
+                if signal is BREAK:
+                    break
+                if signal is not CONTINUE:
+                    # Return from inside the loop, handed on to the function
+                    return signal
         
         return None
 
@@ -305,42 +515,41 @@ class RuntimeVisitor(syntaxVisitor):
         if ctx is None:
             return None
             
-        # Set continue flag
-        self.continue_flag = True
-        return None
+        return CONTINUE
     
     def visitBreak(self, ctx:syntaxParser.BreakContext):
         """Handle break statements in loops."""
         if ctx is None:
             return None
             
-        # Set break flag
-        self.break_flag = True
-        return None
+        return BREAK
     
     def visitTryStmt(self, ctx:syntaxParser.TryStmtContext):
         """Handle try-except statements."""
         if ctx is None or ctx.try_stmt() is None: 
             return None 
         previous_try_flag = getattr(self, "is_in_try_block", False)
+        signal = None
         
         try: 
             self.is_in_try_block = True 
             try_block = ctx.try_stmt().block(0)
             if try_block:
-                self.visit(try_block)
+                signal = self.visit(try_block)
+        except UncaughtRuntimeError:
+            raise
         except InterpreterRuntimeError as e: 
             self._current_exception = str(e)  # Store the exception
             self._inside_except = True
             self.is_in_try_block = False  # Errors in except block should crash
             except_block = ctx.try_stmt().block(1)
             if except_block:
-                self.visit(except_block)
+                signal = self.visit(except_block)
             self._inside_except = False
             self._current_exception = None 
         finally: 
             self.is_in_try_block = previous_try_flag  # Restore the previous state
-        return None
+        return signal
     
     #--------------------------------------------------
     # Function Handling
@@ -361,94 +570,91 @@ class RuntimeVisitor(syntaxVisitor):
         # Special handling for get_error function in exception handling
         if func_name == "get_error":
             if self._current_exception:
-                e = str(self._current_exception)
-                self.symbol_table.update(func_name, {"type": "str", "value": e})
-                return e
+                return str(self._current_exception)
             else:
                 raise RuntimeError("get_error() called outside of except block")
             return None
         
+        if is_builtin(self.symbol_table, func_name):
+            args = [self.visit(expr_ctx) for expr_ctx in ctx.arg_list().expression()] if ctx.arg_list() else []
+            try:
+                return call_builtin(func_name, args)
+            except BuiltinError as e:
+                report_error(self, e.message)
+        
         # Lookup function definition
-        func_def = self.function_definitions.get(func_name)
-        if not func_def:
-            report_error(f"Function '{func_name}' not defined.")
-            return None
+        layout = self.frame_layout(func_name)
         
-        # Evaluate arguments
-        args = []
+        # Evaluate arguments straight into the parameter slots of a new frame
+        frame = layout.acquire()
         if ctx.arg_list():
-            for expr_ctx in ctx.arg_list().expression():
-                if expr_ctx is not None:
-                    arg_value = self.visit(expr_ctx)
-                    args.append(arg_value)
+            for slot, expr_ctx in enumerate(ctx.arg_list().expression()):
+                frame[slot] = self.visit(expr_ctx)
+        
+        # A pure function only runs for arguments it has no result for
+        memo = layout.memo
+        if memo is not None:
+            key = memo_key(frame[:layout.nparams])
+            return_value = memo.lookup(key)
+            if return_value is MISSING:
+                return_value = self.execute_function(layout, frame)
+                memo.store(key, return_value)
+            else:
+                layout.release(frame)
+            return return_value
         
         # Execute the function and return its value
-        return_value = self.execute_function(func_name, args)
+        return_value = self.execute_function(layout, frame)
         return return_value
     
-    def execute_function(self, func_name, args):
+    def visitFuncCallStmt(self, ctx:syntaxParser.FuncCallStmtContext):
+        """Handle function calls used as statements, discarding the result."""
+        if ctx is None or ctx.function_call() is None:
+            return None
+        # function_call has the same shape as a call expression
+        self.visitFuncCallExpr(ctx.function_call())
+        return None
+    
+    def execute_function(self, layout, frame):
         """
-        Execute a function with the given arguments.
+        Execute a function in a frame whose parameter slots are already bound.
         
         Args:
-            func_name: Name of the function to execute
-            args: List of argument values
+            layout: FrameLayout of the function to execute
+            frame: Frame from layout.acquire() holding the arguments
             
         Returns:
             The function's return value
         """
-        # Get function info
-        func_info = self.function_definitions.get(func_name)
-        if not func_info:
-            func_info = self.symbol_table.lookup(func_name)
-            
-        if not func_info or func_info.get("type") != "function":
-            report_error(f"Function '{func_name}' not defined.")
-            return None
-
-        # Save current state
         prev_function = self.in_function
-        prev_return = self.return_value
-        prev_break = self.break_flag
-        prev_continue = self.continue_flag
-        
-        # Set up new function scope
-        self.symbol_table.push_scope(f"Call_{func_name}")
-        self.in_function = func_name
-        self.return_value = None
-        self.break_flag = False
-        self.continue_flag = False
-        
-        # Bind arguments to parameters
-        params = func_info.get('params', [])
-        for i, param in enumerate(params):
-            if i < len(args):
-                self.symbol_table.define(param['name'], {
-                    'type': param['type'],
-                    'value': args[i]
-                })
-            else:
-                self.symbol_table.define(param['name'], {
-                    'type': param['type'],
-                    'value': None
-                })
+        self.in_function = layout.name
+        self.frames.append(frame)
+        self.frame = frame
         
         # Execute function body
-        if 'body' in func_info:
-            self.visit(func_info['body'])
-        
-        # Get return value and restore state
-        return_val = self.return_value
-        self.symbol_table.pop_scope()
-        self.in_function = prev_function
-        self.return_value = prev_return
-        self.break_flag = prev_break
-        self.continue_flag = prev_continue
-        
-        return return_val
+        signal = None
+        try:
+            if layout.body is not None:
+                signal = self.visit(layout.body)
+                while signal is TAIL_CALL:
+                    signal = self.visit(layout.body)
+        except RecursionError:
+            # Every call nests Python frames, so Python's recursion limit
+            # bounds the call depth of this engine
+            stack_overflow(self)
+        finally:
+            self.frames.pop()
+            self.frame = self.frames[-1]
+            self.in_function = prev_function
+            layout.release(frame)
+        
+        # A return statement completes with a 1-tuple, falling off the end returns None
+        if signal.__class__ is tuple:
+            return signal[0]
+        return None
 
     def visitReturnStmt(self, ctx:syntaxParser.ReturnStmtContext):
-        """Handle return statements in functions."""
+        """Handle return statements in functions, completing with a 1-tuple."""
         # Check if inside a function
         if not self.in_function:
             report_error(self, "Return statement outside function.")
@@ -461,14 +667,30 @@ class RuntimeVisitor(syntaxVisitor):
         elif hasattr(ctx, 'expression') and ctx.expression():
             expr = ctx.expression()
         
-        # Set return value
+        call = ctx.tail_call
+        if call is not None:
+            return self.tail_call(call)
+
+        # Complete with the return value, even when it is None
         if expr:
-            self.return_value = self.visit(expr)
-        else:
-            self.return_value = None
-            
-        return None
-    
+            return (self.visit(expr),)
+        return (None,)
+    
+    def tail_call(self, ctx):
+        """Rebind the parameters of the running function for a tail call."""
+        # Each tail call replaces a call by a loop iteration
+        budget = self.budget
+        budget.steps += 1
+        if budget.steps >= budget.next_check:
+            message = budget.check()
+            if message:
+                report_error(self, message)
+
+        # Evaluate every argument before the first parameter changes
+        args = [self.visit(expr_ctx) for expr_ctx in ctx.arg_list().expression()] if ctx.arg_list() else []
+        self.frame[:len(args)] = args
+        return TAIL_CALL
+
     #--------------------------------------------------
     # I/O Operations
     #--------------------------------------------------
@@ -485,7 +707,7 @@ class RuntimeVisitor(syntaxVisitor):
         if expr:
             # Execute the expression and print the result
             expr_value = self.visit(expr)
-            self.output.append(str(expr_value))
+            self.output.write(str(expr_value))
         
         return None
     
@@ -495,138 +717,22 @@ class RuntimeVisitor(syntaxVisitor):
     
     def visitIntArray(self, ctx:syntaxParser.IntArrayContext):
         """Handle integer array literals."""
-        if ctx is None:
-            return None
-            
-        result = []
-        # Get all NUMBER tokens - make sure ctx.NUMBER() is available
-        if hasattr(ctx, 'NUMBER') and callable(getattr(ctx, 'NUMBER')):
-            number_tokens = ctx.NUMBER()
-            for number_token in number_tokens:
-                text = number_token.getText()
-                # Convert to appropriate numeric type
-                if '.' in text:
-                    value = float(text)
-                else:
-                    value = int(text)
-                result.append(value)
-        else:
-            # Alternative approach - parse the array from text directly
-            text = ctx.getText()
-            if text.startswith('[') and text.endswith(']'):
-                content = text[1:-1].strip()
-                if content:
-                    items = content.split(',')
-                    for item in items:
-                        num_str = item.strip()
-                        if '.' in num_str:
-                            result.append(float(num_str))
-                        else:
-                            result.append(int(num_str))
-                            
-        return result
+        values = []
+        for number_token in ctx.int_Array().NUMBER():
+            text = number_token.getText()
+            # Convert to appropriate numeric type
+            values.append(float(text) if '.' in text else int(text))
+        return pack_array(values)
     
     def visitCharArray(self, ctx:syntaxParser.CharArrayContext):
         """Handle character array literals."""
-        if ctx is None:
-            return None
-                
-        # Process character array literals
-        result = []
-        
-        # Get all CHARACTER tokens - make sure ctx.CHARACTER() is available
-        if hasattr(ctx, 'CHARACTER') and callable(getattr(ctx, 'CHARACTER')):
-            character_tokens = ctx.CHARACTER()
-            for char_token in character_tokens:
-                text = char_token.getText()
-                # Remove quotes from character literal
-                value = text[1:-1]  # Remove the surrounding quotes
-                result.append(value)
-        else:
-            # Alternative approach - parse from text directly
-            full_text = ctx.getText()
-            # Strip the outer brackets
-            if full_text.startswith('[') and full_text.endswith(']'):
-                content = full_text[1:-1].strip()
-                if not content:
-                    return []
-                    
-                # Split by commas, but be careful with quoted characters
-                parts = []
-                current = ""
-                in_quotes = False
-                for char in content:
-                    if char == "'" and (len(current) == 0 or current[-1] != '\\'):
-                        in_quotes = not in_quotes
-                    elif char == ',' and not in_quotes:
-                        parts.append(current.strip())
-                        current = ""
-                        continue
-                    current += char
-                
-                # Add the last part
-                if current:
-                    parts.append(current.strip())
-                
-                # Process each part
-                for part in parts:
-                    if part.startswith("'") and part.endswith("'"):
-                        result.append(part[1:-1])
-                    else:
-                        result.append(part)
-                        
-        return result
+        # Remove the quotes of every character literal
+        return [token.getText()[1:-1] for token in ctx.char_Array().CHARACTER()]
     
     def visitStringArray(self, ctx:syntaxParser.StringArrayContext):
         """Handle string array literals."""
-        if ctx is None:
-            return None
-                
-        # Process string array literals
-        result = []
-        
-        # Get all STRING tokens - make sure ctx.STRING() is available
-        if hasattr(ctx, 'STRING') and callable(getattr(ctx, 'STRING')):
-            string_tokens = ctx.STRING()
-            for string_token in string_tokens:
-                text = string_token.getText()
-                # Remove quotes from string literal
-                value = text[1:-1]  # Remove the surrounding quotes
-                result.append(value)
-        else:
-            # Alternative approach - parse from text directly
-            full_text = ctx.getText()
-            # Strip the outer brackets
-            if full_text.startswith('[') and full_text.endswith(']'):
-                content = full_text[1:-1].strip()
-                if not content:
-                    return []
-                    
-                # Split by commas, but be careful with quoted strings
-                parts = []
-                current = ""
-                in_quotes = False
-                for char in content:
-                    if char == '"' and (len(current) == 0 or current[-1] != '\\'):
-                        in_quotes = not in_quotes
-                    elif char == ',' and not in_quotes:
-                        parts.append(current.strip())
-                        current = ""
-                        continue
-                    current += char
-                
-                # Add the last part
-                if current:
-                    parts.append(current.strip())
-                
-                # Process each part
-                for part in parts:
-                    if part.startswith('"') and part.endswith('"'):
-                        result.append(part[1:-1])
-                    else:
-                        result.append(part)
-                        
-        return result
+        # Remove the quotes of every string literal
+        return [token.getText()[1:-1] for token in ctx.strArray().STRING()]
 
     def visitArrayAccessExpr(self, ctx:syntaxParser.ArrayAccessExprContext):
         """Handle array access expressions (array[index])."""
@@ -636,96 +742,18 @@ class RuntimeVisitor(syntaxVisitor):
         # Get array name and index
         array_name = ctx.IDENTIFIER().getText()
         
-        # Find the array in symbol table
-        symbol = self.symbol_table.lookup(array_name)
-        if not symbol:
+        # The analyzer resolved the array to a slot
+        if getattr(ctx, 'address', None) is None:
             report_error(self, f"Array '{array_name}' not defined.")
             return None
                 
         # Get the array value
-        array_value = symbol.get('value', None)
+        array_value = self.load(ctx.address)
         
-        # Ensure the value is a list
-        if not isinstance(array_value, list):
-            # If it's a string representation, try to convert it
-            if isinstance(array_value, str) and array_value.startswith('[') and array_value.endswith(']'):
-                try:
-                    # Simple string-to-list conversion
-                    array_type = symbol.get('type', '')
-                    content = array_value[1:-1].strip()
-                    
-                    if not content:  # Empty array
-                        array_value = []
-                    else:
-                        items = []
-                        # Parse based on array type
-                        if array_type == 'char[]':
-                            # Split by commas, handle quotes
-                            parts = []
-                            current = ""
-                            in_quotes = False
-                            for char in content:
-                                if char == "'" and (len(current) == 0 or current[-1] != '\\'):
-                                    in_quotes = not in_quotes
-                                elif char == ',' and not in_quotes:
-                                    parts.append(current.strip())
-                                    current = ""
-                                    continue
-                                current += char
-                            
-                            # Add the last part
-                            if current:
-                                parts.append(current.strip())
-                            
-                            # Process char values
-                            for part in parts:
-                                if part.startswith("'") and part.endswith("'"):
-                                    items.append(part[1:-1])
-                                else:
-                                    items.append(part)
-                        elif array_type == 'str[]':
-                            # Split by commas, handle quotes
-                            parts = []
-                            current = ""
-                            in_quotes = False
-                            for char in content:
-                                if char == '"' and (len(current) == 0 or current[-1] != '\\'):
-                                    in_quotes = not in_quotes
-                                elif char == ',' and not in_quotes:
-                                    parts.append(current.strip())
-                                    current = ""
-                                    continue
-                                current += char
-                            
-                            # Add the last part
-                            if current:
-                                parts.append(current.strip())
-                            
-                            # Process string values
-                            for part in parts:
-                                if part.startswith('"') and part.endswith('"'):
-                                    items.append(part[1:-1])
-                                else:
-                                    items.append(part)
-                        else:  # int[] or float[]
-                            # Simple split for numeric arrays
-                            for item in content.split(','):
-                                item = item.strip()
-                                if '.' in item:
-                                    items.append(float(item))
-                                else:
-                                    items.append(int(item))
-                        
-                        array_value = items
-                    
-                    # Update the symbol table with parsed array
-                    self.symbol_table.update(array_name, {'value': array_value})
-                except Exception as e:
-                    report_error(self, f"Failed to parse array: {str(e)}")
-                    return None
-            else:
-                report_error(self, f"Variable '{array_name}' is not an array.")
-                return None
+        # Variables hold runtime values only, so anything else is an error
+        if not isinstance(array_value, ARRAY_TYPES):
+            report_error(self, f"Variable '{array_name}' is not an array.")
+            return None
                 
         # Calculate the index
         index_value = self.visit(ctx.expression())
@@ -752,14 +780,16 @@ class RuntimeVisitor(syntaxVisitor):
         if ctx is None or ctx.IDENTIFIER() is None:
             return None
             
-        name = ctx.IDENTIFIER().getText()
-        symbol = self.symbol_table.lookup(name)
-        
-        if not symbol:
-            report_error(self, f"Variable '{name}' not defined.")
+        address = getattr(ctx, 'address', None)
+        if address is None:
+            report_error(self, f"Variable '{ctx.IDENTIFIER().getText()}' not defined.")
             return None
         
-        return symbol.get('value', None)
+        return self.load(address)
+    
+    def visitConstant(self, ctx):
+        """Return the value ConstantFolder precomputed for a constant expression."""
+        return ctx.const_value
     
     def visitNumberExpr(self, ctx:syntaxParser.NumberExprContext):
         """Handle numeric literals."""
@@ -837,21 +867,35 @@ class RuntimeVisitor(syntaxVisitor):
         if len(ctx.unary_expr()) == 1:
             return self.visit(ctx.unary_expr(0))
             
+        # Fold the operands from left to right
+        ops = specialised_ops(ctx)
         left = self.visit(ctx.unary_expr(0))
-        right = self.visit(ctx.unary_expr(1))
-        op = ctx.getChild(1).getText()
-        
-        if not isinstance(left, (int, float)) or not isinstance(right, (int, float)):
-            report_error(self, "Invalid operands for multiplication/division.")
-            return None
-        
-        if op == '*':
-            return left * right
-        else:  # op == '/'
-            if right == 0:
-                report_error(self, "Division by zero.")
+        for i in range(1, len(ctx.unary_expr())):
+            right = self.visit(ctx.unary_expr(i))
+            
+            # Operation chosen from the static types; values that do not
+            # match them fall through to the checks below
+            fast = ops[i - 1]
+            if fast is not None:
+                try:
+                    left = fast(left, right)
+                    continue
+                except (TypeError, ZeroDivisionError):
+                    pass
+            
+            op = ctx.getChild(2 * i - 1).getText()
+            if not isinstance(left, (int, float)) or not isinstance(right, (int, float)):
+                report_error(self, "Invalid operands for multiplication/division.")
                 return None
-            return left / right
+            
+            if op == '*':
+                left = left * right
+            else:  # op == '/'
+                if right == 0:
+                    report_error(self, "Division by zero.")
+                    return None
+                left = left / right
+        return left
     
     def visitAddSubExpr(self, ctx:syntaxParser.AddSubExprContext):
         """Handle addition and subtraction expressions."""
@@ -862,26 +906,40 @@ class RuntimeVisitor(syntaxVisitor):
         if len(ctx.mul_expr()) == 1:
             return self.visit(ctx.mul_expr(0))
                 
+        # Fold the operands from left to right
+        ops = specialised_ops(ctx)
         left = self.visit(ctx.mul_expr(0))
-        right = self.visit(ctx.mul_expr(1))
-        op = ctx.getChild(1).getText()
-        
-        if op == '+':
-            # String concatenation - convert both operands to strings if either is a string
-            if isinstance(left, str) or isinstance(right, str):
-                return str(left) + str(right)
-            # Numeric addition
-            elif isinstance(left, (int, float)) and isinstance(right, (int, float)):
-                return left + right
-            else:
-                report_error(self, "Invalid operands for addition.")
-                return None
-        else:  # op == '-'
-            if isinstance(left, (int, float)) and isinstance(right, (int, float)):
-                return left - right
-            else:
-                report_error(self, "Invalid operands for subtraction.")
-                return None
+        for i in range(1, len(ctx.mul_expr())):
+            right = self.visit(ctx.mul_expr(i))
+            
+            # Operation chosen from the static types; values that do not
+            # match them fall through to the checks below
+            fast = ops[i - 1]
+            if fast is not None:
+                try:
+                    left = fast(left, right)
+                    continue
+                except TypeError:
+                    pass
+            
+            op = ctx.getChild(2 * i - 1).getText()
+            if op == '+':
+                # String concatenation - convert both operands to strings if either is a string
+                if isinstance(left, str) or isinstance(right, str):
+                    left = str(left) + str(right)
+                # Numeric addition
+                elif isinstance(left, (int, float)) and isinstance(right, (int, float)):
+                    left = left + right
+                else:
+                    report_error(self, "Invalid operands for addition.")
+                    return None
+            else:  # op == '-'
+                if isinstance(left, (int, float)) and isinstance(right, (int, float)):
+                    left = left - right
+                else:
+                    report_error(self, "Invalid operands for subtraction.")
+                    return None
+        return left
     
     def visitCompExpr(self, ctx:syntaxParser.CompExprContext):
         """Handle comparison expressions (==, !=, <, >, <=, >=)."""
@@ -897,44 +955,22 @@ class RuntimeVisitor(syntaxVisitor):
         if len(add_expressions) == 1:
             return self.visit(add_expressions[0])
         
-        # Get comparison operators
-        operators = []
-        for i in range(ctx.getChildCount()):
-            child = ctx.getChild(i)
-            if child.getText() in ['<', '<=', '>', '>=', '==', '!=']:
-                operators.append(child.getText())
+        # Operators resolved once, from the static types where they are known
+        ops = specialised_ops(ctx)
         
         # Evaluate the first expression
         left = self.visit(add_expressions[0])
         
         # Apply operators
-        for i in range(len(operators)):
-            op = operators[i]
+        for i in range(len(ops)):
             right = self.visit(add_expressions[i+1])
-            
-            if op == '<':
-                result = left < right
-            elif op == '<=':
-                result = left <= right
-            elif op == '>':
-                result = left > right
-            elif op == '>=':
-                result = left >= right
-            elif op == '==':
-                result = left == right
-            elif op == '!=':
-                result = left != right
-            else:
-                report_error(f"Unknown comparison operator: {op}")
-                return None
+            compare = ops[i] or COMPARE_FUNCS[ctx.getChild(2 * i + 1).symbol.type]
+            result = compare(left, right)
                 
             # Combine results for chained comparisons
-            if i < len(operators) - 1:
-                if not result:
-                    return False
-                left = right
-            else:
-                return result
+            if not result:
+                return False
+            left = right
                 
         return result
 
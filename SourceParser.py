@@ -0,0 +1,155 @@
+"""
+SourceParser.py - Front end turning source text into a syntaxParser tree.
+Parsing runs in two stages: the fast SLL prediction mode with a bail-out
+error strategy first, and only if that fails a full LL reparse reporting
+errors through SyntaxErrorHandling. SLL accepts every valid program of this
+grammar, so the LL stage normally only runs for input with syntax errors.
+
+With the 'fast' front end the hand-written parser of FastParser.py builds
+the tree instead, and ANTLR only runs to report the errors of invalid input.
+
+The generated lexer and parser cache their predictions in DFAs shared by
+all instances, which start empty in every process, so the first parses are
+several times slower than later ones. warm_up() fills the caches ahead of
+time, and a SourceParser reuses one lexer and parser for all its parses.
+"""
+import time
+from antlr4 import InputStream, CommonTokenStream
+from antlr4.atn.PredictionMode import PredictionMode
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
+from syntaxLexer import syntaxLexer
+from syntaxParser import syntaxParser
+from SyntaxErrorHandling import SyntaxErrorHandling
+from FastParser import FastParser, FastParseError
+
+FRONT_ENDS = ('antlr', 'fast')
+
+# Valid program using every rule, alternative and operator of the grammar
+WARM_UP_SOURCE = """
+type Point { int x; float y; str name; char tag; int[] values; }
+Point p;
+p.x = 1;
+int[] numbers = [1, 2, 3];
+char[] letters = ['a', 'b'];
+str[] words = ["one", "two"];
+float ratio = -1.5;
+bool_flag = true and false or !(p.x >= 2);
+func int add(int a, float b) {
+    return a + b * 2 - (a / 3);
+}
+func void show(str text) {
+    print(text);
+}
+func pick() {
+    return numbers[0];
+}
+show("warm");
+while (p.x < 10 and p.x != -3) {
+    p.x = add(p.x, ratio) + pick();
+    if (p.x == 4) {
+        continue;
+    } else if (p.x <= 5) {
+        break;
+    } else {
+        { int inner = -p.x; }
+    }
+}
+try {
+    print(letters[1] > 'a');
+} except {
+    print(get_error());
+}
+"""
+
+_warmed_up = False
+
+def warm_up():
+    """
+    Parse WARM_UP_SOURCE in both prediction modes so the shared lexer and
+    parser DFAs are filled before the first real parse. Later calls in the
+    same process do nothing.
+
+    Returns:
+        Seconds spent warming up
+    """
+    global _warmed_up
+    if _warmed_up:
+        return 0.0
+    _warmed_up = True
+    start = time.perf_counter()
+    SourceParser(two_stage=False).parse(WARM_UP_SOURCE)
+    SourceParser().parse(WARM_UP_SOURCE)
+    return time.perf_counter() - start
+
+
+class SourceParser:
+    """Parses programs, trying SLL prediction before falling back to LL."""
+    def __init__(self, two_stage=True, front_end='antlr'):
+        """
+        Args:
+            two_stage: Whether to try SLL prediction first; False always
+                parses with full LL, as the generated parser does by default
+            front_end: 'antlr' for the generated parser, 'fast' for the
+                hand-written one
+        """
+        if front_end not in FRONT_ENDS:
+            raise ValueError(f"Unknown front end: {front_end}")
+        self.two_stage = two_stage
+        self.front_end = front_end
+        self.fast_parser = FastParser() if front_end == 'fast' else None
+        self.ll_fallbacks = 0       # Parses that needed the LL stage
+        self.antlr_fallbacks = 0    # Fast parses handed over to ANTLR
+
+        # Reused for every parse, only the input changes
+        self.lexer = syntaxLexer(InputStream(""))
+        self.token_stream = CommonTokenStream(self.lexer)
+        self.parser = syntaxParser(self.token_stream)
+        self.parser.removeErrorListeners()
+        self.bail_strategy = BailErrorStrategy()
+        self.default_strategy = DefaultErrorStrategy()
+
+    def parse(self, source):
+        """
+        Parse a program.
+
+        Args:
+            source: Program source text
+
+        Returns:
+            (ProgramContext, number of syntax errors reported)
+        """
+        if self.fast_parser:
+            try:
+                return self.fast_parser.parse(source), 0
+            except (FastParseError, RecursionError):
+                # Let ANTLR report the error, or parse what is nested too deeply
+                self.antlr_fallbacks += 1
+
+        # Point the lexer, token stream and parser at the new source,
+        # which resets their state from the previous parse
+        self.lexer.inputStream = InputStream(source)
+        self.token_stream.setTokenSource(self.lexer)
+        parser = self.parser
+        parser.removeErrorListeners()
+
+        if self.two_stage:
+            # Stage 1: SLL prediction, giving up at the first error
+            parser._errHandler = self.bail_strategy
+            parser.setTokenStream(self.token_stream)
+            parser._interp.predictionMode = PredictionMode.SLL
+            try:
+                return parser.program(), 0
+            except ParseCancellationException:
+                self.ll_fallbacks += 1
+                # Rewind the buffered tokens for the second stage
+                self.token_stream.seek(0)
+
+        # Stage 2: full LL prediction with error reporting and recovery
+        parser._errHandler = self.default_strategy
+        parser.setTokenStream(self.token_stream)
+        parser._interp.predictionMode = PredictionMode.LL
+        error_listener = SyntaxErrorHandling()
+        parser.addErrorListener(error_listener)
+        tree = parser.program()
+        return tree, error_listener.error_count
@@ -1,3 +1,4 @@
+from antlr4 import ParserRuleContext
 from syntaxParser import syntaxParser
 from syntaxVisitor import syntaxVisitor
 from ExpressionAnalyzer import ExpressionAnalyzer
@@ -21,6 +22,14 @@ def report_error(line, column, message, error_type="Error"):
     print(formatted_error)
     sys.exit(1)
 
+# Statements and expressions a pure function cannot contain
+IMPURE_CONTEXTS = (
+    syntaxParser.PrintStmtContext,          # Output
+    syntaxParser.TypeDefDeclStmtContext,    # Typedef instances
+    syntaxParser.NewTypeDefContext,         # Global type definitions
+    syntaxParser.FuncStmtContext,           # Global function definitions
+)
+
 class StatementAnalyzer(syntaxVisitor):
     def __init__(self, symbol_table):
         super().__init__()
@@ -28,11 +37,20 @@ class StatementAnalyzer(syntaxVisitor):
         self.expr_analyzer = ExpressionAnalyzer(symbol_table)
         self.current_function = None
         self.in_loop = False
+        self.in_try = False
 
     def visitProgram(self, ctx:syntaxParser.ProgramContext):
+        # An analyzer is reused for every line of a REPL session, so clear
+        # what an earlier program that failed half-way may have left
+        self.current_function = None
+        self.in_loop = False
+        self.in_try = False
         self.symbol_table.reset_to_global()
+        self.symbol_table.frame_size = 0
         for stmt in ctx.statement():
             self.visit(stmt)
+        # Slots needed by block variables of the top-level statements
+        ctx.nlocals = self.symbol_table.frame_size
         return None
     
     def visitBlockStmt(self, ctx:syntaxParser.BlockStmtContext):
@@ -57,14 +75,13 @@ class StatementAnalyzer(syntaxVisitor):
             if symbol is None:
                 message = f"Variable '{name}' not declared before assignment."
                 report_error(line, column, message)
+            ctx.address = symbol.get('address')
             
             if assign.expression():
                 value_type = self.expr_analyzer.visit(assign.expression())
                 if value_type != symbol['type'] and value_type is not None:
                     message = f"Mismatched types in assignment of '{name}': expected '{symbol['type']}', got '{value_type}'"
                     report_error(line, column, message, "Type Error")
-                else:
-                    self.symbol_table.update(name, {'value': assign.expression().getText()})
         
         # Typedef assignment
         elif assign.type_defVar():
@@ -80,14 +97,13 @@ class StatementAnalyzer(syntaxVisitor):
                 message = f"Field '{field_name}' not found in new-type instance '{newtype_name}'."
                 report_error(line, column, message)
 
+            ctx.address = newtype['address']
             expected_type = newtype['fields'][field_name]['type']
             value_type = self.expr_analyzer.visit(assign.expression())
             
             if expected_type != value_type:
                 message = f"Mismatched types in field assignment '{newtype_name}.{field_name}': expected '{expected_type}', got '{value_type}'"
                 report_error(line, column, message, "Type Error")
-            else:
-                self.symbol_table.updateField_typedef(newtype_name, field_name, assign.expression().getText())
         
         return None
 
@@ -99,7 +115,7 @@ class StatementAnalyzer(syntaxVisitor):
         identifier = var_decl.IDENTIFIER().getText()
 
         try:
-            self.symbol_table.define(identifier, {'type': declared_type, 'value': None}, line, column)
+            ctx.address = self.symbol_table.define_variable(identifier, {'type': declared_type, 'value': None}, line, column)
         except ValueError as e:
             # Extract the error message from the exception
             message = str(e)
@@ -112,9 +128,7 @@ class StatementAnalyzer(syntaxVisitor):
         if var_decl.expression():
             evaluated_type = self.expr_analyzer.visit(var_decl.expression())
             if evaluated_type is not None:
-                if evaluated_type == declared_type or (declared_type.endswith('[]') and evaluated_type == declared_type[:-2]):
-                    self.symbol_table.update(identifier, {'value': var_decl.expression().getText()})
-                else:
+                if evaluated_type != declared_type and not (declared_type.endswith('[]') and evaluated_type == declared_type[:-2]):
                     message = f"Mismatched types in declaration of '{identifier}': expected '{declared_type}', got '{evaluated_type}'"
                     report_error(line, column, message, "Type Error")
             else:
@@ -146,27 +160,42 @@ class StatementAnalyzer(syntaxVisitor):
                 params.append({'type': param_type, 'name': param_name})
         
         self.symbol_table.reset_to_global()
-        self.symbol_table.define(func_name, {
+        func_info = {
             'type': 'function',
             'return_type': return_type,
             'params': params,
             'body': ctx.block()
-        }, line, column)
+        }
+        self.symbol_table.define(func_name, func_info, line, column)
         
         old_function = self.current_function
         self.current_function = func_name
+        old_in_try = self.in_try
+        self.in_try = False
+        old_frame_size = self.symbol_table.frame_size
+        self.symbol_table.frame_size = 0
         
+        # Parameters take the first slots of the call frame
         self.symbol_table.push_scope(f"Function {func_name}")
         for param in params:
-            self.symbol_table.define(param['name'], {'type': param['type'], 'value': None})
+            self.symbol_table.define_variable(param['name'], {'type': param['type'], 'value': None})
         
         self.visit(ctx.block())
+        func_info['pure'] = self.is_pure(ctx.block(), func_name)
         
         self.symbol_table.pop_scope()
+        func_info['nlocals'] = self.symbol_table.frame_size
+        self.symbol_table.frame_size = old_frame_size
         self.current_function = old_function
+        self.in_try = old_in_try
         
         return None
 
+    def visitFuncCallStmt(self, ctx: syntaxParser.FuncCallStmtContext):
+        # function_call has the same shape as a call expression
+        self.expr_analyzer.visitFuncCallExpr(ctx.function_call())
+        return None
+
     def visitType_defDeclaration(self, ctx: syntaxParser.Type_defDeclarationContext):
         line = ctx.start.line
         column = ctx.start.column
@@ -188,7 +217,7 @@ class StatementAnalyzer(syntaxVisitor):
         for field_name, field_type in newtypedef['fields'].items():
             instance_fields[field_name] = {'type': field_type, 'value': None}
 
-        self.symbol_table.define(var_name, {
+        ctx.address = self.symbol_table.define_variable(var_name, {
             'type': newtype_name,
             'kind': 'newtype_instance',
             'fields': instance_fields
@@ -258,6 +287,9 @@ class StatementAnalyzer(syntaxVisitor):
         
         return_type = func_info.get('return_type', 'void')
         
+        # Call the engines turn into a jump, set once the return type checks
+        ctx.tail_call = None
+
         # Access the expression
         expr = ctx.return_stmt().expression() if hasattr(ctx, 'return_stmt') and ctx.return_stmt() else None
         if not expr:
@@ -275,8 +307,71 @@ class StatementAnalyzer(syntaxVisitor):
         elif expr_type != return_type:
             message = f"Return type mismatch: expected '{return_type}', got '{expr_type}'."
             report_error(line, column, message, "Type Error")            
+        else:
+            ctx.tail_call = self.tail_call(expr)
         return None
 
+    def is_pure(self, body, func_name):
+        """
+        Decide whether a function's result only depends on its arguments,
+        so its calls can be memoized (see MemoCache.py).
+
+        Args:
+            body: Analyzed BlockContext of the function, with addresses
+            func_name: Name of the function, which may call itself
+
+        Returns:
+            False if the body prints, defines types, functions or typedef
+            instances, reads or writes a global, or calls get_error(), a
+            builtin or a function that is not pure, otherwise True
+        """
+        nodes = [body]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, IMPURE_CONTEXTS):
+                return False
+            address = getattr(node, 'address', None)
+            if address is not None and address[0] == 0:
+                return False
+            if isinstance(node, (syntaxParser.FuncCallExprContext, syntaxParser.Function_callContext)):
+                name = node.IDENTIFIER().getText()
+                # get_error and the builtins have no 'pure' entry
+                if name != func_name and not self.symbol_table.global_scope[name].get('pure', False):
+                    return False
+            if node.children:
+                nodes.extend(child for child in node.children if isinstance(child, ParserRuleContext))
+        return True
+
+    def tail_call(self, expr):
+        """
+        Find a self-recursive call in tail position. Such a call can reuse
+        the frame of the running function: the engines rebind the parameters
+        to the new arguments and run the body again instead of nesting a call.
+        Inside a loop or try statement the call stays a normal call, so
+        every engine keeps the loop and the error handler of the caller.
+
+        Args:
+            expr: Expression of a return statement
+
+        Returns:
+            The FuncCallExprContext if the expression is nothing but a call
+            of the current function, otherwise None
+        """
+        if self.in_loop or self.in_try:
+            return None
+        node = expr
+        while not isinstance(node, syntaxParser.FuncCallExprContext):
+            if isinstance(node, syntaxParser.ParenExprContext):
+                node = node.expression()
+            elif isinstance(node, ParserRuleContext) and node.getChildCount() == 1:
+                # Operator chains with a single operand
+                node = node.getChild(0)
+            else:
+                return None
+        if node.IDENTIFIER().getText() != self.current_function:
+            return None
+        return node
+
     def visitIfStmt(self, ctx: syntaxParser.IfStmtContext):
         # Extract and analyze condition from if_stmt rule
         if_stmt_ctx = ctx.if_stmt()
@@ -333,6 +428,14 @@ class StatementAnalyzer(syntaxVisitor):
         self.in_loop = old_in_loop
         return None
     
+    def visitTryStmt(self, ctx: syntaxParser.TryStmtContext):
+        # Try and except blocks share the enclosing scope
+        old_in_try = self.in_try
+        self.in_try = True
+        self.visitChildren(ctx)
+        self.in_try = old_in_try
+        return None
+
     def visitContinue(self, ctx: syntaxParser.ContinueContext):
         line = ctx.start.line
         column = ctx.start.column
@@ -368,6 +471,7 @@ class StatementAnalyzer(syntaxVisitor):
             message = f"Variable '{array_name}' is not an array"
             report_error(line, column, message)
             return None
+        ctx.address = array_info['address']
             
         # Check the index expression
         index_type = self.expr_analyzer.visit(ctx.expression())
@@ -1,13 +1,22 @@
+import itertools
 from antlr4 import *
 from syntaxVisitor import syntaxVisitor
 from syntaxParser import syntaxParser
 
+# Block and function scopes kept for printSymbols, older ones are dropped
+SCOPE_HISTORY_LIMIT = 100
+
 class SymbolTableVisitor(syntaxVisitor):
-    def __init__(self):
+    def __init__(self, history_limit=SCOPE_HISTORY_LIMIT):
+        # history_limit caps the scopes kept in all_scopes besides the global
+        # scope: 0 disables the history and None keeps every scope
+        self.history_limit = history_limit
         self.global_scope = {}
         self.scopes = [self.global_scope]
         self.all_scopes = [{'name': 'Global', 'symbols': self.global_scope}]
         self.current_function = None
+        self.global_slots = []      # Global variable entries, indexed by slot
+        self.frame_size = 0         # Slots allocated in the local frame being analyzed
 
     @property
     def current_scope(self):
@@ -16,7 +25,11 @@ class SymbolTableVisitor(syntaxVisitor):
     def push_scope(self, scope_name="Anonymous"):
         new_scope = {}
         self.scopes.append(new_scope)
-        self.all_scopes.append({'name': scope_name, 'symbols': new_scope})
+        if self.history_limit != 0:
+            self.all_scopes.append({'name': scope_name, 'symbols': new_scope})
+            if self.history_limit is not None and len(self.all_scopes) > self.history_limit + 1:
+                # The global scope always stays first
+                del self.all_scopes[1]
 
     def pop_scope(self):
         if len(self.scopes) > 1:
@@ -31,6 +44,18 @@ class SymbolTableVisitor(syntaxVisitor):
             raise ValueError(f"[Error] Line {line}, Column {column}: Redeclaration of '{name}' in current scope.")
         self.current_scope[name] = value
 
+    def define_variable(self, name, value, line=None, column=None):
+        # Define a variable and give it a (depth, slot) address: depth 0 indexes
+        # global_slots, depth 1 the frame of the enclosing function or program
+        self.define(name, value, line, column)
+        if self.current_scope is self.global_scope:
+            value['address'] = (0, len(self.global_slots))
+            self.global_slots.append(value)
+        else:
+            value['address'] = (1, self.frame_size)
+            self.frame_size += 1
+        return value['address']
+
     def lookup(self, name):
         for scope in reversed(self.scopes):
             if name in scope:
@@ -60,6 +85,34 @@ class SymbolTableVisitor(syntaxVisitor):
                         return True
         return False
     
+    def global_values(self, start=0):
+        # Runtime values of global variables; instances map field -> value.
+        # Names are kept in definition order, so start skips the globals an
+        # engine already loaded and only newer ones are read
+        values = {}
+        if start >= len(self.global_scope):
+            return values
+        for name, info in itertools.islice(self.global_scope.items(), start, None):
+            if not isinstance(info, dict):
+                continue
+            if info.get('kind') == 'newtype_instance':
+                values[name] = {field: entry['value'] for field, entry in info['fields'].items()}
+            elif 'value' in info and info.get('type') != 'function':
+                values[name] = info['value']
+        return values
+
+    def store_global_values(self, values):
+        # Inverse of global_values, used by the compiled engines after a run
+        for name, value in values.items():
+            info = self.global_scope.get(name)
+            if info is None:
+                continue
+            if info.get('kind') == 'newtype_instance':
+                for field, field_value in value.items():
+                    info['fields'][field]['value'] = field_value
+            else:
+                info['value'] = value
+
     def printSymbols(self):
         print("=== Symbol Table ===")
         for scope in self.all_scopes:
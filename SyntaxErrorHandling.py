@@ -14,7 +14,7 @@ class SyntaxErrorHandling(ErrorListener):
         super().__init__()
         self.error_count = 0
 
-    def syntaxError(self, recognizer, offendingSymbol, line, column, msg):
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
         self.error_count += 1
         print(f"{RED}{BOLD}[Syntax Error]{RESET}{RED} Line {line}:{column} - {msg}{RESET}")
         
@@ -36,11 +36,16 @@ class SyntaxErrorHandling(ErrorListener):
             expected_tokens = recognizer.getExpectedTokens()
             if expected_tokens:
                 expected = []
+                # The Python runtime stores intervals as range objects
                 for interval in expected_tokens.intervals:
-                    for t in range(interval.a, interval.b + 1):
-                        if 0 <= t < len(recognizer.literalNames):
-                            token_name = recognizer.literalNames[t] or recognizer.symbolicNames[t]
-                            expected.append(token_name)
+                    for t in interval:
+                        if 0 <= t < len(recognizer.symbolicNames):
+                            literal = recognizer.literalNames[t] if t < len(recognizer.literalNames) else None
+                            # Tokens without a literal, like NUMBER, have '<INVALID>' there
+                            if literal and literal != "<INVALID>":
+                                expected.append(literal)
+                            else:
+                                expected.append(recognizer.symbolicNames[t])
                 expected_clean = ', '.join(filter(None, expected))
                 print(f"{BOLD}Expected one of:{RESET} {expected_clean}\n")
         except Exception as ex:
@@ -0,0 +1,359 @@
+"""
+Benchmark script for comparing the execution engines.
+
+Each workload is parsed and analyzed once per run; only the execution
+phase is timed, so the numbers reflect the engine and not ANTLR.
+
+With --memory the execution phase is traced with tracemalloc instead,
+reporting the peak and the memory still held after the run.
+
+With --parse only the front end is timed, on generated programs of
+increasing size, comparing full LL prediction with SLL and LL fallback
+and with the hand-written parser of FastParser.py.
+
+With --repl a REPL session is simulated: each step defines a variable and a
+function and then times one line calling them, so the latency of early and
+late lines shows whether the cost per line grows with the session.
+
+With --index the same indexing loop runs over arrays of increasing size,
+loaded with read_ints beforehand, to show that an array access costs the
+same however large the array is.
+
+With --memoize the workloads run with the results of pure functions
+cached, which makes exponential recursion like fib linear.
+
+With --tail a tail-recursive function loops TAIL_ITERATIONS times without
+limits on steps or time, which needs constant stack on every engine.
+
+Usage: python benchmark.py [--engines tree,closure,vm,python] [--repeat N] [--memoize] [--memory | --parse | --repl | --index | --tail] [workload ...]
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+from SourceParser import SourceParser
+from MemoCache import DEFAULT_MEMO_SIZE
+
+# pyoops-cmd.py is not importable with a plain import statement
+LanguageCommander = importlib.import_module('pyoops-cmd').LanguageCommander
+
+# Workloads only use globals and parameters so every engine can run them;
+# calls take their arguments from variables, as ConstantFolder evaluates
+# calls of pure functions with constant arguments before the timed run
+WORKLOADS = {
+    'loop': """
+        int i = 0;
+        int j = 0;
+        int total = 0;
+        while (i < 200) {
+            j = 0;
+            while (j < 50) {
+                total = total + i * j;
+                j = j + 1;
+            }
+            i = i + 1;
+        }
+        print(total);
+    """,
+    'recursion': """
+        func int fib(int n) {
+            if (n < 2) {
+                return n;
+            }
+            return fib(n - 1) + fib(n - 2);
+        }
+        int n = 16;
+        print(fib(n));
+    """,
+    'factorial': """
+        func int factorial(int n) {
+            if (n <= 1) {
+                return 1;
+            }
+            return n * factorial(n - 1);
+        }
+        int a = 12;
+        int b = 10;
+        int i = 0;
+        int total = 0;
+        while (i < 500) {
+            total = total + factorial(a) / factorial(b);
+            i = i + 1;
+        }
+        print(total);
+    """,
+    'helpers': """
+        func float add(float a, float b) {
+            return a + b;
+        }
+        func float scale(float x, float k) {
+            return x * k;
+        }
+        float k = 0.5;
+        float total = 0.0;
+        float x = 0.0;
+        int i = 0;
+        while (i < 2000) {
+            x = scale(total, k);
+            total = add(x, k);
+            i = i + 1;
+        }
+        print(total);
+    """,
+}
+
+# Tracing slows execution several times, keep within the loop timeout
+MEMORY_WORKLOADS = ('recursion',)
+
+# Steps of the --repl session, and lines averaged at its start and end
+REPL_STEPS = 1500
+REPL_SAMPLE = 100
+
+# Number of generated functions in the --parse programs
+PARSE_SIZES = (50, 200, 800)
+
+# Array sizes of --index, and the program timed on each; every iteration
+# of the inner loop reads one element, spread over the whole array
+INDEX_SIZES = (10, 1000, 100000)
+INDEX_ROUNDS = 1000
+INDEX_PROGRAM = """
+    func int probe(int[] xs, int stride) {
+        int i = 0;
+        int j = 0;
+        int total = 0;
+        while (i < %d) {
+            j = 0;
+            while (j < 10) {
+                total = total + xs[j * stride];
+                j = j + 1;
+            }
+            i = i + 1;
+        }
+        return total;
+    }
+    print(probe(data, %d));
+"""
+
+# Tail calls made by the --tail program
+TAIL_ITERATIONS = 1000000
+TAIL_PROGRAM = """
+    func int sum(int n, int acc) {
+        if (n == 0) {
+            return acc;
+        }
+        return sum(n - 1, acc + n);
+    }
+    int n = %d;
+    print(sum(n, 0));
+"""
+
+def generate_program(functions):
+    """Generate a large valid program for parse benchmarks."""
+    lines = []
+    for i in range(functions):
+        lines += [
+            f"func int f{i}(int n, int m) {{",
+            f"    int total = n * {i} + m;",
+            "    while (total > 100 and n != 0) {",
+            "        total = total - (m + 1) / 2;",
+            "        n = n - 1;",
+            "    }",
+            "    if (total < 0 or m == 3) {",
+            "        return -total;",
+            "    } else {",
+            "        return total + 1;",
+            "    }",
+            "}",
+        ]
+    for i in range(functions):
+        lines.append(f"print(f{i}({i}, {i % 7}));")
+    return "\n".join(lines) + "\n"
+
+def parse(source):
+    """Parse a workload into a ProgramContext."""
+    tree, _ = SourceParser().parse(source)
+    return tree
+
+def time_engine(source, engine, repeat, memo_size=None):
+    """
+    Time the execution phase of a workload.
+
+    Returns:
+        (best time in seconds, program output)
+    """
+    best = None
+    output = None
+    for _ in range(repeat):
+        commander = LanguageCommander(engine=engine, memo_size=memo_size)
+        tree = parse(source)
+        commander.analyze(tree)
+        start = time.perf_counter()
+        output = commander.run_tree(tree, show_output=False)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+def measure_memory(source, engine):
+    """
+    Trace the allocations of one execution of a workload.
+
+    Returns:
+        (peak bytes, bytes retained after the run, program output)
+    """
+    commander = LanguageCommander(engine=engine)
+    tree = parse(source)
+    commander.analyze(tree)
+    tracemalloc.start()
+    try:
+        output = commander.run_tree(tree, show_output=False)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, retained, output
+
+def time_parse(source, repeat, **options):
+    """Return the best parse time of a source and its tree as text."""
+    best = None
+    for _ in range(repeat):
+        front_end = SourceParser(**options)
+        start = time.perf_counter()
+        tree, _ = front_end.parse(source)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, tree.toStringTree(recog=tree.parser)
+
+def benchmark_parse(repeat):
+    """Compare the parsing modes and front ends on generated programs."""
+    for functions in PARSE_SIZES:
+        source = generate_program(functions)
+        print(f"== {functions} functions, {source.count(chr(10))} lines")
+        ll_time, ll_tree = time_parse(source, repeat, two_stage=False)
+        print(f"  {'LL':<8} {ll_time * 1000:10.2f} ms")
+        for name, options in (('SLL', {}), ('fast', {'front_end': 'fast'})):
+            elapsed, tree = time_parse(source, repeat, **options)
+            status = "" if tree == ll_tree else "  (TREE DIFFERS)"
+            print(f"  {name:<8} {elapsed * 1000:10.2f} ms  {ll_time / elapsed:7.1f}x{status}")
+
+def benchmark_repl(engines):
+    """Time REPL lines at the start and the end of a long session."""
+    for engine in engines:
+        commander = LanguageCommander(engine=engine)
+        times = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(REPL_STEPS):
+                commander.execute_string(f"int v{i} = {i};")
+                commander.execute_string(f"func int f{i}(int a) {{ return a + v0; }}")
+                start = time.perf_counter()
+                commander.execute_string(f"print(f{i}(v{i}) + f0(v0));")
+                times.append(time.perf_counter() - start)
+        first = sum(times[:REPL_SAMPLE]) / REPL_SAMPLE
+        last = sum(times[-REPL_SAMPLE:]) / REPL_SAMPLE
+        print(f"  {engine:<8} first {first * 1000:7.2f} ms  last {last * 1000:7.2f} ms per line")
+
+def benchmark_index(engines, repeat):
+    """Time array accesses on arrays of increasing size."""
+    accesses = INDEX_ROUNDS * 10
+    print(f"== index (us per access, {accesses} accesses)")
+    print(f"  {'':<8}" + "".join(f"{size:>12}" for size in INDEX_SIZES))
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {}
+        for size in INDEX_SIZES:
+            paths[size] = os.path.join(directory, f"{size}.txt")
+            with open(paths[size], 'w') as f:
+                f.write("\n".join(str(i) for i in range(size)))
+        for engine in engines:
+            row = []
+            for size in INDEX_SIZES:
+                commander = LanguageCommander(engine=engine)
+                # The array is a global of the session, filled before timing
+                commander.execute_string(f'int[] data = read_ints("{paths[size]}");', show_output=False)
+                tree = parse(INDEX_PROGRAM % (INDEX_ROUNDS, size // 10))
+                commander.analyze(tree)
+                program = commander.compile_tree(tree, show_output=False)
+                best = None
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    commander.run_program(program)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                row.append(best / accesses * 1e6)
+            print(f"  {engine:<8}" + "".join(f"{cost:12.3f}" for cost in row))
+
+def benchmark_tail(engines, repeat):
+    """Time a tail-recursive loop on each engine."""
+    source = TAIL_PROGRAM % TAIL_ITERATIONS
+    print(f"== tail ({TAIL_ITERATIONS} tail calls)")
+    expected = None
+    for engine in engines:
+        commander = LanguageCommander(engine=engine, max_steps=None, timeout=None)
+        tree = parse(source)
+        commander.analyze(tree)
+        program = commander.compile_tree(tree, show_output=False)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = commander.run_program(program)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if expected is None:
+            expected = output
+        status = "" if output == expected else "  (OUTPUT DIFFERS)"
+        print(f"  {engine:<8} {best * 1000:10.2f} ms  {best / TAIL_ITERATIONS * 1e6:7.3f} us per call  {output}{status}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the PyOops execution engines')
+    parser.add_argument('workloads', nargs='*', help=f"Workloads to run (default: all of {', '.join(WORKLOADS)})")
+    parser.add_argument('--engines', default='tree,closure,vm,python', help='Comma separated engines, the first one is the baseline')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per engine, the best time is reported')
+    parser.add_argument('--memoize', action='store_true', help='Cache the results of pure functions')
+    parser.add_argument('--memory', action='store_true', help='Report traced memory instead of time')
+    parser.add_argument('--parse', action='store_true', help='Time parsing of generated programs instead of execution')
+    parser.add_argument('--repl', action='store_true', help='Time REPL lines early and late in a long session')
+    parser.add_argument('--index', action='store_true', help='Time array accesses on arrays of increasing size')
+    parser.add_argument('--tail', action='store_true', help='Time a tail-recursive loop of a million calls')
+    args = parser.parse_args()
+
+    if args.tail:
+        benchmark_tail(args.engines.split(','), args.repeat)
+        return
+
+    if args.index:
+        benchmark_index(args.engines.split(','), args.repeat)
+        return
+
+    if args.repl:
+        benchmark_repl(args.engines.split(','))
+        return
+
+    if args.parse:
+        benchmark_parse(args.repeat)
+        return
+
+    engines = args.engines.split(',')
+    default_workloads = MEMORY_WORKLOADS if args.memory else WORKLOADS
+    for name in args.workloads or default_workloads:
+        source = WORKLOADS[name]
+        print(f"== {name}")
+        baseline = None
+        expected = None
+        for engine in engines:
+            if args.memory:
+                peak, retained, output = measure_memory(source, engine)
+                if expected is None:
+                    expected = output
+                status = "" if output == expected else "  (OUTPUT DIFFERS)"
+                print(f"  {engine:<8} peak {peak / 1024:9.1f} KiB  retained {retained / 1024:9.1f} KiB{status}")
+                continue
+            memo_size = DEFAULT_MEMO_SIZE if args.memoize else None
+            elapsed, output = time_engine(source, engine, args.repeat, memo_size)
+            if baseline is None:
+                baseline, expected = elapsed, output
+            status = "" if output == expected else "  (OUTPUT DIFFERS)"
+            print(f"  {engine:<8} {elapsed * 1000:10.2f} ms  {baseline / elapsed:7.1f}x{status}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Differential check of the two front ends.
+
+Every file is tokenized by syntaxLexer and by FastParser.tokenize, and
+parsed by syntaxParser and by FastParser. For valid programs both must give
+the same tokens and the same tree: context classes, token types, texts and
+positions, and the start/stop tokens of every context. For invalid
+programs the fast front end must reject the input too, so that SourceParser
+reports the error with ANTLR. Besides each whole file, every prefix of it
+ending at a line break is checked, which covers many invalid programs.
+
+Usage: python compare_front_ends.py [file.bibi ...]   (default: tests/ and test/)
+"""
+import glob
+import sys
+from antlr4 import InputStream, CommonTokenStream, Token
+from antlr4.error.ErrorListener import ErrorListener
+from antlr4.tree.Tree import TerminalNode
+from syntaxLexer import syntaxLexer
+from syntaxParser import syntaxParser
+from FastParser import FastParser, FastParseError, tokenize
+
+
+class CountingListener(ErrorListener):
+    """Counts errors without printing or exiting."""
+    def __init__(self):
+        super().__init__()
+        self.error_count = 0
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.error_count += 1
+
+
+def token_key(token):
+    if token is None:
+        return None
+    return (token.type, token.text, token.line, token.column, token.start, token.stop, token.tokenIndex)
+
+def antlr_parse(source):
+    """Return ANTLR's tokens, tree and error count for a source."""
+    listener = CountingListener()
+    lexer = syntaxLexer(InputStream(source))
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(listener)
+    token_stream = CommonTokenStream(lexer)
+    parser = syntaxParser(token_stream)
+    parser.removeErrorListeners()
+    parser.addErrorListener(listener)
+    tree = parser.program()
+    tokens = [token for token in token_stream.tokens if token.channel == Token.DEFAULT_CHANNEL]
+    return tokens, tree, listener.error_count
+
+def tree_difference(expected, actual, path="program"):
+    """Return a description of the first difference between two trees, or None."""
+    if type(expected) is not type(actual):
+        return f"{path}: {type(expected).__name__} != {type(actual).__name__}"
+    if isinstance(expected, TerminalNode):
+        if token_key(expected.symbol) != token_key(actual.symbol):
+            return f"{path}: token {token_key(expected.symbol)} != {token_key(actual.symbol)}"
+        return None
+    for name in ('start', 'stop'):
+        if token_key(getattr(expected, name)) != token_key(getattr(actual, name)):
+            return f"{path}: {name} token differs"
+    if expected.getChildCount() != actual.getChildCount():
+        return f"{path}: {expected.getChildCount()} children != {actual.getChildCount()}"
+    for i in range(expected.getChildCount()):
+        difference = tree_difference(expected.getChild(i), actual.getChild(i), f"{path}/{i}")
+        if difference:
+            return difference
+    return None
+
+def compare(source, fast_parser):
+    """Return None if both front ends agree on a source, else the difference."""
+    antlr_tokens, antlr_tree, error_count = antlr_parse(source)
+    try:
+        fast_tokens = tokenize(source)
+    except FastParseError:
+        fast_tokens = None
+    # The ANTLR lexer skips unrecognized characters, so only the tokens of
+    # valid input have to agree
+    if error_count == 0:
+        if fast_tokens is None:
+            return "fast lexer rejected valid input"
+        if [token_key(t) for t in antlr_tokens] != [token_key(t) for t in fast_tokens]:
+            return "tokens differ"
+
+    try:
+        fast_tree = fast_parser.parse(source)
+    except FastParseError as e:
+        return None if error_count else f"fast parser rejected valid input: {e}"
+    if error_count:
+        return "fast parser accepted invalid input"
+    return tree_difference(antlr_tree, fast_tree)
+
+def main():
+    files = sys.argv[1:] or sorted(glob.glob('tests/*.bibi') + glob.glob('test/*.bibi'))
+    fast_parser = FastParser()
+    failures = 0
+    for path in files:
+        with open(path, 'r') as f:
+            source = f.read()
+        lines = source.splitlines(keepends=True)
+        for count in range(len(lines), -1, -1):
+            difference = compare("".join(lines[:count]), fast_parser)
+            if difference:
+                failures += 1
+                print(f"FAIL {path} (first {count} lines): {difference}")
+                break
+    print(f"{len(files) - failures}/{len(files)} files agree")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
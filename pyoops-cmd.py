@@ -11,13 +11,21 @@ import sys
 import os
 import argparse
 import readline  # Adds command history and editing capabilities
-from antlr4 import *
-from syntaxLexer import syntaxLexer
-from syntaxParser import syntaxParser
-from SyntaxErrorHandling import SyntaxErrorHandling
-from SymbolTableVisitor import SymbolTableVisitor
+from SourceParser import SourceParser, FRONT_ENDS, warm_up
+from SymbolTableVisitor import SymbolTableVisitor, SCOPE_HISTORY_LIMIT
 from StatementAnalyzer import StatementAnalyzer
-from RuntimeVisitor import RuntimeVisitor
+from ConstantFolder import ConstantFolder
+from FunctionInliner import FunctionInliner
+from RuntimeVisitor import RuntimeVisitor, DEFAULT_MAX_STEPS, DEFAULT_TIMEOUT, DEFAULT_MAX_DEPTH
+from BytecodeCompiler import BytecodeCompiler
+from BytecodeVM import BytecodeVM
+from ClosureCompiler import ClosureCompiler
+from CompactAST import ASTLowering
+from PythonCodegen import PythonCodegen
+from ProgramCache import ProgramCache, CACHE_DIR
+from Builtins import define_builtins
+from OutputSink import MemorySink, StreamSink, FileSink, FLUSH_POLICIES
+from MemoCache import DEFAULT_MEMO_SIZE
 
 # Terminal colors for better output formatting
 CYAN_BOLD = "\033[1;36m"  
@@ -28,13 +36,79 @@ class LanguageCommander:
     Main class that handles executing code, both from files and interactively.
     Maintains a persistent symbol table across executions in the same session.
     """
-    def __init__(self):
-        """Initialize the commander with a fresh symbol table."""
-        self.symbol_table = SymbolTableVisitor()
+    def __init__(self, engine='tree', scope_history=SCOPE_HISTORY_LIMIT,
+                 max_steps=DEFAULT_MAX_STEPS, timeout=DEFAULT_TIMEOUT, front_end='antlr', output=None,
+                 max_depth=DEFAULT_MAX_DEPTH, memo_size=None):
+        """
+        Initialize the commander with a fresh symbol table.
+        
+        Args:
+            engine: Execution engine, 'tree' (RuntimeVisitor), 'closure'
+                (ClosureCompiler), 'vm' (BytecodeVM) or 'python' (PythonCodegen)
+            scope_history: Number of block and function scopes kept for
+                symbol table listings, 0 disables the history
+            max_steps: Loop iterations allowed in one execution, None for no limit
+            timeout: Seconds one execution may take, None for no limit
+            front_end: Parser building the syntax tree, 'antlr' (generated
+                from syntax.g4) or 'fast' (FastParser)
+            output: OutputSink receiving the lines programs print, None to
+                collect them in memory and print them after each execution
+            max_depth: Nested calls allowed by the 'vm' engine, None for no
+                limit; the other engines are bounded by Python's recursion limit
+            memo_size: Results cached per pure function, None to disable
+                memoization
+        """
+        self.engine = engine
+        self.output = output if output is not None else MemorySink()
+        self.scope_history = scope_history
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_depth = max_depth
+        self.memo_size = memo_size
+        self.cache = ProgramCache()
+        self.parser = SourceParser(front_end=front_end)
+        self.reset_symbol_table()
+    
+    def reset_symbol_table(self):
+        """Start a fresh symbol table with the built-in functions."""
+        self.symbol_table = SymbolTableVisitor(history_limit=self.scope_history)
         # Register built-in functions
-        self.symbol_table.define("get_error", {"type": "str"})
+        define_builtins(self.symbol_table)
+        
+        # The analyzer, compiler and engine are kept for the whole session,
+        # so each execution only pays for its own code, however many
+        # variables and functions earlier ones defined
+        self.analyzer = StatementAnalyzer(self.symbol_table)
+        self.folder = ConstantFolder(self.symbol_table)
+        self.inliner = FunctionInliner(self.symbol_table)
+        self.compiler = None
+        self.runtime = None
+    
+    def session_runtime(self):
+        """Return the engine instance shared by the executions of the session."""
+        if self.runtime is None:
+            limits = {'max_steps': self.max_steps, 'timeout': self.timeout, 'output': self.output,
+                      'memo_size': self.memo_size}
+            if self.engine == 'vm':
+                self.runtime = BytecodeVM(self.symbol_table, max_depth=self.max_depth, **limits)
+            elif self.engine == 'closure':
+                self.runtime = ClosureCompiler(self.symbol_table, **limits)
+            elif self.engine == 'python':
+                self.runtime = PythonCodegen(self.symbol_table, **limits)
+            else:
+                self.runtime = RuntimeVisitor(self.symbol_table, **limits)
+        return self.runtime
+    
+    def store_globals(self):
+        """
+        Bring the global values in the symbol table up to date. The compiled
+        engines keep globals to themselves during a session, so call this
+        before reading values from the symbol table.
+        """
+        if self.runtime is not None and self.engine != 'tree':
+            self.runtime.store_globals()
         
-    def execute_string(self, code_string, show_output=True, debug=False):
+    def execute_string(self, code_string, show_output=True, debug=False, cache_path=None):
         """
         Execute code from a string input.
         
@@ -42,48 +116,54 @@ class LanguageCommander:
             code_string: Source code as a string
             show_output: Whether to print execution output
             debug: Whether to show debug information
+            cache_path: Path of the script the code was read from, enabling
+                the compiled program cache for it
             
         Returns:
-            The output of the program, or None if execution failed
+            The output of the program, or None if execution failed or the
+            output sink passed the output on
         """
-        input_stream = InputStream(code_string)
-        
-        # Step 1: Setup lexer and parser
-        lexer = syntaxLexer(input_stream)
-        token_stream = CommonTokenStream(lexer)
-        parser = syntaxParser(token_stream)
-        
-        # Step 2: Configure error handling
-        error_listener = SyntaxErrorHandling()
-        parser.removeErrorListeners()
-        parser.addErrorListener(error_listener)
-        
         try:
-            # Step 3: Parse the input
-            tree = parser.program()
+            # A cached program skips every step up to execution
+            program = None
+            if cache_path is not None:
+                program = self.cache.load(cache_path, code_string, self.engine)
             
-            # Check for syntax errors
-            if error_listener.error_count > 0:
-                if show_output:
-                    print(f"Found {error_listener.error_count} syntax errors. Execution skipped.")
-                return None
+            if program is None:
+                # Steps 1-3: Lex and parse the input, SLL first and LL on failure
+                tree, error_count = self.parser.parse(code_string)
                 
-            # Step 4: Perform semantic analysis
-            analyzer = StatementAnalyzer(self.symbol_table)
-            analyzer.visit(tree)
-            
-            # Show symbol table in debug mode
-            if debug and show_output:
-                print("\nSymbol Table:")
-                self.symbol_table.printSymbols()
+                # Check for syntax errors
+                if error_count > 0:
+                    if show_output:
+                        print(f"Found {error_count} syntax errors. Execution skipped.")
+                    return None
+                    
+                # Step 4: Perform semantic analysis
+                self.analyze(tree)
+                
+                # Show symbol table in debug mode
+                if debug and show_output:
+                    print("\nSymbol Table:")
+                    self.store_globals()
+                    self.symbol_table.printSymbols()
+                
+                program = self.compile_tree(tree, show_output=show_output, debug=debug)
+                if cache_path is not None:
+                    self.cache.store(cache_path, code_string, self.engine, program)
             
             # Step 5: Execute the code
-            executor = RuntimeVisitor(self.symbol_table)
-            output = executor.visit(tree)
+            output = self.run_program(program)
             
-            # Display output if requested
-            if show_output:
+            # Display output if requested, unless it was streamed already
+            if show_output and output is not None:
                 print(output)
+            
+            # Show how often pure functions were answered from their caches
+            if debug and show_output and self.memo_size is not None:
+                print("\nMemoized functions:")
+                for line in self.session_runtime().memo.report():
+                    print(f"  {line}")
                 
             return output
             
@@ -92,13 +172,91 @@ class LanguageCommander:
                 print(f"Execution error: {e}")
             return None
     
-    def execute_file(self, filepath, debug=False):
+    def analyze(self, tree):
+        """
+        Type-check a parse tree, fold its constant expressions and inline
+        calls of small functions.
+        
+        Args:
+            tree: The ProgramContext returned by the parser
+        """
+        self.analyzer.visit(tree)
+        self.folder.visit(tree)
+        self.inliner.visit(tree)
+    
+    def run_tree(self, tree, show_output=True, debug=False):
+        """
+        Execute an analyzed parse tree with the selected engine.
+        
+        Args:
+            tree: The ProgramContext that passed semantic analysis
+            show_output: Whether debug listings may be printed
+            debug: Whether to show debug information
+            
+        Returns:
+            The output of the program
+        """
+        return self.run_program(self.compile_tree(tree, show_output=show_output, debug=debug))
+    
+    def compile_tree(self, tree, show_output=True, debug=False):
+        """
+        Translate an analyzed parse tree into what the selected engine runs.
+        
+        Args:
+            tree: The ProgramContext that passed semantic analysis
+            show_output: Whether debug listings may be printed
+            debug: Whether to show debug information
+            
+        Returns:
+            The main CodeObject for 'vm', the generated source for 'python',
+            the lowered CompactAST Program for 'closure' and the tree itself
+            for 'tree'
+        """
+        if self.engine == 'vm':
+            if self.compiler is None:
+                # Compiled functions are reused by later executions
+                self.compiler = BytecodeCompiler(self.symbol_table)
+            main = self.compiler.compile(tree)
+            if debug and show_output:
+                print("\nBytecode:")
+                print(self.compiler.disassemble(main))
+            return main
+        if self.engine == 'python':
+            # Functions generated for earlier executions are already defined
+            source = self.session_runtime().generate(tree)
+            if debug and show_output:
+                print("\nGenerated Python:")
+                print(source)
+            return source
+        if self.engine == 'closure':
+            return ASTLowering(self.symbol_table).lower(tree)
+        return tree
+    
+    def run_program(self, program):
+        """
+        Execute the result of compile_tree with the selected engine.
+        
+        Returns:
+            The output of the program, or None if the output sink passed it on
+        """
+        # Global values are written back to the symbol table by store_globals
+        runtime = self.session_runtime()
+        if self.engine in ('vm', 'closure'):
+            return runtime.run(program, write_back=False)
+        if self.engine == 'python':
+            return runtime.run(None, program, write_back=False)
+        return runtime.visit(program)
+    
+    def execute_file(self, filepath, debug=False, use_cache=False):
         """
         Execute code from a file.
         
         Args:
             filepath: Path to the source code file
             debug: Whether to show debug information
+            use_cache: Whether a compiled form cached for the file may be
+                reused. A cached run leaves the symbol table untouched, so
+                only use it when the session does not continue afterwards.
         """
         try:
             # Read the entire file content
@@ -107,7 +265,8 @@ class LanguageCommander:
                 
             print(f"Executing file: {filepath}")
             print(f"{CYAN_BOLD}=== Program Output ==={RESET}")
-            self.execute_string(code, debug=debug)
+            cache_path = filepath if use_cache and not debug else None
+            self.execute_string(code, debug=debug, cache_path=cache_path)
             print(f"{CYAN_BOLD}=== End of Output ==={RESET}")
             
         except FileNotFoundError:
@@ -124,6 +283,9 @@ class LanguageCommander:
         """
         print(f"Interactive Pyoops Language Mode - Type 'exit()' to quit, 'help()' for commands")
         
+        # Fill the parser caches now rather than on the first lines typed
+        warm_up()
+        
         # Setup readline with history file for command history
         history_file = os.path.expanduser('~/.bibi_language_history')
         try:
@@ -190,12 +352,12 @@ class LanguageCommander:
                     continue
                 elif user_input.lower() == 'clear()':
                     # Reset the symbol table (clear all variables)
-                    self.symbol_table = SymbolTableVisitor()
-                    self.symbol_table.define("get_error", {"type": "str"})
+                    self.reset_symbol_table()
                     print("Symbol table cleared.")
                     continue
                 elif user_input.lower() == 'symbols()':
                     # Display current symbol table contents
+                    self.store_globals()
                     self.symbol_table.printSymbols()
                     continue
                 elif user_input.strip() == '':
@@ -211,6 +373,10 @@ class LanguageCommander:
             except EOFError:
                 # Handle Ctrl+D (EOF) by exiting
                 break
+            except SystemExit:
+                # Errors are reported and then exit the interpreter; in the
+                # REPL only the failing line is abandoned
+                continue
             except Exception as e:
                 # Catch any other exceptions to keep the REPL running
                 print(f"Error: {e}")
@@ -251,35 +417,79 @@ def main():
     parser.add_argument('-i', '--interactive', action='store_true', help='Start interactive mode')
     parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output')
     parser.add_argument('-v', '--version', action='store_true', help='Show version information')
+    parser.add_argument('--engine', choices=['tree', 'closure', 'vm', 'python'], default='tree',
+                        help='Execution engine: parse-tree walker (default), compiled closures, bytecode VM or generated Python')
+    parser.add_argument('--front-end', choices=FRONT_ENDS, default='antlr',
+                        help='Parser: generated ANTLR parser (default) or the hand-written fast parser')
+    parser.add_argument('--scope-history', type=int, default=SCOPE_HISTORY_LIMIT, metavar='N',
+                        help=f'Block and function scopes kept for symbol listings (default: {SCOPE_HISTORY_LIMIT}, 0 disables)')
+    parser.add_argument('--max-steps', type=int, default=DEFAULT_MAX_STEPS, metavar='N',
+                        help=f'Loop iterations allowed per execution (default: {DEFAULT_MAX_STEPS}, 0 for no limit)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, metavar='SECONDS',
+                        help=f'Time allowed per execution (default: {DEFAULT_TIMEOUT}, 0 for no limit)')
+    parser.add_argument('--unlimited', action='store_true', help='Disable the step and time limits for trusted scripts')
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_MAX_DEPTH, metavar='N',
+                        help=f'Nested calls allowed by the vm engine (default: {DEFAULT_MAX_DEPTH}, 0 for no limit)')
+    parser.add_argument('--memoize', action='store_true',
+                        help='Cache the results of pure functions, keyed by their arguments')
+    parser.add_argument('--memo-size', type=int, default=DEFAULT_MEMO_SIZE, metavar='N',
+                        help=f'Results cached per function by --memoize (default: {DEFAULT_MEMO_SIZE})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f'Do not read or write compiled programs in {CACHE_DIR} (used by the closure, vm and python engines)')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='Write program output to FILE instead of standard output')
+    parser.add_argument('--flush', choices=FLUSH_POLICIES,
+                        help='When program output is written: after every line, when the buffer is full, '
+                             'or at least every 0.1 seconds (default: line on a terminal, buffer otherwise)')
     
     args = parser.parse_args()
     
+    # A limit of 0 means no limit
+    max_steps = None if args.unlimited or args.max_steps <= 0 else args.max_steps
+    timeout = None if args.unlimited or args.timeout <= 0 else args.timeout
+    max_depth = None if args.max_depth <= 0 else args.max_depth
+    memo_size = args.memo_size if args.memoize else None
+    
+    # Program output streams to its destination while the program runs
+    if args.output:
+        output = FileSink(args.output, flush=args.flush or 'buffer')
+    else:
+        output = StreamSink(flush=args.flush or ('line' if sys.stdout.isatty() else 'buffer'))
+    
     # Create commander instance
-    commander = LanguageCommander()
+    commander = LanguageCommander(engine=args.engine, scope_history=args.scope_history,
+                                  max_steps=max_steps, timeout=timeout, front_end=args.front_end,
+                                  output=output, max_depth=max_depth, memo_size=memo_size)
     
-    # Display version information if requested
-    if args.version:
-        print("Pyoops Language Commander v1.0.0")
-        return
+    try:
+        # Display version information if requested
+        if args.version:
+            print("Pyoops Language Commander v1.0.0")
+            return
     
-    # Check file extension if a file is specified
-    if args.file:
-        if not args.file.endswith('.bibi'):
-            print(f"Warning: File {args.file} does not have the standard .bibi extension")
-            proceed = input("Do you want to proceed? (y/n): ")
-            if proceed.lower() != 'y':
-                return
+        # Check file extension if a file is specified
+        if args.file:
+            if not args.file.endswith('.bibi'):
+                print(f"Warning: File {args.file} does not have the standard .bibi extension")
+                proceed = input("Do you want to proceed? (y/n): ")
+                if proceed.lower() != 'y':
+                    return
         
-        # Execute the specified file
-        commander.execute_file(args.file, debug=args.debug)
+            # Execute the specified file. The cache is skipped when the session
+            # continues, as a cached run does not fill in the symbol table
+            use_cache = not args.no_cache and not args.interactive
+            commander.execute_file(args.file, debug=args.debug, use_cache=use_cache)
         
-        # Start interactive mode after file execution if requested
-        if args.interactive:
-            commander.start_repl(debug=args.debug)
+            # Start interactive mode after file execution if requested
+            if args.interactive:
+                commander.start_repl(debug=args.debug)
     
-    # Start interactive mode if no file or explicitly requested
-    elif args.interactive or not args.file:
-        commander.start_repl(debug=args.debug)
+        # Start interactive mode if no file or explicitly requested
+        elif args.interactive or not args.file:
+            commander.start_repl(debug=args.debug)
+    finally:
+        # Write out what is still buffered and close an output file
+        output.close()
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
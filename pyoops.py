@@ -7,13 +7,13 @@ This script orchestrates the compilation and execution pipeline:
 4. Runtime execution
 """
 import sys
-from antlr4 import *
-from syntaxLexer import syntaxLexer
-from syntaxParser import syntaxParser
-from SyntaxErrorHandling import SyntaxErrorHandling
+from SourceParser import SourceParser
 from SymbolTableVisitor import SymbolTableVisitor
 from StatementAnalyzer import StatementAnalyzer
+from ConstantFolder import ConstantFolder
+from FunctionInliner import FunctionInliner
 from RuntimeVisitor import RuntimeVisitor
+from Builtins import define_builtins
 
 def main(input_file):
     """
@@ -27,39 +27,33 @@ def main(input_file):
     # Step 1: Read the input file
     try:
         with open(input_file, 'r') as f:
-            input_stream = InputStream(f.read())
+            source = f.read()
     except FileNotFoundError:
         print(f"Error: File '{input_file}' not found.")
         return
 
-    # Step 2: Setup lexer and token stream for parsing
-    lexer = syntaxLexer(input_stream)
-    token_stream = CommonTokenStream(lexer)
-    parser = syntaxParser(token_stream)
-
-    # Step 3: Configure custom error handling for syntax errors
-    error_listener = SyntaxErrorHandling()
-    parser.removeErrorListeners()  # Remove default error listeners
-    parser.addErrorListener(error_listener)  # Add our custom error handler
-
-    # Step 4: Parse the input to create the syntax tree
+    # Steps 2-4: Tokenize and parse the input to create the syntax tree,
+    # with SLL prediction first and full LL only if that fails
     try:
-        tree = parser.program()  # Start parsing at the 'program' rule
+        tree, error_count = SourceParser().parse(source)
     except Exception as e:
         print(f"Parsing failed: {e}")
         return
 
     # Step 5: If syntax is valid, continue with semantic analysis and execution
-    if error_listener.error_count == 0:
+    if error_count == 0:
         # Step 5.1: Initialize symbol table for variable tracking
         symbol_table = SymbolTableVisitor()
         # Add built-in functions to the symbol table
-        symbol_table.define("get_error", {"type": "str"})
+        define_builtins(symbol_table)
         
         # Step 5.2: Perform semantic analysis (type checking, scope validation)
         try:
             analyzer = StatementAnalyzer(symbol_table)
             analyzer.visit(tree)
+            # Fold constant expressions once the tree is known to be valid
+            ConstantFolder(symbol_table).visit(tree)
+            FunctionInliner(symbol_table).visit(tree)
             # Uncomment to debug symbol table contents:
             # print("\nSymbol Table after semantic analysis:")
             # symbol_table.printSymbols()
@@ -81,7 +75,7 @@ def main(input_file):
             return
     else:
         # Skip execution if syntax errors were found
-        print(f"Found {error_listener.error_count} syntax errors. Execution skipped.")
+        print(f"Found {error_count} syntax errors. Execution skipped.")
 
 if __name__ == "__main__":
     # Check command line arguments
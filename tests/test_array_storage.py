@@ -0,0 +1,36 @@
+"""
+Checks of the compact numeric arrays of ArrayStorage.
+Run with: python -m pytest tests
+"""
+import copy
+import pickle
+import pytest
+from ArrayStorage import IntArray, FloatArray
+
+ARRAYS = (IntArray([1, -2, 3]), FloatArray([1.5, 2.5]), IntArray())
+
+
+@pytest.mark.parametrize('protocol', range(pickle.HIGHEST_PROTOCOL + 1))
+@pytest.mark.parametrize('values', ARRAYS, ids=repr)
+def test_pickle_round_trip(values, protocol):
+    loaded = pickle.loads(pickle.dumps(values, protocol))
+    assert loaded.__class__ is values.__class__
+    assert loaded == values
+
+@pytest.mark.parametrize('copier', (copy.copy, copy.deepcopy))
+@pytest.mark.parametrize('values', ARRAYS, ids=repr)
+def test_copy_keeps_class_and_repr(values, copier):
+    copied = copier(values)
+    assert copied.__class__ is values.__class__
+    assert copied is not values
+    assert repr(copied) == repr(values.tolist())
+
+def test_slice_keeps_class_and_repr():
+    values = IntArray([1, 2, 3, 4])
+    assert values[1:3].__class__ is IntArray
+    assert repr(values[1:3]) == "[2, 3]"
+    assert repr(FloatArray([1.5, 2.5, 3.5])[::2]) == "[1.5, 3.5]"
+
+def test_index_returns_element():
+    assert IntArray([7, 8])[1] == 8
+    assert IntArray([7, 8])[-1] == 8
@@ -0,0 +1,35 @@
+"""
+Checks of BytecodeCompiler on trees that did not go through ConstantFolder.
+Run with: python -m pytest tests
+"""
+from ArrayStorage import IntArray, FloatArray
+from Builtins import define_builtins
+from BytecodeCompiler import BytecodeCompiler, LOAD_CONST
+from SourceParser import SourceParser
+from StatementAnalyzer import StatementAnalyzer
+from SymbolTableVisitor import SymbolTableVisitor
+
+
+def constants(source):
+    """Compile an analyzed but unfolded source and return its LOAD_CONST values."""
+    tree, error_count = SourceParser().parse(source)
+    assert error_count == 0
+    symbol_table = SymbolTableVisitor()
+    define_builtins(symbol_table)
+    StatementAnalyzer(symbol_table).visit(tree)
+    main = BytecodeCompiler(symbol_table).compile(tree)
+    return [arg for op, arg in main.code if op == LOAD_CONST]
+
+def test_int_array_literal_is_packed():
+    values = constants("int[] xs = [1, 2, 3];")
+    assert values[0].__class__ is IntArray
+    assert values[0] == [1, 2, 3]
+
+def test_float_array_literal_is_packed():
+    values = constants("print([1.5, 2.5]);")
+    assert values[0].__class__ is FloatArray
+    assert values[0] == [1.5, 2.5]
+
+def test_mixed_array_literal_stays_a_list():
+    values = constants("print([1, 2.5]);")
+    assert values[0].__class__ is list
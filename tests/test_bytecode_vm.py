@@ -0,0 +1,18 @@
+"""
+Checks of BytecodeVM on instructions the sample programs do not reach.
+Run with: python -m pytest tests
+"""
+import importlib
+import Builtins
+
+# pyoops-cmd.py is not importable with a plain import statement
+LanguageCommander = importlib.import_module('pyoops-cmd').LanguageCommander
+
+
+def test_zero_argument_builtin_keeps_operand_stack(monkeypatch):
+    monkeypatch.setitem(Builtins.BUILTINS, 'answer', {
+        'type': 'function', 'builtin': True, 'return_type': 'int', 'params': [],
+    })
+    monkeypatch.setitem(Builtins.BUILTIN_FUNCTIONS, 'answer', lambda: 41)
+    commander = LanguageCommander(engine='vm')
+    assert commander.execute_string("int x = 1; print(x + answer());", show_output=False) == "42"
@@ -0,0 +1,98 @@
+"""
+Programs whose output every engine has to agree on.
+Run with: python -m pytest tests
+"""
+import importlib
+import os
+import subprocess
+import sys
+import pytest
+
+# pyoops-cmd.py is not importable with a plain import statement
+LanguageCommander = importlib.import_module('pyoops-cmd').LanguageCommander
+
+ENGINES = ('tree', 'closure', 'vm', 'python')
+
+# Engines whose calls nest Python frames, so 300 nested calls overflow
+RECURSIVE_ENGINES = ('tree', 'closure')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RED = "\033[91m"
+BOLD = "\033[1m"
+RESET = "\033[0m"
+OUTPUT_HEADER = "\033[1;36m=== Program Output ===\033[0m"
+
+
+def run(source, engine):
+    return LanguageCommander(engine=engine).execute_string(source, show_output=False)
+
+def run_script(source, engine, tmp_path):
+    """Run a source as a script in a new process and return its program output lines."""
+    path = tmp_path / 'script.bibi'
+    path.write_text(source)
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'pyoops-cmd.py'), '--engine', engine, str(path)],
+        capture_output=True, text=True, cwd=ROOT)
+    lines = result.stdout.splitlines()
+    return lines[lines.index(OUTPUT_HEADER) + 1:]
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_block_local_does_not_clobber_similar_global(engine):
+    source = """
+        int x_1 = 10;
+        if (true) {
+            int x = 5;
+            print(x_1);
+        }
+        print(x_1);
+    """
+    assert run(source, engine) == "10\n10"
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_block_local_does_not_clobber_similar_parameter(engine):
+    source = """
+        func int f(int y_1) {
+            if (y_1 > 0) {
+                int y = 7;
+                y = 9;
+            }
+            return y_1;
+        }
+        int a = 4;
+        print(f(a));
+    """
+    assert run(source, engine) == "4"
+
+DEEP = """
+    func int deep(int n) {
+        if (n == 0) {
+            return 0;
+        }
+        return 1 + deep(n - 1);
+    }
+    int n = 300;
+"""
+
+@pytest.mark.parametrize('engine', RECURSIVE_ENGINES)
+def test_uncaught_stack_overflow_output(engine, tmp_path):
+    source = DEEP + """
+        print("start");
+        print(deep(n));
+        print("end");
+    """
+    assert run_script(source, engine, tmp_path) == [
+        "start",
+        f"{RED}{BOLD}[Runtime Error]{RESET}{RED} Stack overflow.{RESET}",
+    ]
+
+@pytest.mark.parametrize('engine', RECURSIVE_ENGINES)
+def test_caught_stack_overflow_output(engine, tmp_path):
+    source = DEEP + """
+        try {
+            print(deep(n));
+        } except {
+            print("caught " + get_error());
+        }
+        print("end");
+    """
+    assert run_script(source, engine, tmp_path)[:2] == ["caught Stack overflow.", "end"]
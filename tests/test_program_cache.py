@@ -0,0 +1,41 @@
+"""
+Checks of ProgramCache on entries that can no longer be loaded.
+Run with: python -m pytest tests
+"""
+import sys
+import types
+from ProgramCache import ProgramCache, COMPILER_MODULES
+
+SOURCE = "print(1);"
+
+
+def test_fingerprint_covers_pickled_classes():
+    for name in ('ArrayStorage', 'ClosureCompiler', 'OutputSink'):
+        assert name in COMPILER_MODULES
+
+def test_entry_of_a_removed_class_is_a_miss(tmp_path):
+    module = types.ModuleType('cache_test_module')
+    exec("class Program:\n    pass\n", module.__dict__)
+    module.Program.__module__ = module.__name__
+    sys.modules[module.__name__] = module
+    try:
+        cache = ProgramCache(str(tmp_path))
+        script = str(tmp_path / 'script.bibi')
+        cache.store(script, SOURCE, 'vm', module.Program())
+        del module.Program
+        assert cache.load(script, SOURCE, 'vm') is None
+    finally:
+        del sys.modules[module.__name__]
+
+def test_garbage_entry_is_a_miss(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    script = str(tmp_path / 'script.bibi')
+    with open(cache.path(script, 'vm'), 'wb') as f:
+        f.write(b'not a pickle')
+    assert cache.load(script, SOURCE, 'vm') is None
+
+def test_valid_entry_is_loaded(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    script = str(tmp_path / 'script.bibi')
+    cache.store(script, SOURCE, 'vm', ['program'])
+    assert cache.load(script, SOURCE, 'vm') == ['program']
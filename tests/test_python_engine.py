@@ -0,0 +1,41 @@
+"""
+Checks of the python engine's REPL sessions, which keep globals in the
+generated module and write them back to the symbol table between lines.
+Run with: python -m pytest tests
+"""
+import importlib
+from ArrayStorage import IntArray, FloatArray
+
+# pyoops-cmd.py is not importable with a plain import statement
+LanguageCommander = importlib.import_module('pyoops-cmd').LanguageCommander
+
+
+def global_value(commander, name):
+    commander.store_globals()
+    return commander.symbol_table.global_scope[name]['value']
+
+def test_int_array_global_survives_store_globals():
+    commander = LanguageCommander(engine='python')
+    commander.execute_string("int[] arr = [1, 2, 3];", show_output=False)
+    value = global_value(commander, 'arr')
+    assert isinstance(value, IntArray)
+    assert value == [1, 2, 3]
+    assert commander.execute_string("print(arr[2]);", show_output=False) == "3"
+
+def test_float_array_global_survives_store_globals():
+    commander = LanguageCommander(engine='python')
+    commander.execute_string("int[] arr = [1, 2];", show_output=False)
+    # No literal is a float[] yet, so put one in the session's namespace
+    runtime = commander.session_runtime()
+    runtime.namespace['v_arr'] = FloatArray([1.5, 2.5])
+    value = global_value(commander, 'arr')
+    assert isinstance(value, FloatArray)
+    assert value == [1.5, 2.5]
+
+def test_typedef_instance_is_stored_as_fields():
+    commander = LanguageCommander(engine='python')
+    commander.execute_string("type Point { int x; int y; } Point p; p.x = 3; p.y = 4;", show_output=False)
+    commander.store_globals()
+    fields = commander.symbol_table.global_scope['p']['fields']
+    assert fields['x']['value'] == 3
+    assert fields['y']['value'] == 4
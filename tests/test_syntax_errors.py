@@ -0,0 +1,26 @@
+"""
+Checks of the syntax error messages printed by SyntaxErrorHandling.
+Run with: python -m pytest tests
+"""
+import re
+import pytest
+from SourceParser import SourceParser
+
+
+def expected_tokens(source, capsys):
+    """Parse an invalid source and return its 'Expected one of:' list."""
+    with pytest.raises(SystemExit):
+        SourceParser().parse(source)
+    output = re.sub(r'\x1b\[[0-9;]*m', '', capsys.readouterr().out)
+    match = re.search(r'Expected one of: (.*)', output)
+    assert match, output
+    return match.group(1).split(', ')
+
+def test_expected_tokens_name_tokens_without_literals(capsys):
+    expected = expected_tokens("int x = ;\n", capsys)
+    assert '<INVALID>' not in expected
+    for name in ('NUMBER', 'STRING', 'CHARACTER', 'IDENTIFIER', "'true'", "'('"):
+        assert name in expected
+
+def test_expected_tokens_of_a_missing_semicolon(capsys):
+    assert expected_tokens("int x = 1\nprint(x);\n", capsys) == ["';'"]